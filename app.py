@@ -1,11 +1,30 @@
 import streamlit as st
 import requests
 import pandas as pd
-from io import BytesIO
-import json
+import sqlite3
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
 from dotenv import load_dotenv
 import os
 from duplicate import ELDDriver, ELDSync
+from eld_artifacts import ArtifactCache, bytes_digest
+from eld_fleets import FleetConfig, fetch_fleets_sync, load_fleet_configs
+from eld_history import ELD_HISTORY_DEFAULT_FLEET, SnapshotHistory
+from eld_metrics import get_peak_rss_bytes, metrics
+from eld_resilience import CircuitOpenError
+from eld_snapshot import STATUS_OPTIONS, SnapshotCache
+from eld_usernames import UsernameValidationCache, diff_username_issues
+from reports import (
+    ADMIN_TAG_STATUSES,
+    EXCEL_MIME,
+    EXPORT_FORMATS,
+    create_excel_file,
+    create_excel_workbook,
+    create_export_file,
+    find_username_issues_chunked,
+    status_file_slug,
+)
 
 # Configure Streamlit page
 st.set_page_config(
@@ -14,20 +33,91 @@ st.set_page_config(
     layout="centered"
 )
 
-# Simple login system
-def check_login():
-    """Simple login check using secrets or environment variables"""
+@dataclass(frozen=True)
+class AppConfig:
+    login_username: str
+    login_password: str
+    api_base_url: Optional[str]
+    eld_api_key: Optional[str]
+    snapshot_ttl_seconds: int
+    snapshot_max_entries: int
+    snapshot_prefetch_seconds: float
+    stream_eld_payload: bool
+    username_csv_chunk_rows: int
+    username_cache_rows: int
+    artifact_cache_mb: int
+    eld_history_db: str
+    eld_fleets: Tuple[FleetConfig, ...]
+    eld_fleets_error: Optional[str] = None
+
+
+def get_setting(name, default=None):
+    """Read a setting from Streamlit secrets, falling back to environment variables"""
+    try:
+        return st.secrets.get(name, os.getenv(name, default))
+    except:
+        return os.getenv(name, default)
+
+
+@st.cache_resource
+def load_app_config():
+    """Read .env, secrets and settings once per server process instead of on every rerun"""
+    load_dotenv()
+
     try:
         # Try to get credentials from Streamlit secrets (for cloud deployment)
         username = st.secrets.get("LOGIN_USERNAME", "admin")
         password = st.secrets.get("LOGIN_PASSWORD", "admin321")
     except:
         # Fallback for local development - use environment variables or defaults
-        load_dotenv()
         username = os.getenv("LOGIN_USERNAME", "admin")
         password = os.getenv("LOGIN_PASSWORD", "admin321")
-    
-    return username, password
+
+    try:
+        api_base_url = st.secrets["ELD_API_URL"]
+        eld_api_key = st.secrets.get("ELD_API_KEY")
+    except:
+        # Fallback for local development
+        api_base_url = os.getenv("ELD_API_URL")
+        eld_api_key = os.getenv("ELD_API_KEY")
+
+    # Optional extra carrier accounts: a JSON list of {"name", "api_url", "api_key"}; api_url defaults to ELD_API_URL
+    fleets_error = None
+    try:
+        fleets = load_fleet_configs(get_setting("ELD_FLEETS"), default_url=api_base_url)
+    except (ValueError, TypeError, AttributeError) as e:
+        fleets, fleets_error = [], f"Invalid ELD_FLEETS setting: {str(e)}"
+
+    return AppConfig(
+        login_username=username,
+        login_password=password,
+        api_base_url=api_base_url,
+        eld_api_key=eld_api_key,
+        # Snapshot cache settings: how long a fetched ELD payload is fresh and how many distinct API accounts are kept
+        snapshot_ttl_seconds=int(get_setting("SNAPSHOT_TTL_SECONDS", 300)),
+        snapshot_max_entries=int(get_setting("SNAPSHOT_MAX_ENTRIES", 4)),
+        # Refresh the snapshot in the background this often so clicks never wait on the API (0 turns prefetching off)
+        snapshot_prefetch_seconds=float(get_setting("SNAPSHOT_PREFETCH_SECONDS", 240)),
+        # Parse the driver payload item by item as it downloads instead of loading the whole body first
+        stream_eld_payload=str(get_setting("STREAM_ELD_PAYLOAD", "true")).lower() in ("1", "true", "yes"),
+        # Rows per chunk when validating uploaded driver CSVs
+        username_csv_chunk_rows=int(get_setting("USERNAME_CSV_CHUNK_ROWS", 50000)),
+        # Per-row username validation results kept across uploads, so a re-upload only validates changed rows
+        username_cache_rows=int(get_setting("USERNAME_CACHE_ROWS", 1000000)),
+        # Memory budget for generated report files and DataFrames shared across sessions
+        artifact_cache_mb=int(get_setting("ARTIFACT_CACHE_MB", 256)),
+        # SQLite file every fetched snapshot is recorded in for the History tab (empty turns it off)
+        eld_history_db=str(get_setting("ELD_HISTORY_DB", "eld_history.sqlite3") or ""),
+        eld_fleets=tuple(fleets),
+        eld_fleets_error=fleets_error,
+    )
+
+
+# Simple login system
+def check_login():
+    """Simple login check using secrets or environment variables"""
+    config = load_app_config()
+    return config.login_username, config.login_password
 
 def login_page():
     """Display login form"""
@@ -67,237 +157,501 @@ if st.sidebar.button("🚪 Logout"):
     st.session_state.authenticated = False
     st.rerun()
 
-load_dotenv()
+config = load_app_config()
+API_BASE_URL = config.api_base_url
+ELD_API_KEY = config.eld_api_key
+SNAPSHOT_TTL_SECONDS = config.snapshot_ttl_seconds
+SNAPSHOT_MAX_ENTRIES = config.snapshot_max_entries
+SNAPSHOT_PREFETCH_SECONDS = config.snapshot_prefetch_seconds
+STREAM_ELD_PAYLOAD = config.stream_eld_payload
+USERNAME_CSV_CHUNK_ROWS = config.username_csv_chunk_rows
+USERNAME_CACHE_ROWS = config.username_cache_rows
+ARTIFACT_CACHE_MB = config.artifact_cache_mb
+ELD_HISTORY_DB = config.eld_history_db
+ELD_FLEETS = list(config.eld_fleets)
+if config.eld_fleets_error:
+    st.error(config.eld_fleets_error)
 
-try:
-    API_BASE_URL = st.secrets["ELD_API_URL"]
-    ELD_API_KEY = st.secrets.get("ELD_API_KEY")  
-except:
-    # Fallback for local development
-    API_BASE_URL = os.getenv("ELD_API_URL")
-    ELD_API_KEY = os.getenv("ELD_API_KEY")
+@st.cache_resource
+def create_eld_client(api_base_url, eld_api_key):
+    return ELDSync(api_base_url, eld_api_key)
 
-API_ENDPOINT = "api/v1/driver/eld/"
 
-# Status mapping
-STATUS_OPTIONS = ['Driving', 'Off Duty', 'On Duty', 'SB']
+def get_eld_client():
+    """ELD API client, built once per account; requests go through the shared keep-alive connection pool"""
+    return create_eld_client(API_BASE_URL, ELD_API_KEY)
 
-def fetch_eld_data():
-    """Fetch ELD data from API"""
-    try:
-        url = f"{API_BASE_URL}{API_ENDPOINT}"
-        eld_headers = {
-        'X-Api-Key': ELD_API_KEY,
-        'Content-Type': 'application/json'
-        }
-        
-        response = requests.get(url, headers=eld_headers, timeout=180)
-        response.raise_for_status()
-        
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        st.error(f"API request failed: {str(e)}")
+
+@st.cache_resource
+def open_snapshot_history(path):
+    return SnapshotHistory(path)
+
+
+def get_snapshot_history():
+    """The snapshot history store, or None when ELD_HISTORY_DB is empty or cannot be opened (e.g. read-only)"""
+    if not ELD_HISTORY_DB:
         return None
-    except json.JSONDecodeError:
-        st.error("Invalid JSON response from API")
+    try:
+        return open_snapshot_history(ELD_HISTORY_DB)
+    except sqlite3.Error:
         return None
 
-def filter_data_by_status(data, status):
-    """Filter data by current status"""
-    if not data or 'Data' not in data:
-        return []
-    
-    filtered_data = []
-    for item in data['Data']:
-        if item.get('Log', {}).get('CurrentStatus') == status:
-            filtered_data.append(item)
-    
-    return filtered_data
 
-def create_excel_dataframe(filtered_data):
-    """Create DataFrame for Excel export"""
-    excel_data = []
-    
-    for item in filtered_data:
-        driver = item.get('Driver', {}) or {}
-        vehicle = item.get('Vehicle', {}) or {}
-        log = item.get('Log', {}) or {}
-        
-        excel_data.append({
-            'First Name': driver.get('FirstName', ''),
-            'Last Name': driver.get('LastName', ''),
-            'Vehicle Display ID': vehicle.get('DisplayID', ''),
-            'Log Status': log.get('CurrentStatus', '')
-        })
-    
-    return pd.DataFrame(excel_data)
+def record_snapshot_history(key, snapshot):
+    """Snapshot cache hook: append every fetched snapshot to the history (runs on the refresh thread)"""
+    history = get_snapshot_history()
+    if history is not None:
+        history.append(snapshot, fleet=ELD_HISTORY_DEFAULT_FLEET)
 
-def create_admin_tag_dataframe(filtered_data):
-    """Create DataFrame for Excel export"""
-    excel_data = []
-    
-    for item in filtered_data:
-        vehicle = item.get('Vehicle', {}) or {}
-        excel_data.append({
-            'adminTagName': vehicle.get('DisplayID', ''),
-        })
-    
-    return pd.DataFrame(excel_data)
 
+@st.cache_resource
+def get_snapshot_cache():
+    """One snapshot cache per server process, shared by all sessions"""
+    return SnapshotCache(
+        ttl_seconds=SNAPSHOT_TTL_SECONDS, max_entries=SNAPSHOT_MAX_ENTRIES, on_snapshot=record_snapshot_history
+    )
 
-def create_excel_file(dataframe):
-    """Create Excel file in memory"""
-    output = BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        dataframe.to_excel(writer, index=False, sheet_name='ELD Data')
-    output.seek(0)
-    return output
 
-def get_first_initial(value):
-    """Return the first non-empty character from a name field."""
-    value = str(value or "").strip()
-    return value[0].lower() if value else ""
+@st.cache_resource
+def get_artifact_cache():
+    """Generated reports keyed by a content hash of their source data, shared by all sessions"""
+    return ArtifactCache(max_bytes=ARTIFACT_CACHE_MB * 1024 * 1024)
 
 
-def get_last_four_phone_digits(phone_number):
-    """Return the last four numeric digits from a phone number."""
-    digits = "".join(character for character in str(phone_number or "") if character.isdigit())
-    return digits[-4:] if len(digits) >= 4 else ""
+@st.cache_resource
+def get_username_cache():
+    """Username validation results per CSV row, shared by all sessions"""
+    return UsernameValidationCache(max_rows=USERNAME_CACHE_ROWS)
 
 
-def build_expected_username(row):
-    """Build username as phone last four digits + first initial + last initial."""
-    return (
-        get_last_four_phone_digits(row.get("Phone Number", ""))
-        + get_first_initial(row.get("First Name", ""))
-        + get_first_initial(row.get("Last Name", ""))
-    )
+def get_snapshot_key():
+    return (API_BASE_URL, ELD_API_KEY)
 
 
-def find_username_issues(drivers_df):
-    """Find usernames that do not follow the COGO ELD username standard."""
-    required_columns = ["First Name", "Last Name", "Phone Number", "Username", "Notes"]
-    missing_columns = [column for column in required_columns if column not in drivers_df.columns]
-    if missing_columns:
-        return None, missing_columns, 0
-
-    normalized_df = drivers_df.fillna("").copy()
-    notes = normalized_df["Notes"].astype(str)
-    exception_mask = notes.str.contains(r"\b(?:team|local)\b", case=False, na=False, regex=True)
-    validation_df = normalized_df.loc[~exception_mask].copy()
-    validation_df["Proposed Username"] = validation_df.apply(build_expected_username, axis=1)
-    validation_df["Current Username"] = validation_df["Username"].astype(str).str.strip()
-
-    issue_mask = (
-        validation_df["Proposed Username"].ne("")
-        & validation_df["Current Username"].str.lower().ne(validation_df["Proposed Username"])
+def load_eld_payload():
+    """Snapshot loader: an ELDPayload of the item stream in streaming mode, otherwise of the whole payload.
+
+    Runs on the cache's refresh thread, so failures are raised rather than reported with st.error.
+    """
+    # Note: with a snapshot to fall back on, ask only for a payload that changed since the one it was built from;
+    # a 304 then reuses the cached snapshot
+    previous = get_snapshot_cache().peek(get_snapshot_key())
+    validators = previous.validators if previous is not None else None
+    client = get_eld_client()
+    if STREAM_ELD_PAYLOAD:
+        return client.open_conditional_stream(validators)
+    return client.fetch_conditional_payload(validators)
+
+
+def describe_fetch_error(error):
+    """Describe a snapshot fetch failure for st.error or the sidebar status"""
+    if isinstance(error, CircuitOpenError):
+        return f"ELD API is unavailable; using the last good data until {error.retry_at:%H:%M:%S}"
+    if isinstance(error, requests.exceptions.RequestException):
+        return f"API request failed: {str(error)}"
+    if isinstance(error, ValueError):
+        return "Invalid JSON response from API"
+    return f"ELD refresh failed: {str(error)}"
+
+
+def load_snapshot(load):
+    """Run a snapshot cache operation, reporting fetch failures with st.error"""
+    try:
+        return load(get_snapshot_key(), load_eld_payload)
+    except (requests.exceptions.RequestException, ValueError) as e:
+        st.error(describe_fetch_error(e))
+        return None
+
+
+def get_eld_snapshot():
+    """Return the shared ELD snapshot, fetching from the API only when the cached one has expired"""
+    return load_snapshot(get_snapshot_cache().get)
+
+
+def render_snapshot_status():
+    """Show the age and refresh state of the shared ELD snapshot and a manual refresh button in the sidebar"""
+    cache = get_snapshot_cache()
+    key = get_snapshot_key()
+    cache.start_prefetch(key, load_eld_payload, SNAPSHOT_PREFETCH_SECONDS)
+
+    if st.sidebar.button("🔄 Refresh ELD Data"):
+        with st.spinner("Fetching data from COGO ELD..."):
+            load_snapshot(cache.refresh)
+
+    snapshot = cache.peek(key)
+    status = cache.status(key)
+    if snapshot:
+        age_minutes = int((datetime.now() - snapshot.fetched_at).total_seconds() // 60)
+        st.sidebar.caption(f"ELD data as of {snapshot.fetched_at:%Y-%m-%d %H:%M:%S} ({age_minutes} min ago)")
+        if cache.is_stale(snapshot):
+            st.sidebar.warning(f"ELD data is stale ({age_minutes} min old); showing the last good snapshot.")
+    else:
+        st.sidebar.caption("ELD data not loaded yet")
+
+    if status.refreshing:
+        st.sidebar.caption("⏳ Refreshing ELD data in the background...")
+    if status.last_error is not None:
+        st.sidebar.error(
+            f"Last refresh failed at {status.last_error_at:%H:%M:%S}: {describe_fetch_error(status.last_error)}"
+        )
+
+
+def render_metrics_panel():
+    """Admin panel with the latest per-stage timings and the metrics exports"""
+    with st.sidebar.expander("⏱️ Performance"):
+        artifacts = get_artifact_cache()
+        st.caption(
+            f"Report cache: {artifacts.current_bytes / 2**20:.1f} of {artifacts.max_bytes / 2**20:.0f} MiB, "
+            f"{artifacts.hits} hits, {artifacts.misses} builds"
+        )
+        usernames = get_username_cache()
+        st.caption(
+            f"Username rows cache: {len(usernames):,} rows, {usernames.hits:,} reused, {usernames.misses:,} validated"
+        )
+        max_rss = get_peak_rss_bytes()
+        if max_rss is not None:
+            st.caption(f"Process max RSS: {max_rss / 2**20:,.0f} MiB")
+        recent = metrics.recent(limit=25)
+        if not recent:
+            st.caption("No stages timed yet")
+            return
+
+        st.dataframe(pd.DataFrame([
+            {
+                'Stage': metric.stage,
+                'Labels': ", ".join(f"{label}={value}" for label, value in metric.labels.items()),
+                'Seconds': round(metric.seconds, 3),
+                'Records': metric.records,
+                'MiB': round(metric.bytes / 2**20, 2) if metric.bytes is not None else None,
+                # Note: only recorded with ELD_METRICS_TRACE_MEMORY on
+                'Traced Peak MiB': (
+                    round(metric.peak_memory_bytes / 2**20, 1) if metric.peak_memory_bytes is not None else None
+                ),
+                'Error': metric.error or '',
+                'At': f"{metric.started_at:%H:%M:%S}",
+            }
+            for metric in reversed(recent)
+        ]).astype({'Records': 'Int64'}), use_container_width=True, hide_index=True)
+        st.download_button(
+            label="📥 Prometheus Metrics",
+            data=metrics.render_prometheus().encode("utf-8"),
+            file_name="eld_metrics.prom",
+            mime="text/plain"
+        )
+        st.download_button(
+            label="📥 Stage Log (JSON Lines)",
+            data=metrics.render_json_lines().encode("utf-8"),
+            file_name="eld_stage_log.jsonl",
+            mime="application/x-ndjson"
+        )
+
+
+def render_download_button(label, dataframe, file_stem, export_format, cache_key=None):
+    """Offer the report for download in the chosen format.
+
+    dataframe may be a function that builds it; with a cache_key (content hash plus report type) the file is built
+    once and then served from the artifact cache, without building the DataFrame again.
+    """
+    extension, mime = EXPORT_FORMATS[export_format]
+
+    def build_file():
+        frame = dataframe() if callable(dataframe) else dataframe
+        return create_export_file(frame, export_format).getvalue()
+
+    st.download_button(
+        label=label,
+        data=get_artifact_cache().get_or_create((*cache_key, export_format), build_file) if cache_key else build_file(),
+        file_name=f"{file_stem}.{extension}",
+        mime=mime
     )
-    issue_columns = [
-        "First Name",
-        "Last Name",
-        "Phone Number",
-        "Current Username",
-        "Proposed Username",
-        "Driver ID",
-        "Email",
-        "Notes",
-    ]
-    available_columns = [column for column in issue_columns if column in validation_df.columns]
-    return validation_df.loc[issue_mask, available_columns], [], int(exception_mask.sum())
 
 
+def render_export_format_selector(key):
+    return st.radio("Export format", list(EXPORT_FORMATS), horizontal=True, key=key)
+
+@st.fragment
 def render_status_report():
     st.markdown("### 📊 Driver Status Export")
     st.write("Export driver and truck data filtered by current status in COGO ELD.")
 
+    export_format = render_export_format_selector("status_export_format")
+
     status_buttons = [
-        ("🚗 Driving", "Driving", "driving_drivers.xlsx"),
-        ("😴 Off Duty", "Off Duty", "off_duty_drivers.xlsx"),
-        ("⚡ On Duty", "On Duty", "on_duty_drivers.xlsx"),
-        ("🛏️ SB", "SB", "sb_drivers.xlsx"),
+        ("🚗 Driving", "Driving", "driving_drivers"),
+        ("😴 Off Duty", "Off Duty", "off_duty_drivers"),
+        ("⚡ On Duty", "On Duty", "on_duty_drivers"),
+        ("🛏️ SB", "SB", "sb_drivers"),
     ]
     columns = st.columns(4)
 
-    for column, (label, status, file_name) in zip(columns, status_buttons):
+    for column, (label, status, file_stem) in zip(columns, status_buttons):
         with column:
             if st.button(label, use_container_width=True):
                 with st.spinner("Fetching data from COGO ELD..."):
-                    data = fetch_eld_data()
-                    if not data:
+                    snapshot = get_eld_snapshot()
+                    if not snapshot:
                         return
 
-                    filtered_data = filter_data_by_status(data, status)
-                    if not filtered_data:
+                    # Note: the snapshot is partitioned by status once per fetch, so this is a lookup rather than a scan
+                    bucket = snapshot.bucket(status)
+                    status_summary = " · ".join(
+                        f"{name}: {count}" for name, count in snapshot.status_counts().items()
+                    )
+                    if not bucket:
                         st.warning(f"No drivers found with {status} status")
+                        st.caption(status_summary)
                         return
 
-                    df = create_excel_dataframe(filtered_data)
-                    excel_file = create_excel_file(df)
-
-                    st.success(f"Found {len(filtered_data)} drivers with {status} status")
-                    st.download_button(
-                        label=f"📥 Download {status} Report",
-                        data=excel_file,
-                        file_name=file_name,
-                        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                    st.success(f"Found {len(bucket)} drivers with {status} status")
+                    st.caption(f"Data as of {snapshot.fetched_at:%Y-%m-%d %H:%M:%S} · {status_summary}")
+                    # Note: the file is keyed by the bucket's content, so unchanged data is served without rebuilding
+                    render_download_button(
+                        f"📥 Download {status} Report", bucket.export_frame, file_stem, export_format,
+                        cache_key=("status_export", bucket.digest)
                     )
 
-                    if status in ["Driving", "On Duty"]:
-                        admin_tag_df = create_admin_tag_dataframe(filtered_data)
-                        admin_tag_csv = admin_tag_df.to_csv(index=False).encode('utf-8')
+                    if status in ADMIN_TAG_STATUSES:
+                        admin_tag_csv = get_artifact_cache().get_or_create(
+                            ("admin_tag", bucket.digest, "CSV"),
+                            lambda: bucket.admin_tag_frame().to_csv(index=False).encode('utf-8')
+                        )
                         st.download_button(
                             label="📥 Download Admin Tag Report",
                             data=admin_tag_csv,
-                            file_name=f"{status.lower().replace(' ', '_')}_admin_tags.csv",
+                            file_name=f"{status_file_slug(status)}_admin_tags.csv",
                             mime="text/csv"
                         )
 
-
+    if st.button("📚 All Statuses Workbook", use_container_width=True):
+        with st.spinner("Building workbook for all statuses..."):
+            snapshot = get_eld_snapshot()
+            if not snapshot:
+                return
+
+            # One sheet per status, all built from the same snapshot
+            workbook = get_artifact_cache().get_or_create(
+                ("all_statuses", snapshot.digest, "XLSX"),
+                lambda: create_excel_workbook({
+                    status: snapshot.bucket(status).export_frame() for status in STATUS_OPTIONS
+                }).getvalue()
+            )
+            st.caption(f"Data as of {snapshot.fetched_at:%Y-%m-%d %H:%M:%S}")
+            st.download_button(
+                label="📥 Download All Statuses Workbook",
+                data=workbook,
+                file_name="all_status_drivers.xlsx",
+                mime=EXCEL_MIME
+            )
+
+
+@st.fragment
 def render_vehicle_conflicts():
     st.markdown("### 🚨 Vehicle Conflict Finder")
     st.write("Find drivers who are assigned to the same vehicle in ELD.")
+    export_format = render_export_format_selector("conflicts_export_format")
+    normalize_trucks = st.checkbox(
+        "Ignore case and spaces in truck numbers",
+        help='Treat near-duplicate Display IDs such as "t 101" and "T101" as the same truck.'
+    )
 
     if st.button("🔍 Find Vehicle Conflicts", use_container_width=True, type="secondary"):
         with st.spinner("Analyzing vehicle assignments for conflicts..."):
             try:
-                sync = ELDSync(API_BASE_URL, ELD_API_KEY)
-                drivers = sync.fetch_eld_drivers_sync()
+                snapshot = get_eld_snapshot()
+                if not snapshot:
+                    return
 
-                if not drivers:
+                if not snapshot.table.num_rows:
                     st.error("Failed to fetch driver data from ELD system")
                     return
 
-                incorrect_assignments = sync.find_vehicle_conflicts(drivers)
-                if not incorrect_assignments:
+                # Note: drivers per truck are counted over the whole truck column at once, not driver by driver
+                conflicts_key = ("vehicle_conflicts", snapshot.digest, normalize_trucks)
+                df_conflicts, df_trucks = get_artifact_cache().get_or_create(
+                    conflicts_key, lambda: snapshot.vehicle_conflicts(normalize_trucks)
+                )
+                if df_conflicts.empty:
                     st.success("✅ No vehicle conflicts found! All drivers are properly assigned.")
                     return
 
-                conflict_data = []
-                for driver in incorrect_assignments:
-                    conflict_data.append({
-                        'Driver ID': driver.driverID,
-                        'First Name': driver.firstName,
-                        'Last Name': driver.lastName,
-                        'Phone Number': driver.phoneNo,
-                        'Truck Number': driver.truckNo,
-                        'Drivers on Same Truck': driver.truckCount
-                    })
-
-                df_conflicts = pd.DataFrame(conflict_data)
-                st.success(f"Found {len(incorrect_assignments)} drivers with vehicle conflicts!")
+                st.success(f"Found {len(df_conflicts)} drivers with vehicle conflicts on {len(df_trucks)} trucks!")
+                st.caption(f"Data as of {snapshot.fetched_at:%Y-%m-%d %H:%M:%S}")
                 st.dataframe(df_conflicts, use_container_width=True)
+                st.markdown("#### Conflicts by Truck")
+                st.dataframe(df_trucks, use_container_width=True)
 
-                excel_file = create_excel_file(df_conflicts)
-                st.download_button(
-                    label="📥 Download Vehicle Conflicts Report",
-                    data=excel_file,
-                    file_name="vehicle_conflicts.xlsx",
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                render_download_button(
+                    "📥 Download Vehicle Conflicts Report", df_conflicts, "vehicle_conflicts", export_format,
+                    cache_key=(*conflicts_key, "drivers")
+                )
+                render_download_button(
+                    "📥 Download Conflicts by Truck Report", df_trucks, "vehicle_conflicts_by_truck", export_format,
+                    cache_key=(*conflicts_key, "trucks")
                 )
             except Exception as e:
                 st.error(f"Error analyzing vehicle conflicts: {str(e)}")
 
 
+@st.fragment
+def render_fleet_overview():
+    st.markdown("### 🏢 Multi-Fleet Overview")
+    st.write(f"Fetch all {len(ELD_FLEETS)} configured fleet accounts at once and find trucks shared across fleets.")
+    export_format = render_export_format_selector("fleets_export_format")
+    normalize_trucks = st.checkbox(
+        "Ignore case and spaces in truck numbers",
+        key="fleets_normalize_trucks",
+        help='Treat near-duplicate Display IDs such as "t 101" and "T101" as the same truck.'
+    )
+
+    if st.button("🏢 Fetch All Fleets", use_container_width=True):
+        with st.spinner(f"Fetching {len(ELD_FLEETS)} fleets from COGO ELD..."):
+            # Note: fleets are fetched concurrently and a failing fleet is reported below rather than stopping the rest
+            result = fetch_fleets_sync(ELD_FLEETS)
+
+        st.dataframe(result.summary_frame(), use_container_width=True)
+        for failed in result.failed:
+            st.warning(f"{failed.fleet.name}: {failed.error}")
+
+        history = get_snapshot_history()
+        if history is not None:
+            for fleet_result in result.succeeded:
+                try:
+                    history.append(fleet_result.snapshot, fleet=fleet_result.fleet.name)
+                except (sqlite3.Error, ValueError) as e:
+                    st.warning(f"Could not record {fleet_result.fleet.name} in the history: {str(e)}")
+        if not result.succeeded:
+            st.error("Failed to fetch driver data for every fleet")
+            return
+
+        df_conflicts, df_trucks = result.vehicle_conflicts(normalize_trucks)
+        cross_fleet = df_trucks['Fleets'] > 1
+        st.success(
+            f"Found {len(df_trucks)} shared trucks across {len(result.succeeded)} fleets, "
+            f"{int(cross_fleet.sum())} of them shared between fleets."
+        )
+        st.markdown("#### Trucks Shared Between Fleets")
+        st.dataframe(df_trucks[cross_fleet], use_container_width=True)
+        st.markdown("#### All Conflicts")
+        st.dataframe(df_conflicts, use_container_width=True)
+
+        render_download_button("📥 Download Fleet Summary", result.summary_frame(), "fleet_summary", export_format)
+        render_download_button(
+            "📥 Download All Fleets Conflicts Report", df_conflicts, "all_fleets_vehicle_conflicts", export_format
+        )
+        render_download_button(
+            "📥 Download Conflicts by Truck Report", df_trucks, "all_fleets_conflicts_by_truck", export_format
+        )
+
+
+@st.fragment
+def render_snapshot_changes():
+    st.markdown("### 🔁 Changes Since Last Refresh")
+    st.write("Status changes, truck reassignments, and drivers added or removed between the last two ELD fetches.")
+
+    snapshot = get_snapshot_cache().peek(get_snapshot_key())
+    if not snapshot or snapshot.delta is None:
+        st.info("Changes appear here once ELD data has been fetched at least twice.")
+        return
+
+    st.caption(f"Data as of {snapshot.fetched_at:%Y-%m-%d %H:%M:%S}")
+    for column, (label, count) in zip(st.columns(4), snapshot.delta.counts().items()):
+        column.metric(label, count)
+
+    if not len(snapshot.delta):
+        st.success("✅ No driver changes since the previous fetch.")
+        return
+
+    export_format = render_export_format_selector("changes_export_format")
+    df_changes = snapshot.delta.change_frame()
+    st.dataframe(df_changes, use_container_width=True)
+    render_download_button("📥 Download Changes Report", df_changes, "eld_changes", export_format)
+
+
+@st.fragment
+def render_history_report():
+    st.markdown("### 🕰️ History")
+    st.write("Trends and durations from every recorded ELD fetch, without calling the API again.")
+
+    if not ELD_HISTORY_DB:
+        st.info("Set ELD_HISTORY_DB to record fetched snapshots for this tab.")
+        return
+    try:
+        history = open_snapshot_history(ELD_HISTORY_DB)
+    except sqlite3.Error as e:
+        st.info(f"History is off: could not open {ELD_HISTORY_DB} ({str(e)}). Set ELD_HISTORY_DB to a writable path.")
+        return
+
+    fleets = [ELD_HISTORY_DEFAULT_FLEET, *(fleet.name for fleet in ELD_FLEETS)]
+    fleet = st.selectbox("Fleet", fleets, key="history_fleet") if ELD_FLEETS else ELD_HISTORY_DEFAULT_FLEET
+    first, last = history.observed_range(fleet)
+    if first is None:
+        st.info("History appears here once ELD data has been fetched.")
+        return
+    st.caption(f"Recorded from {first:%Y-%m-%d %H:%M} to {last:%Y-%m-%d %H:%M}")
+
+    today = datetime.now().date()
+    date_range = st.date_input(
+        "Date range", value=(today - timedelta(days=7), today), max_value=today, key="history_range"
+    )
+    if len(date_range) != 2:
+        return
+    start = datetime.combine(date_range[0], datetime.min.time())
+    end = datetime.combine(date_range[1] + timedelta(days=1), datetime.min.time())
+    export_format = render_export_format_selector("history_export_format")
+
+    st.markdown("#### Drivers per Status")
+    trend = history.status_trend(start, end, freq='1h' if end - start <= timedelta(days=2) else '1D', fleet=fleet)
+    if trend.empty:
+        st.caption("No recorded fetches in this range.")
+    else:
+        st.line_chart(trend)
+
+    st.markdown("#### Time in Status")
+    status = st.selectbox("Status", STATUS_OPTIONS, index=STATUS_OPTIONS.index('SB'), key="history_status")
+    min_share = st.slider(
+        "Minimum share of the range", 0, 100, 0, step=5, format="%d%%", key="history_min_share",
+        help="100% lists only drivers who were in this status for the whole recorded range."
+    ) / 100
+    df_durations = history.status_durations(start, end, status=status, min_share=min_share, fleet=fleet)
+    st.dataframe(df_durations.round({'Hours': 1, 'Share of Range': 3}), use_container_width=True, hide_index=True)
+    render_download_button(
+        f"📥 Download Time in {status} Report", df_durations, f"{status_file_slug(status)}_durations", export_format
+    )
+
+    st.markdown("#### Double-Assigned Trucks")
+    truck = st.text_input("Truck Number (optional)", key="history_truck").strip()
+    df_periods = history.truck_conflict_periods(start, end, truck=truck or None, fleet=fleet)
+    if df_periods.empty:
+        st.success("✅ No truck had more than one driver at once in this range.")
+    else:
+        st.dataframe(df_periods.round({'Hours Double-Assigned': 1}), use_container_width=True, hide_index=True)
+        render_download_button(
+            "📥 Download Double-Assignment Report", df_periods, "truck_double_assignments", export_format
+        )
+
+    driver_id = st.text_input("Driver ID history (optional)", key="history_driver").strip()
+    if driver_id:
+        df_driver = history.driver_history(driver_id, start, end, fleet=fleet)
+        if df_driver.empty:
+            st.caption(f"No recorded states for driver {driver_id} in this range.")
+        else:
+            st.dataframe(df_driver.round({'Hours': 1}), use_container_width=True, hide_index=True)
+
+
+def render_username_issue_diff(previous_issues, username_issues):
+    issue_diff = diff_username_issues(previous_issues, username_issues)
+    st.markdown("#### Since the previous upload")
+    for column, (label, count) in zip(st.columns(2), issue_diff.counts().items()):
+        column.metric(label, count)
+    if len(issue_diff.resolved):
+        with st.expander(f"✅ Resolved issues ({len(issue_diff.resolved)})"):
+            st.dataframe(issue_diff.resolved, use_container_width=True)
+    if len(issue_diff.introduced):
+        with st.expander(f"⚠️ New issues ({len(issue_diff.introduced)})"):
+            st.dataframe(issue_diff.introduced, use_container_width=True)
+
+
+@st.fragment
 def render_username_validator():
     st.markdown("### 🧾 Username Pattern Validator")
     st.write(
@@ -315,19 +669,48 @@ def render_username_validator():
     if uploaded_file is None:
         return
 
+    progress_bar = st.progress(0.0, text="Validating usernames...")
+
+    def show_progress(rows_read):
+        # Note: the upload's read position tracks how much of the file the CSV reader has consumed
+        fraction = uploaded_file.tell() / uploaded_file.size if uploaded_file.size else 1.0
+        progress_bar.progress(min(fraction, 1.0), text=f"Validated {rows_read:,} rows...")
+
+    def validate_upload():
+        uploaded_file.seek(0)
+        return find_username_issues_chunked(
+            uploaded_file,
+            chunk_size=USERNAME_CSV_CHUNK_ROWS,
+            on_progress=show_progress,
+            validate=get_username_cache().find_username_issues
+        )
+
+    # The same file uploaded again (or the rerun after a download) reuses the earlier validation
+    upload_key = ("username_issues", bytes_digest(uploaded_file.getvalue()), USERNAME_CSV_CHUNK_ROWS)
     try:
-        drivers_df = pd.read_csv(uploaded_file, dtype=str)
+        username_issues, missing_columns, skipped_count = get_artifact_cache().get_or_create(
+            upload_key, validate_upload
+        )
     except Exception as e:
         st.error(f"Could not read CSV file: {str(e)}")
         return
+    finally:
+        progress_bar.empty()
 
-    username_issues, missing_columns, skipped_count = find_username_issues(drivers_df)
     if missing_columns:
         st.error(f"CSV is missing required columns: {', '.join(missing_columns)}")
         return
 
     st.info(f"Skipped {skipped_count} exception records with Team or local in Notes.")
 
+    # Remember this session's previous upload, so a corrected re-upload shows what it fixed and what it broke
+    uploads = st.session_state.setdefault("username_uploads", {"digest": None, "issues": None, "previous": None})
+    if uploads["digest"] != upload_key[1]:
+        uploads["previous"] = uploads["issues"]
+        uploads["digest"], uploads["issues"] = upload_key[1], username_issues
+    if uploads["previous"] is not None:
+        render_username_issue_diff(uploads["previous"], username_issues)
+
     if username_issues.empty:
         st.success("✅ No username pattern issues found.")
         return
@@ -335,7 +718,9 @@ def render_username_validator():
     st.warning(f"Found {len(username_issues)} drivers with incorrect usernames.")
     st.dataframe(username_issues, use_container_width=True)
 
-    csv_file = username_issues.to_csv(index=False).encode("utf-8")
+    csv_file = get_artifact_cache().get_or_create(
+        (*upload_key, "CSV"), lambda: username_issues.to_csv(index=False).encode("utf-8")
+    )
     st.download_button(
         label="📥 Download Username Issues CSV",
         data=csv_file,
@@ -343,20 +728,24 @@ def render_username_validator():
         mime="text/csv"
     )
 
-    excel_file = create_excel_file(username_issues)
+    excel_file = get_artifact_cache().get_or_create(
+        (*upload_key, "XLSX"), lambda: create_excel_file(username_issues).getvalue()
+    )
     st.download_button(
         label="📥 Download Username Issues Excel",
         data=excel_file,
         file_name="username_pattern_issues.xlsx",
-        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        mime=EXCEL_MIME
     )
 
 
-status_tab, conflicts_tab, username_tab = st.tabs([
-    "1. Driver Status",
-    "2. Vehicle Conflicts",
-    "3. Username Pattern"
-])
+render_snapshot_status()
+
+tab_names = ["1. Driver Status", "2. Vehicle Conflicts", "3. Username Pattern", "4. Changes", "5. History"]
+if ELD_FLEETS:
+    tab_names.append("6. Fleets")
+# Note: each tab is a fragment, so a click inside it reruns only that tab instead of the whole script
+status_tab, conflicts_tab, username_tab, changes_tab, history_tab, *fleet_tabs = st.tabs(tab_names)
 
 with status_tab:
     render_status_report()
@@ -367,6 +756,20 @@ with conflicts_tab:
 with username_tab:
     render_username_validator()
 
+with changes_tab:
+    render_snapshot_changes()
+
+with history_tab:
+    render_history_report()
+
+for fleets_tab in fleet_tabs:
+    with fleets_tab:
+        render_fleet_overview()
+
+# Note: rendered after the tabs so a full run includes the stages it just timed; clicks inside a tab rerun
+# only that tab's fragment, so the panel catches up on the next full run
+render_metrics_panel()
+
 # Add some spacing and information
 # st.markdown("---")
 # st.markdown("""
@@ -1,155 +1,483 @@
-import aiohttp
 import asyncio
+import itertools
 from collections import defaultdict
 from dataclasses import dataclass
-from typing import List, Dict, Optional, Literal
+from typing import AsyncIterator, Iterable, Iterator, List, Dict, NamedTuple, Optional, Literal, Sequence
 import json
-from dataclasses import asdict
+import sys
+import time
+import numpy as np
+import pandas as pd
 import requests
 
+from eld_http import (
+    ELD_MAX_CONCURRENCY,
+    ELD_MAX_PAGES,
+    ELD_PAGE_LIMIT_PARAM,
+    ELD_PAGE_OFFSET_PARAM,
+    ELD_REQUEST_TIMEOUT,
+    ELD_STATUS_PARAM,
+    NOT_MODIFIED,
+    ContentDecoder,
+    ELDPayload,
+    PaginationError,
+    Validators,
+    build_eld_headers,
+    build_eld_url,
+    close_async_http_session,
+    get_async_http_session,
+    get_http_session,
+    iter_raw_chunks,
+)
+from eld_metrics import record_stage, stage
+from eld_resilience import RetryPolicy, get_circuit_breaker, is_retryable
+from eld_stream import JSONArrayStreamParser
+
 from dotenv import load_dotenv
 import os
 # Note: @dataclass is a decorator that automatically adds special methods to a class, such as __init__, __repr__, and __eq__.
 # Below is called a Data Model
 load_dotenv()
 
-@dataclass
-class ELDDriver:
+# Response body chunk size used when streaming the driver payload
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Note: a NamedTuple has no per-instance __dict__ and is built as fast as a plain tuple (a frozen slotted dataclass
+# pays an object.__setattr__ per field); being immutable, records can be shared, e.g. by conflict results, not copied
+class ELDDriver(NamedTuple):
     driverID: int
     firstName: str
     lastName: str
     phoneNo: str
     truckNo: Optional[str] = None
-    truckCount: Optional[int] = None
+    status: Optional[str] = None
+
+
+class VehicleConflict(NamedTuple):
+    driver: ELDDriver   # the original record, not a copy
+    truckCount: int     # drivers on the same truck
+
+    def as_dict(self) -> dict:
+        return {**self.driver._asdict(), "truckCount": self.truckCount}
+
+@dataclass
+class TruckConflicts:
+    positions: np.ndarray     # input positions of drivers on a shared truck, in input order
+    truck_counts: np.ndarray  # drivers on the same truck, aligned with positions
+    summary: pd.DataFrame     # one row per shared truck: Truck Number, Driver Count, Driver IDs
+
+
+def intern_value(value):
+    """Share one string object per distinct truck or status instead of one per driver"""
+    return sys.intern(value) if type(value) is str else value
+
+
+def parse_eld_driver(item: Optional[dict]) -> Optional[ELDDriver]:
+    """Build one ELDDriver from a `Data[]` item of the `api/v1/driver/eld/` payload; every fetch path parses with this"""
+    if not item:
+        return None
+
+    driver = item.get("Driver", {}) or {}
+    # Note: {} outside of get is useful if we have the response of Driver as None rather than Nothing or with some response
+    vehicle = item.get("Vehicle", {}) or {}
+    log = item.get("Log", {}) or {}
+
+    # Note: _make builds straight from a tuple, skipping the argument handling of ELDDriver(...) on this hot path
+    return ELDDriver._make((
+        driver.get("ID"),
+        driver.get("FirstName", ""),
+        driver.get("LastName", ""),
+        driver.get("PhoneNo", ""),
+        intern_value(vehicle.get("DisplayID", "")),
+        intern_value(log.get("CurrentStatus")),
+    ))
+
+
+def iter_eld_drivers(items: Iterable[dict]) -> Iterator[ELDDriver]:
+    """ELDDriver records from `Data[]` items, consuming them one at a time; empty items are skipped"""
+    for item in items:
+        driver = parse_eld_driver(item)
+        if driver is not None:
+            yield driver
+
+
+def normalize_truck_ids(trucks: pd.Series) -> pd.Series:
+    """Ignore case and whitespace so "t 101 " and "T101" count as the same truck"""
+    return trucks.str.replace(r"\s+", "", regex=True).str.upper()
+
+
+def find_truck_conflicts(trucks: Sequence, driver_ids: Sequence, normalize: bool = False) -> TruckConflicts:
+    """Count drivers per truck over whole columns (factorize + bincount) instead of per-driver Python loops"""
+    keys = pd.Series(trucks, dtype=object).fillna("").astype(str)
+    if normalize:
+        keys = normalize_truck_ids(keys)
+
+    codes, uniques = pd.factorize(keys, sort=False)
+    row_counts = np.bincount(codes, minlength=len(uniques))[codes]
+    # Note: an empty DisplayID means no truck is assigned, so it never counts as a conflict
+    mask = (row_counts > 1) & (keys.to_numpy() != "")
+    positions = np.flatnonzero(mask)
+
+    # Group conflicting drivers by truck with one stable sort; factorize codes follow first appearance
+    conflict_codes = codes[positions]
+    order = np.argsort(conflict_codes, kind="stable")
+    sorted_codes = conflict_codes[order]
+    starts = np.flatnonzero(np.diff(sorted_codes, prepend=-1))
+    ids_by_truck = np.split(np.asarray(driver_ids, dtype=object)[positions][order], starts[1:])
+
+    summary = pd.DataFrame({
+        "Truck Number": uniques.to_numpy()[sorted_codes[starts]],
+        "Driver Count": np.diff(np.append(starts, len(order))),
+        "Driver IDs": [truck_driver_ids.tolist() for truck_driver_ids in ids_by_truck] if len(order) else [],
+    })
+    return TruckConflicts(positions=positions, truck_counts=row_counts[positions], summary=summary)
+
 
 class ELDSync:
     # Task: Task to modify the 
-    def __init__(self, eld_api_url: str,  eld_api_key: str) -> None:
+    def __init__(self, eld_api_url: str,  eld_api_key: str, retry_policy: Optional[RetryPolicy] = None) -> None:
         self.eld_api_url = eld_api_url
         self.eld_api_key = eld_api_key
-        self.eld_headers = {
-            'X-Api-Key': self.eld_api_key,
-            'Content-Type': 'application/json'
-        }
+        self.eld_headers = build_eld_headers(self.eld_api_key)
+        self.eld_drivers_url = build_eld_url(self.eld_api_url)
+        # Every request is retried and optionally hedged; the breaker is shared by all clients of the same account
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.circuit_breaker = get_circuit_breaker(self.eld_drivers_url, self.eld_api_key)
     
+    parse_eld_driver = staticmethod(parse_eld_driver)
+
+    def parse_eld_drivers(self, data: Optional[dict]) -> List[ELDDriver]:
+        """Build ELDDriver records from a raw `api/v1/driver/eld/` payload"""
+        if not data:
+            return []
+
+        return self.parse_eld_items(data.get("Data", []) or [])
+
+    def parse_eld_items(self, items: Iterable[dict]) -> List[ELDDriver]:
+        """Build ELDDriver records from `Data[]` items, consuming them one at a time"""
+        return list(iter_eld_drivers(items))
+
+    def request_headers(self, validators: Optional[Validators] = None) -> dict:
+        """Request headers; given the validators of a payload already in use, only ask for a changed one"""
+        headers = dict(self.eld_headers)
+        if validators is not None:
+            etag, last_modified = validators
+            if etag:
+                headers['If-None-Match'] = etag
+            if last_modified:
+                headers['If-Modified-Since'] = last_modified
+        return headers
+
+    @staticmethod
+    def response_validators(response: requests.Response) -> Validators:
+        return response.headers.get('ETag'), response.headers.get('Last-Modified')
+
+    def fetch_eld_payload(self) -> dict:
+        """Fetch the whole `api/v1/driver/eld/` payload over the pooled keep-alive session"""
+        return self.fetch_conditional_payload().body
+
+    def fetch_conditional_payload(self, validators: Optional[Validators] = None) -> ELDPayload:
+        """fetch_eld_payload, returning the payload with its validators.
+
+        Given the validators of a payload already in use, the body is NOT_MODIFIED if the API says nothing changed.
+        Note: the validators are not kept here; the caller keeps them with whatever it builds from the payload
+        """
+        def request():
+            response = get_http_session().get(
+                self.eld_drivers_url, headers=self.request_headers(validators), timeout=ELD_REQUEST_TIMEOUT, stream=True
+            )
+            with response:
+                response.raise_for_status()
+                # Note: reading the body here puts a slow or broken download under the retry and hedging policy too.
+                # It is read as sent, so decompression can be timed on its own below
+                body = b"".join(iter_raw_chunks(response, STREAM_CHUNK_SIZE))
+            return response, body
+
+        with stage("api_request") as metric:
+            response, body = self.retry_policy.call(request, self.circuit_breaker)
+            metric.bytes = len(body)
+            metric.labels["status"] = str(response.status_code)
+        if response.status_code == 304:
+            return ELDPayload(NOT_MODIFIED, validators)
+
+        decoder = ContentDecoder(response.headers.get('Content-Encoding'))
+        if decoder.encoding != "identity":
+            with stage("decompress", encoding=decoder.encoding) as metric:
+                body = decoder.decode(body) + decoder.flush()
+                metric.bytes = len(body)
+
+        with stage("json_decode") as metric:
+            payload = json.loads(body)
+            metric.bytes = len(body)
+            metric.records = len(payload.get("Data") or []) if isinstance(payload, dict) else None
+        return ELDPayload(payload, self.response_validators(response))
+
+    def iter_eld_items(self) -> Iterator[dict]:
+        """Stream `Data[]` items from the API, parsing each one as its bytes arrive"""
+        yield from self.open_eld_stream()
+
+    def open_eld_stream(self) -> Iterator[dict]:
+        """Send the request now and return an iterator that streams the `Data[]` items from it"""
+        return self.open_conditional_stream().body
+
+    def open_conditional_stream(self, validators: Optional[Validators] = None) -> ELDPayload:
+        """open_eld_stream, returning the item stream with the payload's validators.
+
+        Given the validators of a payload already in use, the body is NOT_MODIFIED if the API says nothing changed.
+        The validators are known before the first item, but only stand for the data once the stream is read in full.
+        """
+        def request():
+            response = get_http_session().get(
+                self.eld_drivers_url,
+                headers=self.request_headers(validators),
+                timeout=ELD_REQUEST_TIMEOUT,
+                stream=True
+            )
+            try:
+                response.raise_for_status()
+            except requests.exceptions.HTTPError:
+                response.close()
+                raise
+            return response
+
+        # Note: only getting the response is retried; once items have been handed out a failure is the caller's
+        with stage("api_request", mode="stream") as metric:
+            response = self.retry_policy.call(request, self.circuit_breaker)
+            metric.labels["status"] = str(response.status_code)
+        if response.status_code == 304:
+            response.close()
+            return ELDPayload(NOT_MODIFIED, validators)
+        return ELDPayload(self.iter_response_items(response), self.response_validators(response))
+
+    def iter_response_items(self, response: requests.Response) -> Iterator[dict]:
+        # Downloading, decompressing and decoding interleave chunk by chunk, so each is timed separately and recorded
+        # once at the end; time the consumer spends between items is left to the consumer's own stage
+        parser = JSONArrayStreamParser("Data")
+        download_seconds = decompress_seconds = decode_seconds = 0.0
+        received_bytes = decoded_bytes = item_count = 0
+        with response:
+            decoder = ContentDecoder(response.headers.get('Content-Encoding'))
+            chunks = iter_raw_chunks(response, STREAM_CHUNK_SIZE)
+            while True:
+                started = time.perf_counter()
+                try:
+                    chunk = next(chunks, None)
+                except Exception as e:
+                    if self.circuit_breaker is not None and is_retryable(e):
+                        self.circuit_breaker.record_failure()
+                    raise
+                download_seconds += time.perf_counter() - started
+                if chunk is None:
+                    break
+                received_bytes += len(chunk)
+
+                started = time.perf_counter()
+                data = decoder.decode(chunk)
+                decompress_seconds += time.perf_counter() - started
+                decoded_bytes += len(data)
+
+                started = time.perf_counter()
+                items = parser.feed(data)
+                decode_seconds += time.perf_counter() - started
+                item_count += len(items)
+                yield from items
+
+            started = time.perf_counter()
+            data = decoder.flush()
+            decompress_seconds += time.perf_counter() - started
+            decoded_bytes += len(data)
+
+            started = time.perf_counter()
+            items = parser.feed(data) + parser.close()
+            decode_seconds += time.perf_counter() - started
+            item_count += len(items)
+            yield from items
+
+        record_stage("api_download", download_seconds, bytes=received_bytes, mode="stream")
+        if decoder.encoding != "identity":
+            record_stage("decompress", decompress_seconds, bytes=decoded_bytes, encoding=decoder.encoding, mode="stream")
+        record_stage("json_decode", decode_seconds, bytes=decoded_bytes, records=item_count, mode="stream")
+
     def fetch_eld_drivers_sync(self):
         """Synchronous version for Streamlit compatibility"""
         try:
-            response = requests.get(
-                f"{self.eld_api_url}/api/v1/driver/eld/", 
-                headers=self.eld_headers,
-                timeout=30
-            )
-            response.raise_for_status()
-            data = response.json()
-            
-            if not data:
-                return []
-
-            drivers = []
-            for item in data.get("Data", []):
-                if not item:
-                    continue
-                    
-                driver = item.get("Driver", {}) or {}
-                # Note: {} outside of get is useful if we have the response of Driver as None rather than Nothing or with some response
-                vehicle = item.get("Vehicle", {}) or {}
-                
-                driver_id = driver.get("ID", "")
-                first_name = driver.get("FirstName", "")
-                last_name = driver.get("LastName", "")
-                phone_no = driver.get("PhoneNo", "")
-                truck = vehicle.get("DisplayID", "")
-
-                drivers.append(ELDDriver(
-                    driverID=driver_id,
-                    firstName=first_name,
-                    lastName=last_name,
-                    phoneNo=phone_no,
-                    truckNo=truck
-                ))
-
+            # Note: streaming keeps peak memory to one chunk plus one item instead of the whole body and object tree
+            with stage("fetch_eld_drivers") as metric:
+                drivers = self.parse_eld_items(self.iter_eld_items())
+                metric.records = len(drivers)
             return drivers
         except Exception as e:
             print(f"Error fetching drivers: {e}")
             return []
     
-    async def fetch_eld_drivers(self):
-        async with aiohttp.ClientSession() as session:
-            async with session.get(f"{self.eld_api_url}/api/v1/driver/eld/", headers=self.eld_headers) as response:
-                data = await response.json()
-                
-                if not data:
-                    return []
-
-                drivers = []
-                for item in data.get("Data", []):
-                    if not item:
-                        continue
-                        
-                    driver = item.get("Driver", {}) or {}
-                    # Note: {} outside of get is useful if we have the response of Driver as None rather than Nothing or with some response
-                    vehicle = item.get("Vehicle", {}) or {}
-                    
-                    driver_id = driver.get("ID", "")
-                    first_name = driver.get("FirstName", "")
-                    last_name = driver.get("LastName", "")
-                    phone_no = driver.get("PhoneNo", "")
-                    truck = vehicle.get("DisplayID", "")
-
-                    drivers.append(ELDDriver(
-                        driverID=driver_id,
-                        firstName=first_name,
-                        lastName=last_name,
-                        phoneNo=phone_no,
-                        truckNo=truck
-                    ))
-
-                return drivers 
-
-    def find_vehicle_conflicts(self, drivers: List[ELDDriver]):
-        # Algorithm to find the duplicated the drivers
+    async def fetch_eld_drivers(
+        self,
+        page_size: Optional[int] = None,
+        statuses: Optional[Sequence[str]] = None,
+        max_concurrency: int = ELD_MAX_CONCURRENCY
+    ):
+        """Fetch every driver, optionally split into pages or status shards fetched concurrently.
+
+        With page_size the pull is split by offset/limit; with statuses it is split into one request per status
+        (drivers whose status is not listed are then left out). Otherwise it is one streamed request.
         """
-        Arg: Drivers list of dataclass
-        Task
-         - initially, output in json those same trucks
+        if not page_size and not statuses:
+            async def request():
+                # Note: the session is shared per event loop, so repeat calls reuse open keep-alive connections
+                session = get_async_http_session()
+                async with session.get(self.eld_drivers_url, headers=self.eld_headers) as response:
+                    response.raise_for_status()
+                    parser = JSONArrayStreamParser("Data")
+                    drivers = []
+                    async for chunk in response.content.iter_chunked(STREAM_CHUNK_SIZE):
+                        drivers.extend(iter_eld_drivers(parser.feed(chunk)))
+                    drivers.extend(iter_eld_drivers(parser.close()))
+
+                    return drivers
+
+            return await self.retry_policy.call_async(request, self.circuit_breaker)
+
+        drivers = []
+        async for items in self.iter_eld_item_pages(page_size, statuses, max_concurrency):
+            drivers.extend(iter_eld_drivers(items))
+        return drivers
+
+    async def fetch_eld_items(
+        self,
+        page_size: Optional[int] = None,
+        statuses: Optional[Sequence[str]] = None,
+        max_concurrency: int = ELD_MAX_CONCURRENCY
+    ) -> List[dict]:
+        """Fetch the raw `Data[]` items, paged or sharded the same way as fetch_eld_drivers"""
+        if not page_size and not statuses:
+            return await self.fetch_eld_page({})
+
+        items = []
+        async for page in self.iter_eld_item_pages(page_size, statuses, max_concurrency):
+            items.extend(page)
+        return items
+
+    async def fetch_eld_page(self, params: Dict[str, str]) -> List[dict]:
+        """Fetch one page or shard of `Data[]` items, retried and hedged on its own"""
+        async def request():
+            session = get_async_http_session()
+            with stage("api_page") as metric:
+                async with session.get(self.eld_drivers_url, headers=self.eld_headers, params=params) as response:
+                    response.raise_for_status()
+                    parser = JSONArrayStreamParser("Data")
+                    items = []
+                    metric.bytes = 0
+                    async for chunk in response.content.iter_chunked(STREAM_CHUNK_SIZE):
+                        metric.bytes += len(chunk)
+                        items.extend(parser.feed(chunk))
+                    items.extend(parser.close())
+                    metric.records = len(items)
+                    return items
+
+        return await self.retry_policy.call_async(request, self.circuit_breaker)
+
+    async def iter_eld_item_pages(
+        self,
+        page_size: Optional[int] = None,
+        statuses: Optional[Sequence[str]] = None,
+        max_concurrency: int = ELD_MAX_CONCURRENCY,
+        max_pages: int = ELD_MAX_PAGES
+    ) -> AsyncIterator[List[dict]]:
+        """Yield pages of `Data[]` items in order, fetching up to max_concurrency of them at once.
+
+        Pages are requested ahead of time since the total is unknown; the first short page marks the end.
+        A page that finishes early is held until every page before it has been yielded.
+        Raises PaginationError if the API evidently ignores offset/limit (a page longer than page_size, or the same
+        page twice in a row) or paging has not ended after max_pages pages.
+        """
+        if statuses:
+            requests_params = ({ELD_STATUS_PARAM: status} for status in statuses)
+        else:
+            requests_params = (
+                {ELD_PAGE_OFFSET_PARAM: str(page * page_size), ELD_PAGE_LIMIT_PARAM: str(page_size)}
+                for page in itertools.count()
+            )
+
+        in_flight = {}
+        finished = {}
+        next_page = 0
+        next_to_yield = 0
+        last_page = None
+        paged = bool(page_size) and not statuses
+        previous_page = None
+        try:
+            while True:
+                # Keep max_concurrency requests in flight until the last page is known
+                while len(in_flight) < max_concurrency and last_page is None:
+                    if paged and max_pages and next_page >= max_pages:
+                        break
+                    params = next(requests_params, None)
+                    if params is None:
+                        last_page = next_page - 1
+                        break
+                    in_flight[asyncio.ensure_future(self.fetch_eld_page(params))] = next_page
+                    next_page += 1
+
+                while next_to_yield in finished:
+                    page_items = finished.pop(next_to_yield)
+                    if paged and page_items and page_items == previous_page:
+                        raise PaginationError(
+                            f"Page {next_to_yield} repeats the page before it; the API seems to ignore "
+                            f"{ELD_PAGE_OFFSET_PARAM}"
+                        )
+                    previous_page = page_items
+                    yield page_items
+                    next_to_yield += 1
+
+                if last_page is not None and next_to_yield > last_page:
+                    return
+                if not in_flight:
+                    # Only the page cap stops requests before the last page is known
+                    raise PaginationError(f"Paged fetch did not end after {max_pages} pages of {page_size}")
+
+                done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    page = in_flight.pop(task)
+                    finished[page] = task.result()
+                    if paged and len(finished[page]) > page_size:
+                        raise PaginationError(
+                            f"Page {page} has {len(finished[page])} drivers for a limit of {page_size}; "
+                            f"the API seems to ignore {ELD_PAGE_LIMIT_PARAM}"
+                        )
+                    if paged and len(finished[page]) < page_size:
+                        last_page = page if last_page is None else min(last_page, page)
+
+                if last_page is not None:
+                    # Pages requested past the end were speculative
+                    for task, page in list(in_flight.items()):
+                        if page > last_page:
+                            task.cancel()
+                            del in_flight[task]
+                    for page in [page for page in finished if page > last_page]:
+                        del finished[page]
+        finally:
+            for task in in_flight:
+                task.cancel()
+
+    def find_vehicle_conflicts(self, drivers: List[ELDDriver], normalize_trucks: bool = False) -> List[VehicleConflict]:
+        """Return a VehicleConflict for each driver sharing a truck with someone else.
+
+        Each conflict points at the driver's original record; nothing is copied or modified.
         """
+        return self.vehicle_conflict_report(drivers, normalize_trucks)[0]
 
-        
-        # approach: go through each driver and save in hashmap
-        truck_map = {}
-
-        for driver in drivers:
-            
-            if driver.truckNo:
-                # append to truck map
-                truck = driver.truckNo
-                truck_map[truck] = 1 + truck_map.get(truck, 0)
-        
-        # Update each driver with their truck count
-        for driver in drivers:
-            if driver.truckNo:
-                driver.truckCount = truck_map.get(driver.truckNo, 0)
-        
-        incorrect_assignments = []
-        for driver in drivers:
-            if driver.truckNo and driver.truckCount > 1:
-                incorrect_assignments.append(ELDDriver(
-                        driverID=driver.driverID,
-                        firstName=driver.firstName,
-                        lastName=driver.lastName,
-                        phoneNo=driver.phoneNo,
-                        truckNo=driver.truckNo,
-                        truckCount=driver.truckCount
-                ))
-        
-        return incorrect_assignments
-
-
-        # Lets return those which are having truckCount more than 1
-
-        
-        # check all driver.truck against hashmap and attach the count.
+    def vehicle_conflict_report(self, drivers: List[ELDDriver], normalize_trucks: bool = False):
+        """Return (conflicting drivers, per-truck summary) computed in one vectorized pass"""
+        conflicts = find_truck_conflicts(
+            [driver.truckNo for driver in drivers],
+            [driver.driverID for driver in drivers],
+            normalize=normalize_trucks
+        )
+        incorrect_assignments = [
+            VehicleConflict(drivers[position], count)
+            for position, count in zip(conflicts.positions.tolist(), conflicts.truck_counts.tolist())
+        ]
+        return incorrect_assignments, conflicts.summary
 
 
 async def main():
@@ -159,7 +487,11 @@ async def main():
     }
 
     sync = ELDSync(**config)
-    drivers = await sync.fetch_eld_drivers()
+    try:
+        # ELD_PAGE_SIZE splits the pull into pages fetched concurrently
+        drivers = await sync.fetch_eld_drivers(page_size=int(os.getenv("ELD_PAGE_SIZE", 0)) or None)
+    finally:
+        await close_async_http_session()
 
     # Note: above output will be the list of dataclass but we need list of dictionary. so we will convert back now.
     # driver_dict = [asdict(driver) for driver in drivers]
@@ -168,7 +500,7 @@ async def main():
     #     json.dump(driver_dict, f)
 
     incorrect_assignments = sync.find_vehicle_conflicts(drivers)
-    wrong_assgnmt_driver_dict = [asdict(driver) for driver in incorrect_assignments]
+    wrong_assgnmt_driver_dict = [conflict.as_dict() for conflict in incorrect_assignments]
 
     with open("fetched_drivers_final.json", "w") as f:
         json.dump(wrong_assgnmt_driver_dict, f)
@@ -0,0 +1,92 @@
+"""Memoized report artifacts (DataFrames and export file bytes) keyed by a content hash of their source data."""
+import hashlib
+import threading
+from typing import Any, Callable, Dict, Hashable
+
+import pandas as pd
+import pyarrow as pa
+from cachetools import LRUCache
+
+
+def table_digest(table: pa.Table) -> str:
+    """Hash a table's schema and column buffers; equal digests mean equal content and layout"""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(str(table.schema).encode("utf-8"))
+    for column in table.columns:
+        for chunk in column.chunks:
+            # Note: a slice shares its parent's buffers, so its offset and length are part of its identity
+            digest.update(f"{chunk.offset}:{len(chunk)};".encode("ascii"))
+            for buffer in chunk.buffers():
+                if buffer is not None:
+                    digest.update(buffer)
+    return digest.hexdigest()
+
+
+def bytes_digest(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def artifact_size(value: Any) -> int:
+    """Approximate bytes held by a cached artifact, for the cache's memory budget"""
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, tuple):
+        return sum(artifact_size(item) for item in value)
+    return 64
+
+
+class ArtifactCache:
+    """LRU cache of generated artifacts bounded by total size rather than entry count.
+
+    Concurrent requests for the same missing key wait for one build instead of each building it.
+    """
+
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024) -> None:
+        self._cache = LRUCache(maxsize=max_bytes, getsizeof=artifact_size)
+        self._building: Dict[Hashable, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def current_bytes(self) -> int:
+        return self._cache.currsize
+
+    @property
+    def max_bytes(self) -> int:
+        return self._cache.maxsize
+
+    def get_or_create(self, key: Hashable, create: Callable[[], Any]) -> Any:
+        with self._lock:
+            if key in self._cache:
+                self.hits += 1
+                return self._cache[key]
+            build_lock = self._building.setdefault(key, threading.Lock())
+
+        with build_lock:
+            with self._lock:
+                # Another caller may have finished building it while this one waited
+                if key in self._cache:
+                    self.hits += 1
+                    return self._cache[key]
+                self.misses += 1
+
+            try:
+                value = create()
+                with self._lock:
+                    try:
+                        self._cache[key] = value
+                    except ValueError:
+                        # Larger than the whole budget: hand it out without caching it
+                        pass
+            finally:
+                with self._lock:
+                    self._building.pop(key, None)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+            self.hits = self.misses = 0
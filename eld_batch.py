@@ -0,0 +1,196 @@
+"""Run every ELD report from a single fetch and write them to a directory, without Streamlit.
+
+    ELD_API_URL=... ELD_API_KEY=... python eld_batch.py reports/nightly --format CSV --usernames drivers.csv
+    python eld_batch.py reports/nightly --fleets fleets.json    # one subdirectory per fleet plus combined reports
+
+With fleets, the ELD_API_URL/ELD_API_KEY account (if set) is fetched alongside them as the "default" fleet.
+"""
+import argparse
+import os
+import sqlite3
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import requests
+
+from duplicate import ELDSync
+from eld_fleets import FleetConfig, MultiFleetResult, fetch_fleets_sync, load_fleet_configs
+from eld_history import ELD_HISTORY_DB, ELD_HISTORY_DEFAULT_FLEET, SnapshotHistory
+from eld_snapshot import STATUS_OPTIONS, ELDSnapshot
+from reports import (
+    ADMIN_TAG_STATUSES,
+    EXPORT_FORMATS,
+    USERNAME_CSV_CHUNK_ROWS,
+    create_excel_workbook,
+    create_export_file,
+    find_username_issues_chunked,
+    status_file_slug,
+)
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def write_file(path: Path, data) -> Path:
+    """Write an in-memory report file to path"""
+    path.write_bytes(data.getbuffer())
+    return path
+
+
+def write_report(output_dir: Path, file_stem: str, dataframe, export_format: str) -> Path:
+    extension, _ = EXPORT_FORMATS[export_format]
+    return write_file(output_dir / f"{file_stem}.{extension}", create_export_file(dataframe, export_format))
+
+
+def fetch_snapshot(client: ELDSync, stream: bool = True) -> ELDSnapshot:
+    """Fetch the driver payload once; every report below is built from this snapshot"""
+    if stream:
+        return ELDSnapshot.from_items(client.iter_eld_items())
+    return ELDSnapshot.from_items(client.fetch_eld_payload().get('Data') or [])
+
+
+def record_history(history_path: str, snapshots: dict) -> None:
+    """Append each fleet's snapshot to the history store; a failure is reported but does not stop the reports"""
+    try:
+        history = SnapshotHistory(history_path)
+        for fleet, snapshot in snapshots.items():
+            history.append(snapshot, fleet=fleet)
+    except (sqlite3.Error, ValueError) as e:
+        print(f"Could not record history in {history_path}: {e}", file=sys.stderr)
+
+
+def write_status_reports(snapshot: ELDSnapshot, output_dir: Path, export_format: str) -> list:
+    written = []
+    for status in STATUS_OPTIONS:
+        bucket = snapshot.bucket(status)
+        written.append(write_report(output_dir, f"{status_file_slug(status)}_drivers", bucket.export_frame(), export_format))
+        if status in ADMIN_TAG_STATUSES:
+            written.append(write_report(output_dir, f"{status_file_slug(status)}_admin_tags", bucket.admin_tag_frame(), "CSV"))
+
+    workbook = create_excel_workbook({status: snapshot.bucket(status).export_frame() for status in STATUS_OPTIONS})
+    written.append(write_file(output_dir / "all_status_drivers.xlsx", workbook))
+    return written
+
+
+def write_conflict_reports(snapshot: ELDSnapshot, output_dir: Path, export_format: str,
+                           normalize_trucks: bool = False) -> list:
+    df_conflicts, df_trucks = snapshot.vehicle_conflicts(normalize_trucks)
+    return [
+        write_report(output_dir, "vehicle_conflicts", df_conflicts, export_format),
+        write_report(output_dir, "vehicle_conflicts_by_truck", df_trucks, export_format),
+    ]
+
+
+def write_username_reports(csv_path: str, output_dir: Path, export_format: str,
+                           chunk_size: int = USERNAME_CSV_CHUNK_ROWS) -> list:
+    username_issues, missing_columns, skipped_count = find_username_issues_chunked(csv_path, chunk_size=chunk_size)
+    if missing_columns:
+        raise ValueError(f"CSV is missing required columns: {', '.join(missing_columns)}")
+
+    print(f"Username validation: {len(username_issues)} issues, {skipped_count} Team/local exceptions skipped")
+    return [write_report(output_dir, "username_pattern_issues", username_issues, export_format)]
+
+
+def write_fleet_reports(result: MultiFleetResult, output_dir: Path, export_format: str,
+                        normalize_trucks: bool = False) -> list:
+    """Each fleet's reports in its own subdirectory, then the combined fleet summary and cross-fleet conflicts"""
+    written = []
+    for fleet_result in result.succeeded:
+        fleet_dir = output_dir / fleet_result.fleet.name.replace(os.sep, '_')
+        fleet_dir.mkdir(parents=True, exist_ok=True)
+        written += write_status_reports(fleet_result.snapshot, fleet_dir, export_format)
+        written += write_conflict_reports(fleet_result.snapshot, fleet_dir, export_format, normalize_trucks)
+
+    df_conflicts, df_trucks = result.vehicle_conflicts(normalize_trucks)
+    written.append(write_report(output_dir, "fleet_summary", result.summary_frame(), export_format))
+    written.append(write_report(output_dir, "all_fleets_vehicle_conflicts", df_conflicts, export_format))
+    written.append(write_report(output_dir, "all_fleets_conflicts_by_truck", df_trucks, export_format))
+    return written
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Write every ELD driver report from one API fetch")
+    parser.add_argument("output_dir", help="directory to write the reports to (created if missing)")
+    parser.add_argument("--format", choices=list(EXPORT_FORMATS), default="XLSX", help="format for the report files")
+    parser.add_argument("--usernames", metavar="CSV", help="drivers CSV exported from the ELD dashboard to validate")
+    parser.add_argument("--normalize-trucks", action="store_true", help="ignore case and spaces in truck numbers")
+    parser.add_argument("--no-stream", action="store_true", help="download the whole payload before parsing it")
+    parser.add_argument("--api-url", default=os.getenv("ELD_API_URL"), help="defaults to $ELD_API_URL")
+    parser.add_argument("--fleets", metavar="JSON", help="file listing more fleet accounts to fetch concurrently "
+                        "with the $ELD_API_KEY one (a list of {name, api_url, api_key}); defaults to $ELD_FLEETS")
+    parser.add_argument("--history", metavar="DB", default=ELD_HISTORY_DB,
+                        help="SQLite file to record the fetched snapshots in; defaults to $ELD_HISTORY_DB, '' for none")
+    args = parser.parse_args(argv)
+
+    try:
+        fleets = load_fleet_configs(
+            Path(args.fleets).read_text() if args.fleets else os.getenv("ELD_FLEETS"), default_url=args.api_url
+        )
+    except (OSError, ValueError) as e:
+        parser.error(f"could not read fleets: {e}")
+    if not args.api_url and not fleets:
+        parser.error("set ELD_API_URL or pass --api-url")
+
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    # Note: the username check reads a local file, so it runs even if the API fetch fails
+    written = []
+    failed = False
+    if args.usernames:
+        try:
+            written += write_username_reports(args.usernames, output_dir, args.format)
+        except (OSError, ValueError) as e:
+            print(f"Could not validate {args.usernames}: {e}", file=sys.stderr)
+            failed = True
+
+    if fleets:
+        # Note: the fleets are extra accounts, so the default one is exported with them rather than dropped
+        api_key = os.getenv("ELD_API_KEY")
+        if args.api_url and api_key:
+            fleets = [FleetConfig(ELD_HISTORY_DEFAULT_FLEET, args.api_url, api_key), *fleets]
+        result = fetch_fleets_sync(fleets)
+        for fleet_result in result.results:
+            if fleet_result.ok:
+                print(f"{fleet_result.fleet.name}: {fleet_result.snapshot.table.num_rows} drivers "
+                      f"in {fleet_result.elapsed_seconds:.1f}s")
+            else:
+                print(f"{fleet_result.fleet.name}: failed: {fleet_result.error}", file=sys.stderr)
+        if args.history:
+            record_history(args.history, {fleet_result.fleet.name: fleet_result.snapshot
+                                          for fleet_result in result.succeeded})
+
+        written += write_fleet_reports(result, output_dir, args.format, args.normalize_trucks)
+        for path in written:
+            print(f"Wrote {path}")
+        print(f"Finished at {datetime.now():%Y-%m-%d %H:%M:%S}")
+        return 1 if failed or result.failed else 0
+
+    client = ELDSync(args.api_url, os.getenv("ELD_API_KEY"))
+    try:
+        snapshot = fetch_snapshot(client, stream=not args.no_stream)
+    except requests.exceptions.RequestException as e:
+        print(f"API request failed: {e}", file=sys.stderr)
+        return 1
+    except ValueError:
+        print("Invalid JSON response from API", file=sys.stderr)
+        return 1
+
+    summary = ", ".join(f"{status}: {count}" for status, count in snapshot.status_counts().items())
+    print(f"Fetched {snapshot.table.num_rows} drivers at {snapshot.fetched_at:%Y-%m-%d %H:%M:%S} ({summary})")
+    if args.history:
+        record_history(args.history, {ELD_HISTORY_DEFAULT_FLEET: snapshot})
+
+    written += write_status_reports(snapshot, output_dir, args.format)
+    written += write_conflict_reports(snapshot, output_dir, args.format, args.normalize_trucks)
+
+    for path in written:
+        print(f"Wrote {path}")
+    print(f"Finished at {datetime.now():%Y-%m-%d %H:%M:%S}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,192 @@
+"""Benchmark the report hot paths on synthetic fleets and compare against stored baselines.
+
+    python eld_bench.py                                   # 1k, 10k and 100k drivers, compared with the baseline
+    python eld_bench.py --sizes 1000000 --repeat 1        # the 1M fleet (about 3 GB of memory)
+    python eld_bench.py --save-baseline                   # record this machine's numbers as the new baseline
+
+Exits 1 when a case is slower (or peaks higher) than its baseline by more than the threshold.
+Baselines are machine-specific, so none is committed: record one with --save-baseline on the machine (and in the
+tree) the comparison is meant to run against, e.g. before a change, then compare after it.
+"""
+import argparse
+import gc
+import json
+import random
+import sys
+import time
+import tracemalloc
+from io import StringIO
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+import pandas as pd
+
+from duplicate import ELDSync
+from eld_snapshot import ELDSnapshot
+from eld_standin import generate_eld_items
+from reports import (
+    create_admin_tag_dataframe,
+    create_excel_dataframe,
+    create_excel_file,
+    filter_data_by_status,
+    find_username_issues,
+)
+
+BENCH_SIZES = [1000, 10000, 100000]
+BENCH_BASELINE_PATH = Path(__file__).with_name("eld_bench_baseline.json")
+# A case regresses when it takes this much longer (or peaks this much higher) than its baseline
+BENCH_THRESHOLD = 0.25
+# Fast cases are re-run until they have used this much time, so their best time is not one noisy sample
+BENCH_MIN_TOTAL_SECONDS = 0.5
+BENCH_MAX_RUNS = 50
+# Differences below these are timer and allocator noise, not regressions
+BENCH_MIN_SECONDS = 0.005
+BENCH_MIN_BYTES = 1024 * 1024
+
+def generate_eld_payload(count: int, seed: int = 0) -> dict:
+    """A realistic `api/v1/driver/eld/` payload, gaps included"""
+    return {"Status": "Success", "Data": generate_eld_items(count, seed, gaps=True)}
+
+
+def generate_driver_csv(count: int, seed: int = 0) -> str:
+    """A drivers CSV as exported from the ELD dashboard.
+
+    About 3% of rows carry Team or local notes, 10% have a wrong username and 1% a blank phone number.
+    """
+    rng = random.Random(seed)
+    rows = []
+    for index in range(count):
+        first_name, last_name = f"First{index}", f"Last{index}"
+        phone = "" if rng.random() < 0.01 else f"{rng.randint(200, 999)}-{rng.randint(100, 999)}-{rng.randint(0, 9999):04d}"
+        username = f"{phone[-4:]}{first_name[0]}{last_name[0]}".lower() if phone else f"driver{index}"
+        if rng.random() < 0.1:
+            username = f"user{index}"
+
+        roll = rng.random()
+        notes = "Team driver" if roll < 0.015 else "local only" if roll < 0.03 else ""
+        rows.append({
+            "Driver ID": 100000 + index,
+            "First Name": first_name,
+            "Last Name": last_name,
+            "Phone Number": phone,
+            "Username": username,
+            "Email": f"driver{index}@example.com",
+            "Notes": notes,
+        })
+    return pd.DataFrame(rows).to_csv(index=False)
+
+
+def build_cases(count: int, seed: int = 0) -> List[Tuple[str, Callable[[], object]]]:
+    """(name, call) pairs for one fleet size; inputs are prepared here so only the call itself is measured"""
+    payload = generate_eld_payload(count, seed)
+    driving = filter_data_by_status(payload, "Driving")
+    driving_df = create_excel_dataframe(driving)
+    sync = ELDSync("http://localhost", "bench")
+    drivers = sync.parse_eld_drivers(payload)
+    drivers_df = pd.read_csv(StringIO(generate_driver_csv(count, seed)), dtype=str)
+    snapshot = ELDSnapshot.from_items(payload["Data"])
+
+    return [
+        ("filter_data_by_status", lambda: filter_data_by_status(payload, "Driving")),
+        ("create_excel_dataframe", lambda: create_excel_dataframe(driving)),
+        ("create_admin_tag_dataframe", lambda: create_admin_tag_dataframe(driving)),
+        ("ELDSync.find_vehicle_conflicts", lambda: sync.find_vehicle_conflicts(drivers)),
+        ("find_username_issues", lambda: find_username_issues(drivers_df)),
+        ("create_excel_file", lambda: create_excel_file(driving_df)),
+        ("ELDSnapshot.from_items", lambda: ELDSnapshot.from_items(payload["Data"])),
+        # Note: a fresh snapshot per call, so the lazily counted trucks are not reused across repeats
+        ("ELDSnapshot.vehicle_conflicts", lambda: ELDSnapshot(snapshot.fetched_at, snapshot.table).vehicle_conflicts()),
+    ]
+
+
+def measure(call: Callable[[], object], repeat: int = 3) -> Dict[str, float]:
+    """Best wall time over at least repeat runs, then peak Python-heap growth from one traced run.
+
+    Memory is traced separately because tracemalloc itself slows the code down.
+    Arrow buffers come from Arrow's own pool and are not included in the peak.
+    """
+    timings = []
+    while len(timings) < repeat or (sum(timings) < BENCH_MIN_TOTAL_SECONDS and len(timings) < BENCH_MAX_RUNS):
+        gc.collect()
+        # Note: as in timeit, the cyclic collector is paused so its cost (which grows with the other cases' inputs)
+        # does not land on whichever call happens to trigger it
+        gc.disable()
+        try:
+            started = time.perf_counter()
+            call()
+            timings.append(time.perf_counter() - started)
+        finally:
+            gc.enable()
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        call()
+        _, peak_bytes = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"seconds": min(timings), "peak_bytes": peak_bytes}
+
+
+def run_benchmarks(sizes: List[int], repeat: int = 3, seed: int = 0) -> Dict[str, Dict[str, float]]:
+    results = {}
+    for count in sizes:
+        for name, call in build_cases(count, seed):
+            result = results[f"{name}@{count}"] = measure(call, repeat)
+            print(f"{name:<32} {count:>9,} drivers  {result['seconds']:>9.4f}s  {result['peak_bytes'] / 2**20:>9.1f} MiB")
+    return results
+
+
+def find_regressions(
+    results: Dict[str, Dict[str, float]],
+    baseline: Dict[str, Dict[str, float]],
+    threshold: float = BENCH_THRESHOLD
+) -> List[str]:
+    """Describe every case that got slower or hungrier than its baseline by more than threshold"""
+    regressions = []
+    for case, result in results.items():
+        expected = baseline.get(case)
+        if not expected:
+            continue
+        for metric, noise_floor in (("seconds", BENCH_MIN_SECONDS), ("peak_bytes", BENCH_MIN_BYTES)):
+            growth = result[metric] - expected[metric]
+            if growth > max(expected[metric] * threshold, noise_floor):
+                regressions.append(f"{case}: {metric} {result[metric]:.4g} vs baseline {expected[metric]:.4g} (+{growth:.4g})")
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark ELD report hot paths on synthetic fleets")
+    parser.add_argument("--sizes", type=int, nargs="+", default=BENCH_SIZES, help="fleet sizes in drivers")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per case; the fastest is kept")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baseline", type=Path, default=BENCH_BASELINE_PATH)
+    parser.add_argument("--threshold", type=float, default=BENCH_THRESHOLD, help="allowed slowdown, 0.25 = 25%%")
+    parser.add_argument("--save-baseline", action="store_true", help="merge these results into the baseline file")
+    args = parser.parse_args(argv)
+    # Note: a run with nothing to compare against would always pass, so it is an error rather than a silent success
+    if not args.save_baseline and not args.baseline.exists():
+        parser.error(f"no baseline at {args.baseline}; run with --save-baseline first or pass --baseline")
+
+    results = run_benchmarks(args.sizes, args.repeat, args.seed)
+    baseline = json.loads(args.baseline.read_text()) if args.baseline.exists() else {}
+
+    if args.save_baseline:
+        baseline.update(results)
+        args.baseline.write_text(json.dumps(baseline, indent=2, sort_keys=True) + "\n")
+        print(f"Saved {len(results)} results to {args.baseline}")
+        return 0
+
+    regressions = find_regressions(results, baseline, args.threshold)
+    for regression in regressions:
+        print(f"REGRESSION {regression}", file=sys.stderr)
+    compared = sum(case in baseline for case in results)
+    print(f"{compared} of {len(results)} cases compared with {args.baseline.name}, {len(regressions)} regressions")
+    if not compared:
+        print(f"No case has a baseline in {args.baseline}; run with --save-baseline to record one", file=sys.stderr)
+        return 1
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,144 @@
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# Snapshot rows are matched across fetches by Driver.ID
+DELTA_KEY = 'driver_id'
+PREVIOUS_SUFFIX = '_previous'
+
+CHANGE_COLUMNS = ['Driver ID', 'First Name', 'Last Name', 'Change', 'From', 'To']
+
+
+@dataclass
+class SnapshotDelta:
+    added: pa.Table               # drivers only in the new snapshot
+    removed: pa.Table             # drivers only in the previous snapshot
+    status_changes: pa.Table      # joined rows whose status changed
+    truck_changes: pa.Table       # joined rows whose truck changed
+    changed_ids: pa.Array         # every added, removed or modified driver ID
+    changed_rows: pa.Table        # new-snapshot rows for added or modified drivers
+
+    def __len__(self) -> int:
+        return len(self.changed_ids)
+
+    def counts(self) -> Dict[str, int]:
+        return {
+            'Status Changes': self.status_changes.num_rows,
+            'Truck Reassignments': self.truck_changes.num_rows,
+            'Added Drivers': self.added.num_rows,
+            'Removed Drivers': self.removed.num_rows,
+        }
+
+    def change_frame(self) -> pd.DataFrame:
+        """One row per change for the "what changed since last refresh" view"""
+        def change_rows(table, change, before, after, name_suffix=''):
+            return pa.table({
+                'Driver ID': pc.cast(table[DELTA_KEY], pa.string()),
+                'First Name': table['first_name' + name_suffix],
+                'Last Name': table['last_name' + name_suffix],
+                'Change': pa.array([change] * table.num_rows, pa.string()),
+                'From': pc.cast(before, pa.string()) if before is not None else pa.nulls(table.num_rows, pa.string()),
+                'To': pc.cast(after, pa.string()) if after is not None else pa.nulls(table.num_rows, pa.string()),
+            })
+
+        frames = [
+            change_rows(self.status_changes, 'Status', self.status_changes['status' + PREVIOUS_SUFFIX],
+                        self.status_changes['status']),
+            change_rows(self.truck_changes, 'Truck', self.truck_changes['truck' + PREVIOUS_SUFFIX],
+                        self.truck_changes['truck']),
+            change_rows(self.added, 'Added', None, self.added['status']),
+            change_rows(self.removed, 'Removed', self.removed['status' + PREVIOUS_SUFFIX], None,
+                        name_suffix=PREVIOUS_SUFFIX),
+        ]
+        return pa.concat_tables(frames).sort_by([('Driver ID', 'ascending')]).to_pandas()
+
+
+def has_unique_keys(table: pa.Table) -> bool:
+    column = table[DELTA_KEY]
+    return column.null_count == 0 and pc.count_distinct(column).as_py() == table.num_rows
+
+
+def changed_values(table: pa.Table, column: str) -> pa.ChunkedArray:
+    """True where a joined column differs from its previous value; missing and empty count as equal"""
+    return pc.not_equal(pc.fill_null(table[column], ''), pc.fill_null(table[column + PREVIOUS_SUFFIX], ''))
+
+
+def join_on_driver_id(previous: pa.Table, current: pa.Table, value_columns) -> pa.Table:
+    """Full outer join of the two snapshots, with previous values suffixed and presence flags on both sides"""
+    if previous.num_rows == current.num_rows and previous[DELTA_KEY].equals(current[DELTA_KEY]):
+        # Same drivers in the same order (the usual case between refreshes): line the columns up, no hash join
+        joined = current
+        for name in value_columns:
+            joined = joined.append_column(name + PREVIOUS_SUFFIX, previous[name])
+        flags = pa.array([True] * current.num_rows)
+        return joined.append_column('in_current', flags).append_column('in_previous', flags)
+
+    return current.append_column('in_current', pa.array([True] * current.num_rows)).join(
+        previous.append_column('in_previous', pa.array([True] * previous.num_rows)),
+        keys=DELTA_KEY,
+        join_type='full outer',
+        right_suffix=PREVIOUS_SUFFIX,
+    )
+
+
+def diff_snapshot_tables(previous: pa.Table, current: pa.Table) -> Optional[SnapshotDelta]:
+    """Diff two snapshot tables keyed by driver ID with one vectorized outer join.
+
+    Returns None when the two cannot be matched row for row (missing or repeated IDs, or differing ID types).
+    """
+    if previous.schema != current.schema or not has_unique_keys(previous) or not has_unique_keys(current):
+        return None
+
+    value_columns = [name for name in current.column_names if name != DELTA_KEY]
+    joined = join_on_driver_id(previous, current, value_columns)
+
+    in_both = pc.and_(pc.is_valid(joined['in_current']), pc.is_valid(joined['in_previous']))
+    matched = joined.filter(in_both)
+    status_changed = changed_values(matched, 'status')
+    truck_changed = changed_values(matched, 'truck')
+    modified = status_changed
+    for column in value_columns:
+        modified = pc.or_(modified, changed_values(matched, column))
+
+    added = joined.filter(pc.is_null(joined['in_previous']))
+    removed = joined.filter(pc.is_null(joined['in_current']))
+    modified_ids = matched.filter(modified)[DELTA_KEY]
+    changed_ids = pa.concat_arrays([
+        column.combine_chunks() for column in (added[DELTA_KEY], removed[DELTA_KEY], modified_ids)
+    ])
+
+    upserted_ids = pa.concat_arrays([added[DELTA_KEY].combine_chunks(), modified_ids.combine_chunks()])
+    return SnapshotDelta(
+        added=added,
+        removed=removed,
+        status_changes=matched.filter(status_changed),
+        truck_changes=matched.filter(truck_changed),
+        changed_ids=changed_ids,
+        changed_rows=current.filter(pc.is_in(current[DELTA_KEY], value_set=upserted_ids)),
+    )
+
+
+def count_trucks(trucks: pa.ChunkedArray) -> pd.Series:
+    """Drivers per non-empty truck DisplayID, counted with Arrow's value_counts"""
+    counts = pc.value_counts(trucks)
+    truck_counts = pd.Series(
+        counts.field('counts').to_numpy(zero_copy_only=False),
+        index=counts.field('values').to_numpy(zero_copy_only=False),
+        dtype='int64',
+    )
+    return truck_counts[truck_counts.index.notna() & (truck_counts.index != '')]
+
+
+def apply_delta_to_truck_counts(truck_counts: pd.Series, previous: pa.Table, delta: SnapshotDelta) -> pd.Series:
+    """Update per-truck driver counts from the changed drivers' old and new trucks only"""
+    outgoing = previous.filter(pc.is_in(previous[DELTA_KEY], value_set=delta.changed_ids))
+    updated = (
+        truck_counts
+        .sub(count_trucks(outgoing['truck']), fill_value=0)
+        .add(count_trucks(delta.changed_rows['truck']), fill_value=0)
+        .astype('int64')
+    )
+    return updated[updated > 0]
@@ -0,0 +1,183 @@
+"""Fetch several ELD fleet accounts at once and report on them per fleet and combined."""
+import asyncio
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Iterable, List, Mapping, Optional, Sequence, Union
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from duplicate import ELDSync, find_truck_conflicts, normalize_truck_ids
+from eld_history import ELD_HISTORY_DEFAULT_FLEET
+from eld_http import run_async
+from eld_snapshot import CONFLICT_COLUMNS, SNAPSHOT_SCHEMA, STATUS_OPTIONS, ELDSnapshot, report_frame
+
+# How many fleets are fetched at once; each fleet may itself run ELD_MAX_CONCURRENCY page requests
+ELD_FLEET_CONCURRENCY = int(os.getenv("ELD_FLEET_CONCURRENCY", 4))
+# Give up on a single fleet after this many seconds of fetching so it cannot hold up the combined report
+# (0 means no limit, leaving only the per-request read timeout and retries)
+ELD_FLEET_TIMEOUT = float(os.getenv("ELD_FLEET_TIMEOUT", 60))
+
+# Combined layout: the snapshot columns behind a fleet name, with driver IDs as strings
+FLEET_SNAPSHOT_SCHEMA = SNAPSHOT_SCHEMA.set(0, pa.field('driver_id', pa.string())).insert(0, pa.field('fleet', pa.string()))
+FLEET_CONFLICT_COLUMNS = {'fleet': 'Fleet', **CONFLICT_COLUMNS}
+
+
+@dataclass
+class FleetConfig:
+    name: str
+    api_url: str
+    api_key: str
+
+
+@dataclass
+class FleetResult:
+    fleet: FleetConfig
+    snapshot: Optional[ELDSnapshot] = None
+    error: Optional[Exception] = None
+    elapsed_seconds: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.snapshot is not None
+
+
+def load_fleet_configs(value: Union[str, Sequence[Mapping], None], default_url: Optional[str] = None) -> List[FleetConfig]:
+    """Read fleet credentials from a JSON string or a list of {name, api_url, api_key} mappings.
+
+    Names key the per-fleet reports and history, so they must be unique and must not be the default account's.
+    """
+    if not value:
+        return []
+    entries = json.loads(value) if isinstance(value, str) else value
+
+    fleets = []
+    names = set()
+    for number, entry in enumerate(entries, start=1):
+        if not entry.get("api_key"):
+            raise ValueError(f"Fleet {number} has no api_key")
+        name = str(entry.get("name") or f"Fleet {number}")
+        if name == ELD_HISTORY_DEFAULT_FLEET:
+            raise ValueError(f"Fleet {number} uses the name {name!r}, which is reserved for the ELD_API_KEY account")
+        if name in names:
+            raise ValueError(f"Fleet {number} has the same name as another fleet: {name!r}")
+        names.add(name)
+        fleets.append(FleetConfig(name=name, api_url=entry.get("api_url") or default_url, api_key=entry["api_key"]))
+    return fleets
+
+
+async def fetch_fleet(
+    fleet: FleetConfig,
+    semaphore: asyncio.Semaphore,
+    page_size: Optional[int] = None,
+    timeout: float = ELD_FLEET_TIMEOUT
+) -> FleetResult:
+    """Fetch one fleet's snapshot; any failure is captured on the result instead of raised"""
+    async with semaphore:
+        started = time.perf_counter()
+        try:
+            fetch = ELDSync(fleet.api_url, fleet.api_key).fetch_eld_items(page_size=page_size)
+            items = await (asyncio.wait_for(fetch, timeout) if timeout else fetch)
+            # Note: building the table is CPU work, so it runs off the loop while other fleets keep downloading
+            snapshot = await asyncio.to_thread(ELDSnapshot.from_items, items)
+        except asyncio.TimeoutError:
+            error = TimeoutError(f"Timed out after {timeout:g}s")
+            return FleetResult(fleet, error=error, elapsed_seconds=time.perf_counter() - started)
+        except Exception as e:
+            return FleetResult(fleet, error=e, elapsed_seconds=time.perf_counter() - started)
+        return FleetResult(fleet, snapshot=snapshot, elapsed_seconds=time.perf_counter() - started)
+
+
+async def fetch_fleets(
+    fleets: Iterable[FleetConfig],
+    max_concurrency: int = ELD_FLEET_CONCURRENCY,
+    page_size: Optional[int] = None,
+    timeout: float = ELD_FLEET_TIMEOUT
+) -> "MultiFleetResult":
+    """Fetch every fleet concurrently, at most max_concurrency at a time; one fleet failing leaves the rest intact"""
+    semaphore = asyncio.Semaphore(max_concurrency)
+    results = await asyncio.gather(*(fetch_fleet(fleet, semaphore, page_size, timeout) for fleet in fleets))
+    return MultiFleetResult(list(results))
+
+
+def fetch_fleets_sync(fleets: Iterable[FleetConfig], **kwargs) -> "MultiFleetResult":
+    """Blocking fetch_fleets for callers without an event loop (Streamlit, the batch runner).
+
+    Runs on the shared background loop, so repeat calls (e.g. Streamlit reruns) reuse its open connections.
+    """
+    return run_async(fetch_fleets(fleets, **kwargs))
+
+
+@dataclass
+class MultiFleetResult:
+    results: List[FleetResult] = field(default_factory=list)
+
+    @property
+    def succeeded(self) -> List[FleetResult]:
+        return [result for result in self.results if result.ok]
+
+    @property
+    def failed(self) -> List[FleetResult]:
+        return [result for result in self.results if not result.ok]
+
+    def summary_frame(self) -> pd.DataFrame:
+        """One row per fleet: driver counts by status, fetch time and any error"""
+        rows = []
+        for result in self.results:
+            counts = result.snapshot.status_counts() if result.ok else {}
+            rows.append({
+                'Fleet': result.fleet.name,
+                'Drivers': result.snapshot.table.num_rows if result.ok else None,
+                **{status: counts.get(status) for status in STATUS_OPTIONS},
+                'Fetch Seconds': round(result.elapsed_seconds, 2),
+                'Error': '' if result.error is None else str(result.error) or type(result.error).__name__,
+            })
+        # Note: nullable integers keep failed fleets' blank counts from turning the columns into floats
+        return pd.DataFrame(rows).astype({column: 'Int64' for column in ['Drivers', *STATUS_OPTIONS]})
+
+    def combined_table(self) -> pa.Table:
+        """Every successful fleet's drivers in one table, tagged with a leading fleet column"""
+        tables = []
+        for result in self.succeeded:
+            table = result.snapshot.table
+            # Driver IDs from different accounts need not share a type, so compare them as strings
+            table = table.set_column(0, 'driver_id', pc.cast(table['driver_id'], pa.string()))
+            tables.append(table.add_column(0, 'fleet', pa.array([result.fleet.name] * table.num_rows, pa.string())))
+        return pa.concat_tables(tables) if tables else FLEET_SNAPSHOT_SCHEMA.empty_table()
+
+    def vehicle_conflicts(self, normalize_trucks: bool = False):
+        """Return (per-driver conflicts, per-truck summary) over all fleets combined, with a Fleets count per truck"""
+        table = self.combined_table()
+        conflicts = find_truck_conflicts(
+            table['truck'].to_numpy(zero_copy_only=False),
+            pc.binary_join_element_wise(table['fleet'], table['driver_id'], ': ').to_numpy(zero_copy_only=False),
+            normalize=normalize_trucks
+        )
+        conflict_table = table.take(conflicts.positions).append_column(
+            'truck_count', pa.array(conflicts.truck_counts, type=pa.int64())
+        )
+        df_conflicts = report_frame(conflict_table, FLEET_CONFLICT_COLUMNS)
+
+        keys = df_conflicts['Truck Number'].fillna('').astype(str)
+        if normalize_trucks:
+            keys = normalize_truck_ids(keys)
+        fleets_per_truck = df_conflicts['Fleet'].groupby(keys).nunique()
+
+        summary = conflicts.summary.copy()
+        summary.insert(2, 'Fleets', summary['Truck Number'].map(fleets_per_truck).astype('int64'))
+        summary['Driver IDs'] = summary['Driver IDs'].map(
+            lambda ids: ", ".join(str(driver_id) for driver_id in ids if driver_id is not None)
+        )
+        df_conflicts.insert(len(df_conflicts.columns), 'Fleets on Same Truck', keys.map(fleets_per_truck).to_numpy())
+        return df_conflicts, summary
+
+    def cross_fleet_conflicts(self, normalize_trucks: bool = False):
+        """Like vehicle_conflicts, but only trucks whose drivers belong to more than one fleet"""
+        df_conflicts, summary = self.vehicle_conflicts(normalize_trucks)
+        return (
+            df_conflicts[df_conflicts['Fleets on Same Truck'] > 1].reset_index(drop=True),
+            summary[summary['Fleets'] > 1].reset_index(drop=True),
+        )
@@ -0,0 +1,298 @@
+"""Local history of fetched ELD snapshots in SQLite, for trend and duration reports without refetching.
+
+Each driver's state (names, phone, truck, status) is stored once per stretch of time it stayed unchanged, as a
+row valid from the snapshot it first appeared in until the snapshot it changed in (open while still current).
+Unchanged drivers cost nothing per refresh, and "how long" questions become sums over those rows.
+
+    history = SnapshotHistory("eld_history.sqlite3")
+    history.append(snapshot)
+    history.status_durations(start, end, status="SB")       # who sat in SB, and for how long
+    history.truck_conflict_periods(start, end)               # how long each truck was double-assigned
+"""
+import os
+import sqlite3
+from collections import Counter
+from contextlib import closing, contextmanager
+from datetime import datetime
+from typing import Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from duplicate import normalize_truck_ids
+from eld_metrics import stage
+from eld_snapshot import STATUS_OPTIONS, ELDSnapshot
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Where fetched snapshots are recorded; an empty value turns the history off
+ELD_HISTORY_DB = os.getenv("ELD_HISTORY_DB", "eld_history.sqlite3")
+# Fleet name recorded for the single-account (ELD_API_URL/ELD_API_KEY) snapshots
+ELD_HISTORY_DEFAULT_FLEET = "default"
+
+# Snapshot columns kept per driver state, in SNAPSHOT_SCHEMA order
+STATE_COLUMNS = ['driver_id', 'first_name', 'last_name', 'phone', 'truck', 'status']
+
+HISTORY_SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    id INTEGER PRIMARY KEY,
+    fleet TEXT NOT NULL,
+    fetched_at TEXT NOT NULL,
+    driver_count INTEGER NOT NULL,
+    changed_count INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS snapshots_by_fleet_time ON snapshots (fleet, fetched_at);
+
+CREATE TABLE IF NOT EXISTS driver_states (
+    id INTEGER PRIMARY KEY,
+    fleet TEXT NOT NULL,
+    driver_id TEXT NOT NULL,
+    first_name TEXT NOT NULL,
+    last_name TEXT NOT NULL,
+    phone TEXT NOT NULL,
+    truck TEXT NOT NULL,
+    status TEXT NOT NULL,
+    valid_from TEXT NOT NULL,
+    valid_to TEXT                   -- NULL while the state is current
+);
+CREATE INDEX IF NOT EXISTS driver_states_by_driver ON driver_states (driver_id, valid_from);
+CREATE INDEX IF NOT EXISTS driver_states_by_truck ON driver_states (truck, valid_from);
+CREATE INDEX IF NOT EXISTS driver_states_by_status ON driver_states (status, valid_from);
+CREATE INDEX IF NOT EXISTS driver_states_by_time ON driver_states (valid_from, valid_to);
+CREATE INDEX IF NOT EXISTS driver_states_current ON driver_states (fleet) WHERE valid_to IS NULL;
+"""
+
+
+def format_timestamp(value: datetime) -> str:
+    # Note: always with microseconds, so timestamps compare correctly as text
+    return value.isoformat(sep=' ', timespec='microseconds')
+
+
+def snapshot_states(snapshot: ELDSnapshot) -> Counter:
+    """The snapshot's driver rows as tuples of text (missing values as empty strings), counted.
+
+    Counting keeps repeated identical rows (e.g. a duplicated driver ID) apart when they are matched to stored states.
+    """
+    columns = [
+        pc.fill_null(pc.cast(snapshot.table[name], pa.string()), '').to_numpy(zero_copy_only=False)
+        for name in STATE_COLUMNS
+    ]
+    return Counter(zip(*columns))
+
+
+class SnapshotHistory:
+    """Append-only store of snapshots per fleet, with time-range queries over it.
+
+    A connection is opened per call, so one instance can be shared across threads and processes can share
+    the file; WAL mode lets reports read while a refresh writes.
+    """
+
+    def __init__(self, path: str = ELD_HISTORY_DB) -> None:
+        self.path = path
+        with self.connect() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(HISTORY_SCHEMA)
+
+    @contextmanager
+    def connect(self) -> Iterator[sqlite3.Connection]:
+        """A connection that commits on success and rolls back on error"""
+        with closing(sqlite3.connect(self.path, timeout=30)) as connection:
+            with connection:
+                yield connection
+
+    def append(self, snapshot: ELDSnapshot, fleet: str = ELD_HISTORY_DEFAULT_FLEET) -> int:
+        """Record snapshot as the fleet's latest; returns how many driver states started or ended with it"""
+        fetched_at = format_timestamp(snapshot.fetched_at)
+        with stage("history_append", fleet=fleet) as metric, self.connect() as connection:
+            latest = connection.execute(
+                "SELECT MAX(fetched_at) FROM snapshots WHERE fleet = ?", (fleet,)
+            ).fetchone()[0]
+            if latest is not None and fetched_at <= latest:
+                raise ValueError(f"Snapshot from {fetched_at} is not newer than {fleet}'s latest ({latest})")
+
+            # Note: a stored state that is still in the snapshot stays open; the rest end now, and whatever is
+            # left of the snapshot starts now
+            current = snapshot_states(snapshot)
+            ended = []
+            for state_id, *state in connection.execute(
+                f"SELECT id, {', '.join(STATE_COLUMNS)} FROM driver_states WHERE fleet = ? AND valid_to IS NULL", (fleet,)
+            ).fetchall():
+                state = tuple(state)
+                if current[state] > 0:
+                    current[state] -= 1
+                else:
+                    ended.append(state_id)
+            started = list(current.elements())
+
+            connection.executemany(
+                "UPDATE driver_states SET valid_to = ? WHERE id = ?", ((fetched_at, state_id) for state_id in ended)
+            )
+            connection.executemany(
+                f"INSERT INTO driver_states (fleet, {', '.join(STATE_COLUMNS)}, valid_from) "
+                f"VALUES (?, {', '.join('?' * len(STATE_COLUMNS))}, ?)",
+                ((fleet, *state, fetched_at) for state in started)
+            )
+            changed_count = len(ended) + len(started)
+            connection.execute(
+                "INSERT INTO snapshots (fleet, fetched_at, driver_count, changed_count) VALUES (?, ?, ?, ?)",
+                (fleet, fetched_at, snapshot.table.num_rows, changed_count)
+            )
+            metric.records = changed_count
+        return changed_count
+
+    def snapshots_frame(self, fleet: Optional[str] = None) -> pd.DataFrame:
+        """One row per recorded snapshot: fleet, fetch time, drivers and changed states"""
+        query = "SELECT fleet, fetched_at, driver_count, changed_count FROM snapshots"
+        params = ()
+        if fleet is not None:
+            query, params = query + " WHERE fleet = ?", (fleet,)
+        with self.connect() as connection:
+            frame = pd.read_sql_query(query + " ORDER BY fetched_at", connection, params=params)
+        frame['fetched_at'] = pd.to_datetime(frame['fetched_at'])
+        return frame.rename(columns={
+            'fleet': 'Fleet', 'fetched_at': 'Fetched At', 'driver_count': 'Drivers', 'changed_count': 'Changed States',
+        })
+
+    def observed_range(self, fleet: str = ELD_HISTORY_DEFAULT_FLEET):
+        """(first, last) snapshot time recorded for the fleet, or (None, None) if there are none"""
+        with self.connect() as connection:
+            first, last = connection.execute(
+                "SELECT MIN(fetched_at), MAX(fetched_at) FROM snapshots WHERE fleet = ?", (fleet,)
+            ).fetchone()
+        return (None, None) if first is None else (datetime.fromisoformat(first), datetime.fromisoformat(last))
+
+    def _query_states(self, columns: str, start: datetime, end: datetime, fleet: str, where: str = "",
+                      params: tuple = (), group_by: str = "") -> pd.DataFrame:
+        """Run a query over the fleet's states overlapping [start, end), with each state clipped to the range.
+
+        An open state is taken to last until the fleet's latest snapshot, never beyond what was observed.
+        """
+        query = f"""
+            WITH bounds AS (
+                SELECT ? AS range_start, MIN(?, (SELECT MAX(fetched_at) FROM snapshots WHERE fleet = ?)) AS range_end
+            ),
+            clipped AS (
+                SELECT driver_states.*,
+                       MAX(valid_from, range_start) AS clipped_from,
+                       MIN(COALESCE(valid_to, range_end), range_end) AS clipped_to
+                FROM driver_states, bounds
+                WHERE fleet = ? AND valid_from < range_end AND COALESCE(valid_to, range_end) > range_start {where}
+            )
+            SELECT {columns} FROM clipped {group_by}
+        """
+        with self.connect() as connection:
+            return pd.read_sql_query(query, connection, params=(
+                format_timestamp(start), format_timestamp(end), fleet, fleet, *params
+            ))
+
+    def driver_history(self, driver_id, start: datetime, end: datetime,
+                       fleet: str = ELD_HISTORY_DEFAULT_FLEET) -> pd.DataFrame:
+        """Every state the driver was in during the range, oldest first"""
+        frame = self._query_states(
+            "driver_id, first_name, last_name, phone, truck, status, clipped_from, clipped_to, "
+            "(julianday(clipped_to) - julianday(clipped_from)) * 24 AS hours",
+            start, end, fleet, where="AND driver_id = ?", params=(str(driver_id),), group_by="ORDER BY valid_from"
+        )
+        return frame.rename(columns={
+            'driver_id': 'Driver ID', 'first_name': 'First Name', 'last_name': 'Last Name', 'phone': 'Phone Number',
+            'truck': 'Truck Number', 'status': 'Log Status', 'clipped_from': 'From', 'clipped_to': 'To',
+            'hours': 'Hours',
+        })
+
+    def status_durations(self, start: datetime, end: datetime, status: Optional[str] = None,
+                         min_share: float = 0.0, fleet: str = ELD_HISTORY_DEFAULT_FLEET) -> pd.DataFrame:
+        """Hours each driver spent in each status during the range, longest first.
+
+        Share of Range is measured against the part of the range the history covers, so min_share=1.0 finds
+        drivers who were in the status the whole time (e.g. sat in SB all week).
+        """
+        frame = self._query_states(
+            "driver_id, MAX(first_name) AS first_name, MAX(last_name) AS last_name, status, "
+            "SUM(julianday(clipped_to) - julianday(clipped_from)) * 24 AS hours",
+            start, end, fleet,
+            where="AND status = ?" if status else "", params=(status,) if status else (),
+            group_by="GROUP BY driver_id, status ORDER BY hours DESC"
+        )
+        first, last = self.observed_range(fleet)
+        covered_hours = 0.0
+        if first is not None:
+            covered_hours = max((min(end, last) - max(start, first)).total_seconds() / 3600, 0.0)
+        frame['share'] = frame['hours'] / covered_hours if covered_hours else np.nan
+        if min_share:
+            # Note: a small tolerance, since the history's own bounds make the covered range a fraction longer
+            frame = frame[frame['share'] >= min_share - 1e-9]
+        return frame.rename(columns={
+            'driver_id': 'Driver ID', 'first_name': 'First Name', 'last_name': 'Last Name', 'status': 'Log Status',
+            'hours': 'Hours', 'share': 'Share of Range',
+        }).reset_index(drop=True)
+
+    def truck_conflict_periods(self, start: datetime, end: datetime, truck: Optional[str] = None,
+                               normalize_trucks: bool = False,
+                               fleet: str = ELD_HISTORY_DEFAULT_FLEET) -> pd.DataFrame:
+        """For each truck that had more than one driver at once during the range: for how long, when, and who.
+
+        Assignments are swept in time order per truck, so only the stretches with two or more drivers count.
+        """
+        states = self._query_states(
+            "driver_id, truck, clipped_from, clipped_to", start, end, fleet,
+            where="AND truck = ?" if truck and not normalize_trucks else "AND truck != ''",
+            params=(truck,) if truck and not normalize_trucks else (),
+        )
+        if normalize_trucks:
+            states['truck'] = normalize_truck_ids(states['truck'])
+            if truck:
+                states = states[states['truck'] == normalize_truck_ids(pd.Series([truck])).iloc[0]]
+
+        columns = ['Truck Number', 'Hours Double-Assigned', 'Most Drivers at Once', 'First Seen', 'Last Seen',
+                   'Driver IDs']
+        if states.empty:
+            return pd.DataFrame(columns=columns)
+
+        # +1 when a driver is put on the truck, -1 when taken off; removals sort first at equal times
+        events = pd.concat([
+            pd.DataFrame({'truck': states['truck'], 'at': states['clipped_from'], 'change': 1}),
+            pd.DataFrame({'truck': states['truck'], 'at': states['clipped_to'], 'change': -1}),
+        ]).sort_values(['truck', 'at', 'change'], kind='stable')
+        events['drivers'] = events.groupby('truck')['change'].cumsum()
+        events['until'] = events.groupby('truck')['at'].shift(-1)
+        shared = events[(events['drivers'] > 1) & events['until'].notna()].copy()
+        if shared.empty:
+            return pd.DataFrame(columns=columns)
+
+        shared['hours'] = (pd.to_datetime(shared['until']) - pd.to_datetime(shared['at'])).dt.total_seconds() / 3600
+        periods = shared.groupby('truck').agg(
+            hours=('hours', 'sum'), most_drivers=('drivers', 'max'), first_seen=('at', 'min'), last_seen=('until', 'max')
+        )
+        periods = periods[periods['hours'] > 0]
+        driver_ids = states.groupby('truck')['driver_id'].agg(lambda ids: ", ".join(sorted(set(ids))))
+        periods['driver_ids'] = driver_ids.reindex(periods.index)
+
+        periods = periods.reset_index().sort_values('hours', ascending=False, kind='stable')
+        periods.columns = columns
+        return periods.reset_index(drop=True)
+
+    def status_trend(self, start: datetime, end: datetime, freq: str = '1D',
+                     fleet: str = ELD_HISTORY_DEFAULT_FLEET) -> pd.DataFrame:
+        """Drivers in each status at regular points through the range (rows: time, columns: status)"""
+        first, last = self.observed_range(fleet)
+        if first is None:
+            return pd.DataFrame(columns=STATUS_OPTIONS)
+
+        points: List[datetime] = [
+            point.to_pydatetime() for point in pd.date_range(max(start, first), min(end, last), freq=freq)
+        ]
+        rows = []
+        with self.connect() as connection:
+            for point in points:
+                at = format_timestamp(point)
+                counts = dict(connection.execute(
+                    "SELECT status, COUNT(*) FROM driver_states "
+                    "WHERE fleet = ? AND valid_from <= ? AND (valid_to IS NULL OR valid_to > ?) GROUP BY status",
+                    (fleet, at, at)
+                ).fetchall())
+                rows.append({status: counts.get(status, 0) for status in STATUS_OPTIONS})
+        return pd.DataFrame(rows, index=pd.DatetimeIndex(points, name='At'), columns=STATUS_OPTIONS)
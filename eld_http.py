@@ -0,0 +1,207 @@
+import asyncio
+import atexit
+import os
+import threading
+import weakref
+import zlib
+from typing import Any, Iterator, NamedTuple, Optional, Tuple
+
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ProtocolError, ReadTimeoutError, SSLError
+
+try:
+    import brotli
+except ImportError:
+    # Optional: without it only gzip and deflate are offered
+    brotli = None
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+ELD_DRIVERS_ENDPOINT = "api/v1/driver/eld/"
+
+# One timeout policy for every ELD call: fail fast on connect, allow slow bodies on large fleets
+ELD_CONNECT_TIMEOUT = float(os.getenv("ELD_CONNECT_TIMEOUT", 10))
+ELD_READ_TIMEOUT = float(os.getenv("ELD_READ_TIMEOUT", 180))
+ELD_REQUEST_TIMEOUT = (ELD_CONNECT_TIMEOUT, ELD_READ_TIMEOUT)
+
+# Keep-alive connections kept open per host
+ELD_POOL_SIZE = int(os.getenv("ELD_POOL_SIZE", 10))
+
+# Query parameters for paged and status-sharded driver fetches, and how many requests may run at once
+ELD_PAGE_OFFSET_PARAM = os.getenv("ELD_PAGE_OFFSET_PARAM", "offset")
+ELD_PAGE_LIMIT_PARAM = os.getenv("ELD_PAGE_LIMIT_PARAM", "limit")
+ELD_STATUS_PARAM = os.getenv("ELD_STATUS_PARAM", "status")
+ELD_MAX_CONCURRENCY = int(os.getenv("ELD_MAX_CONCURRENCY", 4))
+# A paged pull that has not ended after this many pages is treated as broken rather than followed forever
+ELD_MAX_PAGES = int(os.getenv("ELD_MAX_PAGES", 1000))
+
+# Content codings offered to the API; the response body is decoded by ContentDecoder so its cost can be timed
+ELD_ACCEPT_ENCODING = "br, gzip, deflate" if brotli else "gzip, deflate"
+
+# Returned instead of a payload when a conditional request is answered 304 Not Modified
+NOT_MODIFIED = object()
+
+# ETag and Last-Modified of a driver payload, sent back as If-None-Match and If-Modified-Since
+Validators = Tuple[Optional[str], Optional[str]]
+
+
+class ELDPayload(NamedTuple):
+    """A driver payload (a dict, a stream of `Data[]` items or NOT_MODIFIED) and the validators it was sent with.
+
+    Whoever builds something from the body keeps the validators with it, so a 304 only ever stands for data that
+    was actually used.
+    """
+    body: Any
+    validators: Optional[Validators] = None
+
+
+class UnexpectedNotModifiedError(requests.exceptions.RequestException):
+    """The API answered 304 Not Modified but there is no cached snapshot to reuse"""
+
+
+
+class PaginationError(requests.exceptions.RequestException):
+    """The API does not page the way a paged fetch expects (e.g. it ignores offset/limit), so paging would never end"""
+
+
+_session = None
+_session_lock = threading.Lock()
+# aiohttp sessions are bound to the event loop that created them, so keep one per loop
+_async_sessions = weakref.WeakKeyDictionary()
+# Long-lived loop that sync callers run async fetches on, so its pooled session survives between calls
+_background_loop = None
+_background_loop_lock = threading.Lock()
+
+
+def build_eld_url(base_url: str, endpoint: str = ELD_DRIVERS_ENDPOINT) -> str:
+    """Join the API base URL and an endpoint with exactly one slash, whichever side has it"""
+    return f"{(base_url or '').rstrip('/')}/{endpoint.lstrip('/')}"
+
+
+def build_eld_headers(api_key: str) -> dict:
+    return {
+        'X-Api-Key': api_key,
+        'Content-Type': 'application/json',
+        'Accept-Encoding': ELD_ACCEPT_ENCODING,
+    }
+
+
+class ContentDecoder:
+    """Incremental decoder for one response's Content-Encoding (identity, gzip, deflate or br)"""
+
+    def __init__(self, encoding: Optional[str]) -> None:
+        self.encoding = (encoding or "identity").strip().lower()
+        if self.encoding in ("gzip", "x-gzip"):
+            self._decoder = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        elif self.encoding == "deflate":
+            self._decoder = zlib.decompressobj()
+            self._first_chunk = True
+        elif self.encoding == "br" and brotli is not None:
+            self._decoder = brotli.Decompressor()
+        elif self.encoding == "identity":
+            self._decoder = None
+        else:
+            raise requests.exceptions.ContentDecodingError(f"Unsupported Content-Encoding: {encoding}")
+
+    def decode(self, data: bytes) -> bytes:
+        if self._decoder is None:
+            return data
+        try:
+            if self.encoding == "br":
+                return self._decoder.process(data)
+            if self.encoding == "deflate" and self._first_chunk:
+                self._first_chunk = False
+                try:
+                    return self._decoder.decompress(data)
+                except zlib.error:
+                    # Note: some servers send raw deflate without the zlib header
+                    self._decoder = zlib.decompressobj(-zlib.MAX_WBITS)
+            return self._decoder.decompress(data)
+        except (zlib.error, getattr(brotli, "error", zlib.error)) as e:
+            raise requests.exceptions.ContentDecodingError(f"Could not decode {self.encoding} body: {e}")
+
+    def flush(self) -> bytes:
+        if self._decoder is None or self.encoding == "br":
+            return b""
+        return self._decoder.flush()
+
+
+def iter_raw_chunks(response: requests.Response, chunk_size: int) -> Iterator[bytes]:
+    """The response body as sent (still encoded), with urllib3 errors raised as requests errors like iter_content"""
+    try:
+        yield from response.raw.stream(chunk_size, decode_content=False)
+    except ProtocolError as e:
+        raise requests.exceptions.ChunkedEncodingError(e)
+    except ReadTimeoutError as e:
+        raise requests.exceptions.ConnectionError(e)
+    except SSLError as e:
+        raise requests.exceptions.SSLError(e)
+
+
+def get_http_session() -> requests.Session:
+    """Return the process-wide pooled requests session so repeat fetches reuse open connections"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=ELD_POOL_SIZE, pool_maxsize=ELD_POOL_SIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+        return _session
+
+
+def get_async_http_session() -> aiohttp.ClientSession:
+    """Return the pooled aiohttp session for the running event loop, creating it on first use"""
+    loop = asyncio.get_running_loop()
+    session = _async_sessions.get(loop)
+    if session is None or session.closed:
+        session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit_per_host=ELD_POOL_SIZE, ttl_dns_cache=300),
+            timeout=aiohttp.ClientTimeout(connect=ELD_CONNECT_TIMEOUT, sock_read=ELD_READ_TIMEOUT),
+        )
+        _async_sessions[loop] = session
+    return session
+
+
+async def close_async_http_session() -> None:
+    """Close the running loop's aiohttp session; call before the loop shuts down"""
+    session = _async_sessions.pop(asyncio.get_running_loop(), None)
+    if session is not None and not session.closed:
+        await session.close()
+
+
+def get_background_loop() -> asyncio.AbstractEventLoop:
+    """The process-wide event loop run_async uses, started on a daemon thread on first use"""
+    global _background_loop
+    with _background_loop_lock:
+        if _background_loop is None:
+            _background_loop = asyncio.new_event_loop()
+            threading.Thread(target=_background_loop.run_forever, name="eld-async", daemon=True).start()
+            atexit.register(stop_background_loop)
+        return _background_loop
+
+
+def run_async(coroutine):
+    """Run a coroutine on the background loop and wait for its result, for callers without an event loop.
+
+    Unlike asyncio.run, every call shares the loop and so its keep-alive aiohttp session.
+    """
+    return asyncio.run_coroutine_threadsafe(coroutine, get_background_loop()).result()
+
+
+def stop_background_loop() -> None:
+    """Close the background loop's session and stop the loop; runs at exit"""
+    global _background_loop
+    with _background_loop_lock:
+        loop, _background_loop = _background_loop, None
+    if loop is None:
+        return
+    try:
+        asyncio.run_coroutine_threadsafe(close_async_http_session(), loop).result(timeout=5)
+    finally:
+        loop.call_soon_threadsafe(loop.stop)
@@ -0,0 +1,228 @@
+"""Per-stage timing for the fetch, parse, report and export pipeline, exported as JSON logs and Prometheus text.
+
+    with stage("excel_serialize", format="XLSX") as metric:
+        ...
+        metric.bytes = len(data)
+"""
+import contextvars
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+try:
+    import resource
+except ImportError:
+    # Unix only; elsewhere the process max RSS is simply not reported
+    resource = None
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# How many recent stage records are kept for display
+ELD_METRICS_HISTORY = int(os.getenv("ELD_METRICS_HISTORY", 200))
+# Append one JSON line per stage to this file, and keep a Prometheus text file here (e.g. for a textfile collector)
+ELD_METRICS_LOG_FILE = os.getenv("ELD_METRICS_LOG_FILE")
+ELD_METRICS_PROM_FILE = os.getenv("ELD_METRICS_PROM_FILE")
+# Trace Python allocations for per-stage peak memory; costs real time, so it is off unless asked for
+ELD_METRICS_TRACE_MEMORY = os.getenv("ELD_METRICS_TRACE_MEMORY", "false").lower() in ("1", "true", "yes")
+
+logger = logging.getLogger("eld.metrics")
+
+# Stages currently open on this thread or task, so a nested stage's traced peak also counts toward its parents
+_open_stages = contextvars.ContextVar("eld_open_stages", default=())
+
+
+@dataclass
+class StageMetric:
+    stage: str
+    labels: Dict[str, str] = field(default_factory=dict)
+    started_at: datetime = field(default_factory=datetime.now)
+    seconds: float = 0.0
+    bytes: Optional[int] = None               # payload or file size handled by the stage
+    records: Optional[int] = None             # drivers, rows or items handled by the stage
+    peak_memory_bytes: Optional[int] = None   # traced Python heap peak; only recorded with ELD_METRICS_TRACE_MEMORY
+    error: Optional[str] = None
+
+    def as_log_record(self) -> dict:
+        record = asdict(self)
+        record["started_at"] = self.started_at.isoformat(timespec="milliseconds")
+        return record
+
+
+def get_peak_rss_bytes() -> Optional[int]:
+    """The process's lifetime RSS high-water mark, or None where the resource module is unavailable (Windows)"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Note: Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class MetricsRecorder:
+    """Process-wide, thread-safe store of recent stage records and running per-stage totals"""
+
+    def __init__(self, history: int = ELD_METRICS_HISTORY, prom_file: Optional[str] = ELD_METRICS_PROM_FILE) -> None:
+        self._recent = deque(maxlen=history)
+        self._totals: Dict[tuple, dict] = {}
+        self._prom_file = prom_file
+        self._lock = threading.Lock()
+
+    def record(self, metric: StageMetric) -> None:
+        key = (metric.stage, tuple(sorted(metric.labels.items())))
+        with self._lock:
+            self._recent.append(metric)
+            totals = self._totals.setdefault(key, {"runs": 0, "errors": 0, "seconds": 0.0, "bytes": 0, "records": 0})
+            totals["runs"] += 1
+            totals["errors"] += metric.error is not None
+            totals["seconds"] += metric.seconds
+            totals["bytes"] += metric.bytes or 0
+            totals["records"] += metric.records or 0
+            totals["last"] = metric
+
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps(metric.as_log_record()))
+        if self._prom_file:
+            try:
+                self.write_prometheus(self._prom_file)
+            except OSError as e:
+                logger.warning(f"Could not write {self._prom_file}: {e}")
+
+    def recent(self, limit: Optional[int] = None) -> List[StageMetric]:
+        with self._lock:
+            records = list(self._recent)
+        return records[-limit:] if limit else records
+
+    def clear(self) -> None:
+        with self._lock:
+            self._recent.clear()
+            self._totals.clear()
+
+    def render_json_lines(self) -> str:
+        return "".join(json.dumps(metric.as_log_record()) + "\n" for metric in self.recent())
+
+    def render_prometheus(self) -> str:
+        """Running totals and each stage's latest values in the Prometheus text exposition format"""
+        with self._lock:
+            totals = {key: dict(value) for key, value in self._totals.items()}
+
+        families = [
+            ("eld_stage_runs_total", "counter", "Stage executions", lambda t: t["runs"]),
+            ("eld_stage_errors_total", "counter", "Stage executions that raised", lambda t: t["errors"]),
+            ("eld_stage_duration_seconds_total", "counter", "Time spent in the stage", lambda t: t["seconds"]),
+            ("eld_stage_bytes_total", "counter", "Payload or file bytes handled", lambda t: t["bytes"]),
+            ("eld_stage_records_total", "counter", "Drivers, rows or items handled", lambda t: t["records"]),
+            ("eld_stage_last_duration_seconds", "gauge", "Duration of the latest run", lambda t: t["last"].seconds),
+            ("eld_stage_last_bytes", "gauge", "Bytes handled by the latest run", lambda t: t["last"].bytes),
+            ("eld_stage_last_records", "gauge", "Records handled by the latest run", lambda t: t["last"].records),
+            ("eld_stage_last_peak_memory_bytes", "gauge", "Traced Python heap peak during the latest run",
+             lambda t: t["last"].peak_memory_bytes),
+        ]
+        lines = []
+        for name, metric_type, help_text, value_of in families:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for (stage_name, labels), stage_totals in sorted(totals.items()):
+                value = value_of(stage_totals)
+                if value is None:
+                    continue
+                label_text = ",".join(
+                    f'{label}="{escape_label_value(label_value)}"'
+                    for label, label_value in (("stage", stage_name), *labels)
+                )
+                lines.append(f"{name}{{{label_text}}} {value}")
+
+        max_rss = get_peak_rss_bytes()
+        if max_rss is not None:
+            lines.append("# HELP eld_process_max_rss_bytes Highest resident memory of the process since it started")
+            lines.append("# TYPE eld_process_max_rss_bytes gauge")
+            lines.append(f"eld_process_max_rss_bytes {max_rss}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str) -> None:
+        """Replace path atomically so a scraper never reads a half-written file"""
+        directory = os.path.dirname(os.path.abspath(path))
+        with tempfile.NamedTemporaryFile("w", dir=directory, suffix=".tmp", delete=False) as output:
+            output.write(self.render_prometheus())
+        os.replace(output.name, path)
+
+
+def escape_label_value(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def configure_metrics_logging(path: Optional[str] = ELD_METRICS_LOG_FILE) -> None:
+    """Send the JSON stage records to path, one line each; safe to call more than once"""
+    if not path or any(getattr(handler, "eld_metrics_path", None) == path for handler in logger.handlers):
+        return
+    handler = logging.FileHandler(path)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    handler.eld_metrics_path = path
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+
+
+metrics = MetricsRecorder()
+configure_metrics_logging()
+
+
+@contextmanager
+def stage(name: str, recorder: Optional[MetricsRecorder] = None, **labels) -> Iterator[StageMetric]:
+    """Time the enclosed block as one stage; set .bytes and .records on the yielded metric as they become known"""
+    metric = StageMetric(stage=name, labels={label: str(value) for label, value in labels.items()})
+    # Note: only trace when asked to; resetting the peak under someone else's tracemalloc session would skew theirs
+    tracing = ELD_METRICS_TRACE_MEMORY
+    if tracing and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    base_memory = 0
+    if tracing:
+        # Note: resetting the peak hides it from enclosing stages, so each stage hands its absolute peak up on exit.
+        # The traced heap is process-wide, so stages running at the same time on other threads blur each other's peaks.
+        tracemalloc.reset_peak()
+        base_memory = tracemalloc.get_traced_memory()[0]
+
+    open_stage = [metric, 0]    # the metric and the highest absolute traced peak seen inside it so far
+    token = _open_stages.set(_open_stages.get() + (open_stage,))
+    started = time.perf_counter()
+    try:
+        yield metric
+    except GeneratorExit:
+        # A consumer stopping early is not a failure of the stage
+        raise
+    except BaseException as e:
+        metric.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        metric.seconds = time.perf_counter() - started
+        _open_stages.reset(token)
+        if tracing and tracemalloc.is_tracing():
+            absolute_peak = max(open_stage[1], tracemalloc.get_traced_memory()[1])
+            metric.peak_memory_bytes = max(absolute_peak - base_memory, 0)
+            for parent in _open_stages.get():
+                parent[1] = max(parent[1], absolute_peak)
+        (recorder or metrics).record(metric)
+
+
+def record_stage(name: str, seconds: float, bytes: Optional[int] = None, records: Optional[int] = None,
+                 recorder: Optional[MetricsRecorder] = None, **labels) -> StageMetric:
+    """Record a stage whose time was accumulated piecemeal, e.g. decoding interleaved with downloading"""
+    metric = StageMetric(
+        stage=name,
+        labels={label: str(value) for label, value in labels.items()},
+        seconds=seconds,
+        bytes=bytes,
+        records=records,
+        # Note: a piecemeal stage has no single traced window, so it has no peak of its own
+    )
+    (recorder or metrics).record(metric)
+    return metric
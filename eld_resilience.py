@@ -0,0 +1,279 @@
+"""Retries with jittered backoff, hedged requests and a circuit breaker for ELD API calls.
+
+    policy = RetryPolicy()
+    payload = policy.call(fetch, breaker=get_circuit_breaker(url, api_key))          # or: await policy.call_async(...)
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, TimeoutError as FutureTimeoutError, wait
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+
+import aiohttp
+import requests
+from tenacity import (
+    AsyncRetrying,
+    RetryCallState,
+    Retrying,
+    retry_if_exception,
+    stop_after_attempt,
+    stop_after_delay,
+    wait_random_exponential,
+)
+
+from eld_metrics import record_stage
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Tries per ELD call (1 turns retries off), spaced by exponential backoff with full jitter
+ELD_RETRY_ATTEMPTS = int(os.getenv("ELD_RETRY_ATTEMPTS", 3))
+ELD_RETRY_BACKOFF_SECONDS = float(os.getenv("ELD_RETRY_BACKOFF_SECONDS", 0.5))
+ELD_RETRY_MAX_BACKOFF_SECONDS = float(os.getenv("ELD_RETRY_MAX_BACKOFF_SECONDS", 10))
+# No new try starts once this long has passed since the first one
+ELD_RETRY_DEADLINE_SECONDS = float(os.getenv("ELD_RETRY_DEADLINE_SECONDS", 120))
+# Send a second, identical request if the first has not answered after this many seconds (0 turns hedging off)
+ELD_HEDGE_AFTER_SECONDS = float(os.getenv("ELD_HEDGE_AFTER_SECONDS", 0))
+# Open the circuit after this many failed calls in a row (0 turns it off), and try again after the reset time
+ELD_BREAKER_FAILURES = int(os.getenv("ELD_BREAKER_FAILURES", 5))
+ELD_BREAKER_RESET_SECONDS = float(os.getenv("ELD_BREAKER_RESET_SECONDS", 60))
+
+# Server-side HTTP statuses worth retrying; anything else in 4xx is the request's own fault
+RETRYABLE_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+
+logger = logging.getLogger("eld.resilience")
+
+T = TypeVar("T")
+
+# Hedged sync requests run here so the caller's thread can wait on whichever answers first
+_hedge_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="eld-hedge")
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """Raised instead of calling an API that has been failing; callers fall back to their last good data"""
+
+    def __init__(self, url: str, retry_at: datetime) -> None:
+        super().__init__(f"ELD API at {url} is failing; not calling it again until {retry_at:%H:%M:%S}")
+        self.url = url
+        self.retry_at = retry_at
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Connection failures, timeouts and server-side statuses; not auth errors, bad requests or bad JSON"""
+    if isinstance(error, CircuitOpenError):
+        return False
+    if isinstance(error, requests.exceptions.HTTPError):
+        return error.response is not None and error.response.status_code in RETRYABLE_STATUSES
+    if isinstance(error, aiohttp.ClientResponseError):
+        return error.status in RETRYABLE_STATUSES
+    return isinstance(error, (
+        requests.exceptions.ConnectionError,
+        requests.exceptions.Timeout,
+        requests.exceptions.ChunkedEncodingError,
+        aiohttp.ClientConnectionError,
+        aiohttp.ClientPayloadError,
+        asyncio.TimeoutError,
+    ))
+
+
+class CircuitBreaker:
+    """Closed while calls succeed; open (failing fast) after failure_threshold failures in a row.
+
+    Once reset_seconds have passed one trial call is let through (half-open): success closes the circuit,
+    failure opens it for another reset_seconds.
+    """
+
+    def __init__(self, url: str, failure_threshold: int = ELD_BREAKER_FAILURES,
+                 reset_seconds: float = ELD_BREAKER_RESET_SECONDS) -> None:
+        self.url = url
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            return "half-open" if time.monotonic() - self._opened_at >= self.reset_seconds else "open"
+
+    def before_call(self) -> None:
+        """Raise CircuitOpenError while open; in half-open, let exactly one trial call through"""
+        with self._lock:
+            if self._opened_at is None:
+                return
+            waited = time.monotonic() - self._opened_at
+            if waited >= self.reset_seconds and not self._trial_running:
+                self._trial_running = True
+                return
+            retry_at = datetime.now() + timedelta(seconds=max(self.reset_seconds - waited, 0))
+        raise CircuitOpenError(self.url, retry_at)
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def cancel_trial(self) -> None:
+        """The trial call was abandoned (e.g. cancelled) without an answer either way"""
+        with self._lock:
+            self._trial_running = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._trial_running or (self.failure_threshold and self._failures >= self.failure_threshold):
+                if self._opened_at is None or self._trial_running:
+                    logger.warning(f"Circuit for {self.url} opened after {self._failures} failures")
+                self._opened_at = time.monotonic()
+            self._trial_running = False
+
+
+_breakers: Dict[Tuple[str, str], CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(url: str, api_key: str) -> Optional[CircuitBreaker]:
+    """The process-wide breaker for one account on an API URL, or None when ELD_BREAKER_FAILURES is 0.
+
+    Keyed by account as well, so one failing fleet does not make the others on the same host fail fast too.
+    """
+    if not ELD_BREAKER_FAILURES:
+        return None
+    with _breakers_lock:
+        key = (url, api_key)
+        if key not in _breakers:
+            _breakers[key] = CircuitBreaker(url)
+        return _breakers[key]
+
+
+def discard_result(future) -> None:
+    """Close the losing hedged request's streamed response, if it produced one"""
+    if not future.cancelled() and future.exception() is None and hasattr(future.result(), "close"):
+        future.result().close()
+
+
+def call_hedged(call: Callable[[], T], hedge_after: float) -> T:
+    """Run call; if it has not returned after hedge_after seconds, race it against a second identical call"""
+    if not hedge_after:
+        return call()
+
+    first = _hedge_executor.submit(call)
+    try:
+        return first.result(timeout=hedge_after)
+    except FutureTimeoutError:
+        pass
+
+    record_stage("api_hedge", hedge_after)
+    pending = {first, _hedge_executor.submit(call)}
+    error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                # Note: a running request cannot be interrupted, so the loser finishes and is thrown away
+                for loser in pending:
+                    loser.add_done_callback(discard_result)
+                return future.result()
+            error = future.exception()
+    raise error
+
+
+async def call_hedged_async(call: Callable[[], Awaitable[T]], hedge_after: float) -> T:
+    """Async call_hedged; the slower request is cancelled as soon as one succeeds"""
+    if not hedge_after:
+        return await call()
+
+    tasks = [asyncio.ensure_future(call())]
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=hedge_after)
+        if not done:
+            record_stage("api_hedge", hedge_after)
+            tasks.append(asyncio.ensure_future(call()))
+
+        pending = set(tasks)
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def log_retry(retry_state: RetryCallState) -> None:
+    error = retry_state.outcome.exception()
+    logger.warning(f"ELD request failed ({type(error).__name__}: {error}); "
+                   f"retry {retry_state.attempt_number} in {retry_state.upcoming_sleep:.1f}s")
+    record_stage("api_retry", retry_state.upcoming_sleep, reason=type(error).__name__)
+
+
+@dataclass
+class RetryPolicy:
+    attempts: int = ELD_RETRY_ATTEMPTS
+    backoff_seconds: float = ELD_RETRY_BACKOFF_SECONDS
+    max_backoff_seconds: float = ELD_RETRY_MAX_BACKOFF_SECONDS
+    deadline_seconds: float = ELD_RETRY_DEADLINE_SECONDS
+    hedge_after_seconds: float = ELD_HEDGE_AFTER_SECONDS
+
+    def retry_options(self) -> dict:
+        stop = stop_after_attempt(max(self.attempts, 1))
+        if self.deadline_seconds:
+            stop = stop | stop_after_delay(self.deadline_seconds)
+        return dict(
+            stop=stop,
+            # Note: full jitter spreads retries from many sessions out instead of having them arrive together
+            wait=wait_random_exponential(multiplier=self.backoff_seconds, max=self.max_backoff_seconds),
+            retry=retry_if_exception(is_retryable),
+            before_sleep=log_retry,
+            reraise=True,
+        )
+
+    def call(self, call: Callable[[], T], breaker: Optional[CircuitBreaker] = None) -> T:
+        """Run call with hedging and retries, failing fast while breaker is open"""
+        if breaker is not None:
+            breaker.before_call()
+        try:
+            result = Retrying(**self.retry_options())(call_hedged, call, self.hedge_after_seconds)
+        except BaseException as e:
+            record_outcome(breaker, e)
+            raise
+        record_outcome(breaker, None)
+        return result
+
+    async def call_async(self, call: Callable[[], Awaitable[T]], breaker: Optional[CircuitBreaker] = None) -> T:
+        if breaker is not None:
+            breaker.before_call()
+        try:
+            result = await AsyncRetrying(**self.retry_options())(call_hedged_async, call, self.hedge_after_seconds)
+        except BaseException as e:
+            record_outcome(breaker, e)
+            raise
+        record_outcome(breaker, None)
+        return result
+
+
+def record_outcome(breaker: Optional[CircuitBreaker], error: Optional[BaseException]) -> None:
+    """Only failures that point at the API itself count against it; an answered request, even a 401, is healthy"""
+    if breaker is None:
+        return
+    if error is not None and not isinstance(error, Exception):
+        # Cancelled or interrupted: says nothing about the API
+        breaker.cancel_trial()
+    elif error is not None and is_retryable(error):
+        breaker.record_failure()
+    else:
+        breaker.record_success()
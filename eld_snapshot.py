@@ -0,0 +1,440 @@
+import logging
+import threading
+from concurrent.futures import Future, wait
+from dataclasses import dataclass, field, replace
+from datetime import datetime
+from typing import Callable, Dict, Hashable, Iterable, Optional, Union
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from cachetools import LRUCache
+
+from duplicate import find_truck_conflicts
+from eld_artifacts import table_digest
+from eld_http import NOT_MODIFIED, ELDPayload, UnexpectedNotModifiedError, Validators
+from eld_delta import SnapshotDelta, apply_delta_to_truck_counts, count_trucks, diff_snapshot_tables
+from eld_metrics import stage
+
+
+# A loader returns a payload dict, a stream of `Data[]` items, NOT_MODIFIED (reuse the cached snapshot) or None,
+# optionally wrapped in an ELDPayload with its validators
+SnapshotLoader = Callable[[], Union[ELDPayload, dict, Iterable[dict], object, None]]
+
+logger = logging.getLogger("eld.snapshot")
+
+# Status mapping
+STATUS_OPTIONS = ['Driving', 'Off Duty', 'On Duty', 'SB']
+
+# Columnar snapshot layout, and the report headers each column is exported under
+SNAPSHOT_SCHEMA = pa.schema([
+    ('driver_id', pa.int64()),
+    ('first_name', pa.string()),
+    ('last_name', pa.string()),
+    ('phone', pa.string()),
+    ('truck', pa.string()),
+    ('status', pa.string()),
+])
+EXPORT_COLUMNS = {
+    'first_name': 'First Name',
+    'last_name': 'Last Name',
+    'truck': 'Vehicle Display ID',
+    'status': 'Log Status',
+}
+ADMIN_TAG_COLUMNS = {
+    'truck': 'adminTagName',
+}
+CONFLICT_COLUMNS = {
+    'driver_id': 'Driver ID',
+    'first_name': 'First Name',
+    'last_name': 'Last Name',
+    'phone': 'Phone Number',
+    'truck': 'Truck Number',
+    'truck_count': 'Drivers on Same Truck',
+}
+
+
+def report_frame(table: pa.Table, columns: Dict[str, str]) -> pd.DataFrame:
+    """Select and rename report columns (Arrow shares the column buffers), converting only those to pandas"""
+    selected = table.select(list(columns)).rename_columns(list(columns.values()))
+    # Note: integer_object_nulls keeps a missing Driver ID from turning the whole ID column into floats
+    return selected.to_pandas(integer_object_nulls=True)
+
+
+@dataclass
+class StatusBucket:
+    table: pa.Table = field(default_factory=SNAPSHOT_SCHEMA.empty_table)
+    _digest: Optional[str] = field(default=None, repr=False, compare=False)
+
+    def __len__(self) -> int:
+        return self.table.num_rows
+
+    @property
+    def digest(self) -> str:
+        """Content hash of the bucket, for keying artifacts built from it"""
+        if self._digest is None:
+            self._digest = table_digest(self.table)
+        return self._digest
+
+    def export_frame(self) -> pd.DataFrame:
+        with stage("build_dataframe", report="status_export") as metric:
+            metric.records = self.table.num_rows
+            return report_frame(self.table, EXPORT_COLUMNS)
+
+    def admin_tag_frame(self) -> pd.DataFrame:
+        with stage("build_dataframe", report="admin_tag") as metric:
+            metric.records = self.table.num_rows
+            return report_frame(self.table, ADMIN_TAG_COLUMNS)
+
+
+def build_export_row(item):
+    """Build one Driver Status Export row from a raw ELD item"""
+    driver = item.get('Driver', {}) or {}
+    vehicle = item.get('Vehicle', {}) or {}
+    log = item.get('Log', {}) or {}
+
+    return {
+        'First Name': driver.get('FirstName', ''),
+        'Last Name': driver.get('LastName', ''),
+        'Vehicle Display ID': vehicle.get('DisplayID', ''),
+        'Log Status': log.get('CurrentStatus', '')
+    }
+
+
+def build_admin_tag_row(item):
+    """Build one Admin Tag Report row from a raw ELD item"""
+    vehicle = item.get('Vehicle', {}) or {}
+    return {
+        'adminTagName': vehicle.get('DisplayID', ''),
+    }
+
+
+def build_snapshot_table(items: Iterable[dict]) -> pa.Table:
+    """Collect `Data[]` items into typed columns in a single pass; items can be a stream"""
+    columns = {name: [] for name in SNAPSHOT_SCHEMA.names}
+    for item in items:
+        if not item:
+            continue
+
+        driver = item.get('Driver', {}) or {}
+        vehicle = item.get('Vehicle', {}) or {}
+        log = item.get('Log', {}) or {}
+
+        columns['driver_id'].append(driver.get('ID'))
+        columns['first_name'].append(driver.get('FirstName', ''))
+        columns['last_name'].append(driver.get('LastName', ''))
+        columns['phone'].append(driver.get('PhoneNo', ''))
+        columns['truck'].append(vehicle.get('DisplayID', ''))
+        columns['status'].append(log.get('CurrentStatus'))
+
+    try:
+        return pa.Table.from_pydict(columns, schema=SNAPSHOT_SCHEMA)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        pass
+
+    # Some value does not fit its column, e.g. a non-numeric driver ID or a phone number sent as a number:
+    # such columns fall back to strings, which is what the export shows anyway
+    schema = SNAPSHOT_SCHEMA
+    arrays = []
+    for index, column in enumerate(SNAPSHOT_SCHEMA):
+        values = columns[column.name]
+        try:
+            arrays.append(pa.array(values, type=column.type))
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            arrays.append(pa.array([None if value is None else str(value) for value in values], type=pa.string()))
+            schema = schema.set(index, pa.field(column.name, pa.string()))
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+def build_status_index(table: pa.Table) -> Dict[str, StatusBucket]:
+    return {status: StatusBucket(table.filter(pc.equal(table['status'], status))) for status in STATUS_OPTIONS}
+
+
+def patch_status_index(previous_index: Dict[str, StatusBucket], table: pa.Table) -> Dict[str, StatusBucket]:
+    """Split the new table by status, keeping API order, but reuse each previous bucket whose rows are unchanged.
+
+    A reused bucket keeps its cached digest, so artifacts keyed on it are found without hashing it again.
+    """
+    status_index = build_status_index(table)
+    for status, bucket in status_index.items():
+        previous = previous_index.get(status)
+        if previous is not None and previous.table.equals(bucket.table):
+            status_index[status] = previous
+    return status_index
+
+
+@dataclass
+class ELDSnapshot:
+    fetched_at: datetime
+    table: pa.Table = field(default_factory=SNAPSHOT_SCHEMA.empty_table)
+    status_index: Dict[str, StatusBucket] = field(default_factory=dict)
+    delta: Optional[SnapshotDelta] = None        # changes since the previous snapshot, if it could be diffed
+    _truck_counts: Optional[pd.Series] = None
+    _digest: Optional[str] = field(default=None, repr=False, compare=False)
+    # ETag and Last-Modified of the payload the table was built from, for the next conditional request
+    validators: Optional[Validators] = field(default=None, repr=False, compare=False)
+
+    @classmethod
+    def from_items(
+        cls,
+        items: Iterable[dict],
+        fetched_at: Optional[datetime] = None,
+        previous: Optional["ELDSnapshot"] = None,
+        validators: Optional[Validators] = None
+    ) -> "ELDSnapshot":
+        """Build the columnar snapshot and its per-status partitions from `Data[]` items.
+
+        Items can be a stream: each one is dropped once its values are collected, so the raw payload is never held.
+        Given the previous snapshot, truck counts are patched from the delta and unchanged status buckets reused.
+        """
+        with stage("build_snapshot") as metric:
+            table = build_snapshot_table(items)
+            metric.records = table.num_rows
+        delta = None
+        if previous is not None:
+            with stage("diff_snapshot") as metric:
+                delta = diff_snapshot_tables(previous.table, table)
+                metric.records = len(delta) if delta is not None else None
+
+        # Note: past half the fleet changing, rebuilding is cheaper than patching
+        if delta is None or len(delta) > table.num_rows // 2:
+            return cls(fetched_at=fetched_at or datetime.now(), table=table, status_index=build_status_index(table),
+                       delta=delta, validators=validators)
+
+        truck_counts = None
+        if previous._truck_counts is not None:
+            truck_counts = apply_delta_to_truck_counts(previous._truck_counts, previous.table, delta)
+
+        return cls(
+            fetched_at=fetched_at or datetime.now(),
+            table=table,
+            status_index=patch_status_index(previous.status_index, table),
+            delta=delta,
+            _truck_counts=truck_counts,
+            validators=validators,
+        )
+
+    def unchanged(self, fetched_at: Optional[datetime] = None) -> "ELDSnapshot":
+        """This snapshot refetched with nothing changed: table, indexes, counts and digest are all reused as they are"""
+        empty = self.table.schema.empty_table()
+        return replace(self, fetched_at=fetched_at or datetime.now(), delta=diff_snapshot_tables(empty, empty))
+
+    @property
+    def truck_counts(self) -> pd.Series:
+        """Drivers per non-empty truck DisplayID, kept up to date from deltas once computed"""
+        if self._truck_counts is None:
+            self._truck_counts = count_trucks(self.table['truck'])
+        return self._truck_counts
+
+    @property
+    def digest(self) -> str:
+        """Content hash of the whole snapshot table; unchanged data hashes the same across refreshes"""
+        if self._digest is None:
+            self._digest = table_digest(self.table)
+        return self._digest
+
+    def bucket(self, status: str) -> StatusBucket:
+        return self.status_index.get(status) or StatusBucket()
+
+    def status_counts(self) -> Dict[str, int]:
+        return {status: len(bucket) for status, bucket in self.status_index.items()}
+
+    def vehicle_conflicts(self, normalize_trucks: bool = False):
+        """Return (per-driver conflicts, per-truck summary) DataFrames for drivers sharing a truck"""
+        with stage("vehicle_conflicts", normalized=normalize_trucks) as metric:
+            df_conflicts, summary = self._find_vehicle_conflicts(normalize_trucks)
+            metric.records = len(df_conflicts)
+            return df_conflicts, summary
+
+    def _find_vehicle_conflicts(self, normalize_trucks: bool):
+        candidates = self.table
+        if not normalize_trucks:
+            # The per-truck counts already say which trucks are shared, so only their drivers need grouping
+            truck_counts = self.truck_counts
+            shared_trucks = pa.array(truck_counts.index[truck_counts > 1].to_numpy(), pa.string())
+            candidates = self.table.filter(pc.is_in(self.table['truck'], value_set=shared_trucks))
+
+        conflicts = find_truck_conflicts(
+            candidates['truck'].to_numpy(zero_copy_only=False),
+            # Note: cast to string so missing IDs stay None instead of turning the column into floats
+            pc.cast(candidates['driver_id'], pa.string()).to_numpy(zero_copy_only=False),
+            normalize=normalize_trucks
+        )
+        conflict_table = candidates.take(conflicts.positions).append_column(
+            'truck_count', pa.array(conflicts.truck_counts, type=pa.int64())
+        )
+
+        summary = conflicts.summary.copy()
+        summary['Driver IDs'] = summary['Driver IDs'].map(
+            lambda ids: ", ".join(str(driver_id) for driver_id in ids if driver_id is not None)
+        )
+        return report_frame(conflict_table, CONFLICT_COLUMNS), summary
+
+
+@dataclass
+class RefreshStatus:
+    """Background refresh state for one cache key, for display alongside the snapshot"""
+    refreshing: bool = False
+    last_attempt_at: Optional[datetime] = None
+    last_error: Optional[Exception] = None      # set while the most recent refresh attempt has failed
+    last_error_at: Optional[datetime] = None
+
+
+class SnapshotCache:
+    """Process-wide ELD snapshot cache shared by every session and tab.
+
+    Snapshots older than ttl_seconds are stale: they are still served at once while a refresh runs in the
+    background (stale-while-revalidate), and a failed refresh keeps the last good snapshot.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: int = 300,
+        max_entries: int = 4,
+        on_snapshot: Optional[Callable[[Hashable, ELDSnapshot], None]] = None
+    ) -> None:
+        self.ttl_seconds = ttl_seconds
+        # Called with each newly fetched snapshot on the refresh thread, e.g. to record it in the history
+        self._on_snapshot = on_snapshot
+        # The last good snapshot per key, least recently used evicted once full; also the base for the next diff
+        self._snapshots = LRUCache(maxsize=max_entries)
+        self._status: Dict[Hashable, RefreshStatus] = {}
+        # At most one refresh per key is in flight; every caller that needs it waits on the same future
+        self._inflight: Dict[Hashable, Future] = {}
+        self._prefetchers: Dict[Hashable, threading.Event] = {}
+        self._lock = threading.Lock()
+
+    def peek(self, key: Hashable) -> Optional[ELDSnapshot]:
+        """Return the cached snapshot, stale or not, without triggering a fetch"""
+        with self._lock:
+            return self._snapshots.get(key)
+
+    def is_stale(self, snapshot: ELDSnapshot) -> bool:
+        return (datetime.now() - snapshot.fetched_at).total_seconds() >= self.ttl_seconds
+
+    def status(self, key: Hashable) -> RefreshStatus:
+        with self._lock:
+            return replace(self._status.get(key) or RefreshStatus())
+
+    def get(self, key: Hashable, loader: SnapshotLoader) -> Optional[ELDSnapshot]:
+        """Return the cached snapshot at once, refreshing it in the background if stale.
+
+        Only the very first load for a key blocks, and concurrent callers share that one fetch.
+        """
+        with self._lock:
+            snapshot = self._snapshots.get(key)
+            if snapshot is not None:
+                if self.is_stale(snapshot):
+                    self._start_refresh(key, loader)
+                return snapshot
+            future = self._start_refresh(key, loader)
+        return future.result()
+
+    def refresh(self, key: Hashable, loader: SnapshotLoader) -> Optional[ELDSnapshot]:
+        """Fetch now and wait for the result (joining a refresh already in flight), keeping the last good snapshot if it fails"""
+        with self._lock:
+            future = self._start_refresh(key, loader)
+        return future.result() or self.peek(key)
+
+    def invalidate(self, key: Optional[Hashable] = None) -> None:
+        with self._lock:
+            if key is None:
+                self._snapshots.clear()
+            else:
+                self._snapshots.pop(key, None)
+
+    def start_prefetch(self, key: Hashable, loader: SnapshotLoader, interval_seconds: float) -> None:
+        """Keep the snapshot for key warm by refreshing it every interval_seconds on a daemon thread; idempotent"""
+        if interval_seconds <= 0:
+            return
+        with self._lock:
+            if key in self._prefetchers:
+                return
+            stop = self._prefetchers[key] = threading.Event()
+        threading.Thread(
+            target=self._prefetch_loop, args=(key, loader, interval_seconds, stop), name="eld-prefetch", daemon=True
+        ).start()
+
+    def stop_prefetch(self, key: Optional[Hashable] = None) -> None:
+        with self._lock:
+            keys = list(self._prefetchers) if key is None else [key]
+            for stop_key in keys:
+                stop = self._prefetchers.pop(stop_key, None)
+                if stop is not None:
+                    stop.set()
+
+    def _prefetch_loop(self, key: Hashable, loader: SnapshotLoader, interval_seconds: float,
+                       stop: threading.Event) -> None:
+        while not stop.is_set():
+            with self._lock:
+                future = self._start_refresh(key, loader)
+            # Note: the interval is counted from the end of a refresh, so a slow API is never asked twice at once
+            wait([future])
+            stop.wait(interval_seconds)
+
+    def _start_refresh(self, key: Hashable, loader: SnapshotLoader) -> Future:
+        """Return the in-flight refresh for key, starting one on a worker thread if there is none; call with the lock held"""
+        future = self._inflight.get(key)
+        if future is None:
+            future = self._inflight[key] = Future()
+            status = self._status.setdefault(key, RefreshStatus())
+            status.refreshing = True
+            status.last_attempt_at = datetime.now()
+            threading.Thread(
+                target=self._run_refresh, args=(key, loader, future), name="eld-refresh", daemon=True
+            ).start()
+        return future
+
+    def _run_refresh(self, key: Hashable, loader: SnapshotLoader, future: Future) -> None:
+        try:
+            snapshot = self._load(key, loader)
+        except Exception as e:
+            with self._lock:
+                status = self._status[key]
+                status.refreshing = False
+                status.last_error = e
+                status.last_error_at = datetime.now()
+                del self._inflight[key]
+            future.set_exception(e)
+            return
+
+        with self._lock:
+            status = self._status[key]
+            status.refreshing = False
+            if snapshot is not None:
+                self._snapshots[key] = snapshot
+                status.last_error = status.last_error_at = None
+            del self._inflight[key]
+        future.set_result(snapshot)
+
+    def _load(self, key: Hashable, loader: SnapshotLoader) -> Optional[ELDSnapshot]:
+        """Run loader, which returns a whole payload dict, a stream of `Data[]` items or NOT_MODIFIED"""
+        payload = loader()
+        validators = None
+        if isinstance(payload, ELDPayload):
+            # Note: the validators are only kept on the snapshot built from the payload, so a 304 can never stand
+            # for a payload whose snapshot failed to build
+            payload, validators = payload
+        if payload is None:
+            return None
+
+        previous = self.peek(key)
+        if payload is NOT_MODIFIED:
+            # Note: the API confirmed the cached payload is current, so there is nothing to parse or rebuild
+            if previous is None:
+                # e.g. evicted while the request was in flight; the next refresh asks unconditionally
+                raise UnexpectedNotModifiedError(
+                    "ELD API answered 304 Not Modified but there is no cached snapshot to reuse"
+                )
+            snapshot = previous.unchanged()
+        else:
+            items = (payload.get('Data') or []) if isinstance(payload, dict) else payload
+            # Note: a failure part-way through a stream raises here, so a partial snapshot is never cached
+            snapshot = ELDSnapshot.from_items(items, previous=previous, validators=validators)
+        if self._on_snapshot is not None:
+            try:
+                self._on_snapshot(key, snapshot)
+            except Exception:
+                # The snapshot itself is good; a failing hook must not turn the refresh into an error
+                logger.exception("Snapshot hook failed")
+        return snapshot
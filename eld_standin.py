@@ -0,0 +1,297 @@
+"""Local stand-in for the ELD driver API, for exercising ELDSync without the real service.
+
+    python eld_standin.py --drivers 50000 --latency 0.2 --item-latency 0.00005 --port 8765
+    ELD_API_URL=http://127.0.0.1:8765 streamlit run app.py
+
+Faults can be injected to exercise retries, hedging and the circuit breaker:
+
+    python eld_standin.py --fail-first 3 --error-rate 0.2 --drop-rate 0.05 --slow-rate 0.1 --slow-seconds 30
+
+Responses are compressed per Accept-Encoding and carry an ETag and Last-Modified, so conditional requests get a 304
+until set_items() changes the data; --no-compress and --no-conditional turn either off.
+--no-paging makes it ignore offset/limit, as some deployments of the API do.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import random
+import socket
+import threading
+import time
+import zlib
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional
+from urllib.parse import parse_qs, urlparse
+
+from eld_http import ELD_DRIVERS_ENDPOINT, ELD_PAGE_LIMIT_PARAM, ELD_PAGE_OFFSET_PARAM, ELD_STATUS_PARAM, brotli
+from eld_snapshot import STATUS_OPTIONS
+
+def generate_eld_items(count: int, seed: int = 0, gaps: bool = False) -> List[dict]:
+    """Deterministic `Data[]` items; about one driver in twenty is put on a truck someone else already has.
+
+    With gaps, like real payloads some items lack data: about 3% have no Vehicle (missing or null), 2% no Log and
+    1% an empty DisplayID.
+    """
+    rng = random.Random(seed)
+    items = []
+    for index in range(count):
+        item = {
+            "Driver": {
+                "ID": 100000 + index,
+                "FirstName": f"First{index}",
+                "LastName": f"Last{index}",
+                "PhoneNo": f"(555) {rng.randint(100, 999)}-{rng.randint(0, 9999):04d}",
+            },
+            "Vehicle": {"DisplayID": f"T{rng.randrange(index + 1) if rng.random() < 0.05 else index}"},
+            "Log": {"CurrentStatus": rng.choice(STATUS_OPTIONS)},
+        }
+        if gaps:
+            roll = rng.random()
+            if roll < 0.015:
+                del item["Vehicle"]
+            elif roll < 0.03:
+                item["Vehicle"] = None
+            elif roll < 0.04:
+                item["Vehicle"]["DisplayID"] = ""
+            if rng.random() < 0.02:
+                item["Log"] = None if rng.random() < 0.5 else {}
+        items.append(item)
+    return items
+
+
+class StandInELDHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path.strip("/") != ELD_DRIVERS_ENDPOINT.strip("/"):
+            self.send_error(404)
+            return
+
+        fault = self.server.next_fault()
+        if fault == "drop":
+            # Close the connection without answering, as a crashed or overloaded upstream would
+            self.close_connection = True
+            self.connection.shutdown(socket.SHUT_RDWR)
+            return
+        if fault == "error":
+            self.send_json({"Status": "Error", "Message": "Injected failure"}, status=503)
+            return
+        if fault == "slow":
+            time.sleep(self.server.slow_seconds)
+
+        query = parse_qs(url.query)
+        items = self.server.items
+        status = query.get(ELD_STATUS_PARAM, [None])[0]
+        if status is not None:
+            items = [item for item in items if (item.get("Log") or {}).get("CurrentStatus") == status]
+        if ELD_PAGE_LIMIT_PARAM in query and self.server.paging:
+            offset = int(query.get(ELD_PAGE_OFFSET_PARAM, [0])[0])
+            items = items[offset:offset + int(query[ELD_PAGE_LIMIT_PARAM][0])]
+
+        body = json.dumps({"Status": "Success", "Data": items}).encode("utf-8")
+        etag = f'"{hashlib.blake2b(body, digest_size=8).hexdigest()}"'
+        if self.server.conditional and self.is_not_modified(etag):
+            # Nothing to look up or send, so only the base latency applies
+            time.sleep(self.server.latency)
+            with self.server._fault_lock:
+                self.server.not_modified_count += 1
+            self.send_response(304)
+            self.send_validators(etag)
+            self.end_headers()
+            return
+
+        # Model an API whose response time grows with the size of the answer
+        time.sleep(self.server.latency + self.server.item_latency * len(items))
+        encoding, body = self.compress(body)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        if encoding:
+            self.send_header("Content-Encoding", encoding)
+        self.send_header("Vary", "Accept-Encoding")
+        if self.server.conditional:
+            self.send_validators(etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        with self.server._fault_lock:
+            self.server.bytes_sent += len(body)
+
+    def is_not_modified(self, etag: str) -> bool:
+        """If-None-Match wins over If-Modified-Since, as in RFC 9110"""
+        if_none_match = self.headers.get("If-None-Match")
+        if if_none_match is not None:
+            return etag in (tag.strip() for tag in if_none_match.split(",")) or if_none_match.strip() == "*"
+        if_modified_since = self.headers.get("If-Modified-Since")
+        if if_modified_since is None:
+            return False
+        try:
+            return int(self.server.modified_at) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+
+    def send_validators(self, etag: str) -> None:
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", formatdate(self.server.modified_at, usegmt=True))
+
+    def compress(self, body: bytes):
+        """Return (Content-Encoding or None, body) for the best encoding the client accepts"""
+        if not self.server.compress:
+            return None, body
+        accepted = {token.split(";")[0].strip().lower() for token in self.headers.get("Accept-Encoding", "").split(",")}
+        if brotli is not None and "br" in accepted:
+            return "br", brotli.compress(body, quality=5)
+        if "gzip" in accepted:
+            return "gzip", gzip.compress(body, compresslevel=6, mtime=0)
+        if "deflate" in accepted:
+            return "deflate", zlib.compress(body, 6)
+        return None, body
+
+    def send_json(self, payload: dict, status: int = 200) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class StandInELDServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        items: List[dict],
+        port: int = 0,
+        latency: float = 0.0,
+        item_latency: float = 0.0,
+        verbose: bool = False,
+        fail_first: int = 0,
+        error_rate: float = 0.0,
+        drop_rate: float = 0.0,
+        slow_rate: float = 0.0,
+        slow_seconds: float = 0.0,
+        fault_seed: int = 0,
+        compress: bool = True,
+        conditional: bool = True,
+        paging: bool = True
+    ) -> None:
+        super().__init__(("127.0.0.1", port), StandInELDHandler)
+        self.items = items
+        self.modified_at = time.time()
+        self.compress = compress
+        self.conditional = conditional
+        # False models an API that ignores offset/limit and always answers with every driver
+        self.paging = paging
+        self.not_modified_count = 0
+        self.bytes_sent = 0
+        self.latency = latency
+        self.item_latency = item_latency
+        self.verbose = verbose
+        # Fault injection: the first fail_first requests get a 503, then each request independently may get a 503,
+        # have its connection dropped, or be held for slow_seconds
+        self.fail_first = fail_first
+        self.error_rate = error_rate
+        self.drop_rate = drop_rate
+        self.slow_rate = slow_rate
+        self.slow_seconds = slow_seconds
+        self.request_count = 0
+        self._fault_rng = random.Random(fault_seed)
+        self._fault_lock = threading.Lock()
+
+    def set_items(self, items: List[dict]) -> None:
+        """Replace the served data, which changes its ETag and Last-Modified"""
+        self.items = items
+        # Note: Last-Modified has one-second resolution, so a change within the same second still has to move it
+        self.modified_at = max(time.time(), int(self.modified_at) + 1)
+
+    def next_fault(self) -> Optional[str]:
+        """Count the request and decide its injected fault: "error", "drop", "slow" or None"""
+        with self._fault_lock:
+            self.request_count += 1
+            if self.request_count <= self.fail_first:
+                return "error"
+            roll = self._fault_rng.random()
+        if roll < self.error_rate:
+            return "error"
+        if roll < self.error_rate + self.drop_rate:
+            return "drop"
+        if roll < self.error_rate + self.drop_rate + self.slow_rate:
+            return "slow"
+        return None
+
+    def handle_error(self, request, client_address):
+        # Clients cancel speculative page requests, which shows up here as a dropped connection
+        if not self.verbose:
+            return
+        super().handle_error(request, client_address)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_port}"
+
+
+def start_standin_server(
+    items: Optional[List[dict]] = None,
+    port: int = 0,
+    latency: float = 0.0,
+    item_latency: float = 0.0,
+    **options
+) -> StandInELDServer:
+    """Serve items on a background thread; call shutdown() on the result when done.
+
+    options are StandInELDServer's other options: fault injection (fail_first, error_rate, drop_rate, slow_rate, ...),
+    compress, conditional and paging.
+    """
+    if items is None:
+        items = generate_eld_items(1000)
+    server = StandInELDServer(items, port=port, latency=latency, item_latency=item_latency, **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local stand-in ELD driver API")
+    parser.add_argument("--drivers", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds to wait before answering each request")
+    parser.add_argument("--item-latency", type=float, default=0.0, help="extra seconds per driver in the response")
+    parser.add_argument("--fail-first", type=int, default=0, help="answer the first N requests with a 503")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with a 503")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="share of requests whose connection is dropped")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="share of requests held for --slow-seconds")
+    parser.add_argument("--slow-seconds", type=float, default=30.0)
+    parser.add_argument("--no-compress", action="store_true", help="never compress responses")
+    parser.add_argument("--no-conditional", action="store_true", help="send no ETag or Last-Modified, never a 304")
+    parser.add_argument("--no-paging", action="store_true", help="ignore offset/limit and always send every driver")
+    args = parser.parse_args()
+
+    server = StandInELDServer(
+        generate_eld_items(args.drivers, args.seed),
+        port=args.port,
+        latency=args.latency,
+        item_latency=args.item_latency,
+        verbose=True,
+        fail_first=args.fail_first,
+        error_rate=args.error_rate,
+        drop_rate=args.drop_rate,
+        slow_rate=args.slow_rate,
+        slow_seconds=args.slow_seconds,
+        fault_seed=args.seed,
+        compress=not args.no_compress,
+        conditional=not args.no_conditional,
+        paging=not args.no_paging
+    )
+    print(f"Stand-in ELD API with {args.drivers} drivers on {server.url}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
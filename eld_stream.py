@@ -0,0 +1,127 @@
+import codecs
+import json
+from typing import Any, Iterable, Iterator, List
+
+_WHITESPACE = " \t\n\r"
+
+
+class JSONArrayStreamParser:
+    """Incrementally parse `{..., "<key>": [item, item, ...], ...}` and emit each array item as soon as it is complete.
+
+    Bytes are pushed in with feed() as they arrive, so only the current, unfinished item is ever held in memory.
+    Other top-level keys are decoded and discarded.
+    """
+
+    def __init__(self, key: str = "Data") -> None:
+        self.key = key
+        self._decoder = json.JSONDecoder()
+        self._utf8 = codecs.getincrementaldecoder("utf-8")()
+        self._buffer = ""
+        self._pos = 0
+        self._state = "start"
+        self._current_key = None
+        self._closed = False
+
+    def feed(self, chunk: bytes) -> List[Any]:
+        """Add a chunk of the response body and return the items it completed"""
+        text = self._utf8.decode(chunk) if isinstance(chunk, (bytes, bytearray)) else chunk
+        # Note: compact once per chunk rather than once per item, so consumed text is not copied over and over
+        self._buffer = self._buffer[self._pos:] + text
+        self._pos = 0
+        return self._parse()
+
+    def close(self) -> List[Any]:
+        """Flush the parser at end of body, raising ValueError if the payload was truncated"""
+        self._buffer = self._buffer[self._pos:] + self._utf8.decode(b"", final=True)
+        self._pos = 0
+        self._closed = True
+        items = self._parse()
+        self._skip_whitespace()
+        if self._state != "done" or self._pos < len(self._buffer):
+            raise ValueError("Invalid or truncated JSON response from API")
+        return items
+
+    def _skip_whitespace(self) -> bool:
+        """Advance past whitespace, returning True if a non-whitespace character is available"""
+        buffer = self._buffer
+        pos = self._pos
+        while pos < len(buffer) and buffer[pos] in _WHITESPACE:
+            pos += 1
+        self._pos = pos
+        return pos < len(buffer)
+
+    def _expect(self, *characters: str) -> str:
+        character = self._buffer[self._pos]
+        if character not in characters:
+            raise ValueError(f"Unexpected {character!r} in JSON response")
+        self._pos += 1
+        return character
+
+    def _decode_value(self):
+        """Decode the next complete JSON value, returning (True, value) or (False, None) if more bytes are needed"""
+        try:
+            value, end = self._decoder.raw_decode(self._buffer, self._pos)
+        except json.JSONDecodeError:
+            if self._closed:
+                raise
+            return False, None
+
+        # A number cut off by the chunk boundary ("1." or "12") decodes early, so wait until a delimiter follows it
+        if not self._closed and not isinstance(value, (dict, list, str)):
+            if end == len(self._buffer) or self._buffer[end] not in _WHITESPACE + ",]}":
+                return False, None
+
+        self._pos = end
+        return True, value
+
+    def _parse(self) -> List[Any]:
+        items = []
+        while self._state != "done" and self._skip_whitespace():
+            if self._state == "start":
+                self._expect("{")
+                self._state = "key"
+            elif self._state == "key":
+                if self._buffer[self._pos] == "}":
+                    self._pos += 1
+                    self._state = "done"
+                    continue
+                complete, key = self._decode_value()
+                if not complete:
+                    break
+                self._current_key = key
+                self._state = "colon"
+            elif self._state == "colon":
+                self._expect(":")
+                self._state = "value"
+            elif self._state == "value":
+                if self._current_key == self.key and self._buffer[self._pos] == "[":
+                    self._pos += 1
+                    self._state = "item"
+                    continue
+                complete, _ = self._decode_value()
+                if not complete:
+                    break
+                self._state = "next_key"
+            elif self._state == "next_key":
+                self._state = "key" if self._expect(",", "}") == "," else "done"
+            elif self._state == "item":
+                if self._buffer[self._pos] == "]":
+                    self._pos += 1
+                    self._state = "next_key"
+                    continue
+                complete, item = self._decode_value()
+                if not complete:
+                    break
+                items.append(item)
+                self._state = "next_item"
+            elif self._state == "next_item":
+                self._state = "item" if self._expect(",", "]") == "," else "next_key"
+        return items
+
+
+def iter_json_array_items(chunks: Iterable[bytes], key: str = "Data") -> Iterator[Any]:
+    """Yield the items of the top-level `key` array from an iterable of response body chunks"""
+    parser = JSONArrayStreamParser(key)
+    for chunk in chunks:
+        yield from parser.feed(chunk)
+    yield from parser.close()
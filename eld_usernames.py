@@ -0,0 +1,119 @@
+"""Per-row username validation results reused across uploads, and the issue diff between two uploads."""
+import threading
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from eld_metrics import stage
+from reports import (
+    USERNAME_ISSUE,
+    USERNAME_REQUIRED_COLUMNS,
+    build_username_issues,
+    classify_usernames,
+)
+
+# Columns that identify an issue row when comparing two uploads
+USERNAME_ISSUE_KEY_COLUMNS = ["First Name", "Last Name", "Phone Number", "Current Username", "Notes"]
+
+
+def username_row_keys(drivers_df: pd.DataFrame) -> np.ndarray:
+    """Hash per row of the columns its validation depends on, with blanks and empty strings hashing alike.
+
+    Uses Python's own (per-process salted) hash, several times faster than pandas' and fine for an in-memory cache.
+    """
+    columns = []
+    for column in USERNAME_REQUIRED_COLUMNS:
+        values = drivers_df[column].to_numpy()
+        columns.append(np.where(pd.isna(values), "", values))
+    return np.fromiter(map(hash, zip(*columns)), dtype=np.int64, count=len(drivers_df))
+
+
+class UsernameValidationCache:
+    """Validation outcome per row, keyed by a hash of First Name, Last Name, Phone Number, Username and Notes.
+
+    A re-upload with a few usernames fixed only validates the changed rows; the rest are looked up.
+    Holds at most max_rows results, dropping the oldest first.
+    """
+
+    def __init__(self, max_rows: int = 1_000_000) -> None:
+        self.max_rows = max_rows
+        self._keys = pd.Index([], dtype="int64")
+        self._outcomes = np.empty(0, dtype=np.int8)
+        self._proposed = np.empty(0, dtype=object)      # proposed username for issue rows, "" for the rest
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def find_username_issues(self, drivers_df: pd.DataFrame):
+        """find_username_issues, validating only rows not seen before"""
+        missing_columns = [column for column in USERNAME_REQUIRED_COLUMNS if column not in drivers_df.columns]
+        if missing_columns:
+            return None, missing_columns, 0
+
+        keys = username_row_keys(drivers_df)
+        with self._lock:
+            known_keys, known_outcomes, known_proposed = self._keys, self._outcomes, self._proposed
+        positions = known_keys.get_indexer(keys)
+        missed = positions < 0
+
+        with stage("username_revalidate") as metric:
+            outcomes = np.empty(len(keys), dtype=np.int8)
+            proposed = np.empty(len(keys), dtype=object)
+            hit = ~missed
+            outcomes[hit] = known_outcomes[positions[hit]]
+            proposed[hit] = known_proposed[positions[hit]]
+            if missed.any():
+                missed_outcomes, missed_proposed = classify_usernames(drivers_df.loc[missed].fillna(""))
+                missed_all_proposed = np.full(len(missed_outcomes), "", dtype=object)
+                missed_all_proposed[missed_outcomes == USERNAME_ISSUE] = missed_proposed
+                outcomes[missed] = missed_outcomes
+                proposed[missed] = missed_all_proposed
+                self._store(keys[missed], missed_outcomes, missed_all_proposed)
+            metric.records = int(missed.sum())
+
+        with self._lock:
+            self.hits += len(keys) - int(missed.sum())
+            self.misses += int(missed.sum())
+        return build_username_issues(drivers_df, outcomes, proposed[outcomes == USERNAME_ISSUE])
+
+    def _store(self, keys: np.ndarray, outcomes: np.ndarray, proposed: np.ndarray) -> None:
+        new_keys = pd.Index(keys, dtype="int64")
+        with self._lock:
+            # Note: keys must stay unique for get_indexer, and another upload may have stored some of these meanwhile
+            fresh = ~new_keys.duplicated() & ~new_keys.isin(self._keys)
+            self._keys = self._keys.append(new_keys[fresh])
+            self._outcomes = np.concatenate([self._outcomes, outcomes[fresh]])
+            self._proposed = np.concatenate([self._proposed, proposed[fresh]])
+            if len(self._keys) > self.max_rows:
+                self._keys = self._keys[-self.max_rows:]
+                self._outcomes = self._outcomes[-self.max_rows:]
+                self._proposed = self._proposed[-self.max_rows:]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._keys = pd.Index([], dtype="int64")
+            self._outcomes = np.empty(0, dtype=np.int8)
+            self._proposed = np.empty(0, dtype=object)
+            self.hits = self.misses = 0
+
+
+class UsernameIssueDiff(NamedTuple):
+    resolved: pd.DataFrame      # issues in the previous upload that are gone from this one
+    introduced: pd.DataFrame    # issues in this upload that the previous one did not have
+
+    def counts(self):
+        return {'Resolved': len(self.resolved), 'Introduced': len(self.introduced)}
+
+
+def diff_username_issues(previous_issues: pd.DataFrame, issues: pd.DataFrame) -> UsernameIssueDiff:
+    """Compare two uploads' issue reports row by row; an issue whose key columns are unchanged is the same issue"""
+    previous_keys = pd.util.hash_pandas_object(previous_issues[USERNAME_ISSUE_KEY_COLUMNS], index=False)
+    keys = pd.util.hash_pandas_object(issues[USERNAME_ISSUE_KEY_COLUMNS], index=False)
+    return UsernameIssueDiff(
+        resolved=previous_issues.loc[~previous_keys.isin(keys).to_numpy()],
+        introduced=issues.loc[~keys.isin(previous_keys).to_numpy()],
+    )
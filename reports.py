@@ -0,0 +1,249 @@
+"""Report building shared by the Streamlit app and the headless batch runner; no Streamlit imports here."""
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
+
+from eld_metrics import stage
+from eld_snapshot import build_admin_tag_row, build_export_row
+
+# Rows per chunk when validating driver CSVs
+USERNAME_CSV_CHUNK_ROWS = 50000
+
+# Statuses that also get an Admin Tag Report
+ADMIN_TAG_STATUSES = ["Driving", "On Duty"]
+
+
+def status_file_slug(status):
+    """File name form of a status, e.g. Off Duty -> off_duty"""
+    return status.lower().replace(' ', '_')
+
+
+def filter_data_by_status(data, status):
+    """Filter data by current status"""
+    if not data or 'Data' not in data:
+        return []
+    
+    with stage("filter_by_status", status=status) as metric:
+        filtered_data = []
+        for item in data['Data']:
+            if item and (item.get('Log', {}) or {}).get('CurrentStatus') == status:
+                filtered_data.append(item)
+        metric.records = len(filtered_data)
+    
+    return filtered_data
+
+def create_excel_dataframe(filtered_data):
+    """Create DataFrame for Excel export"""
+    with stage("build_dataframe", report="status_export") as metric:
+        excel_data = [build_export_row(item) for item in filtered_data]
+        metric.records = len(excel_data)
+        return pd.DataFrame(excel_data)
+
+def create_admin_tag_dataframe(filtered_data):
+    """Create DataFrame for Excel export"""
+    with stage("build_dataframe", report="admin_tag") as metric:
+        excel_data = [build_admin_tag_row(item) for item in filtered_data]
+        metric.records = len(excel_data)
+        return pd.DataFrame(excel_data)
+
+
+EXCEL_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# Download formats: file extension and MIME type
+EXPORT_FORMATS = {
+    "XLSX": ("xlsx", EXCEL_MIME),
+    "CSV": ("csv", "text/csv"),
+    "Parquet": ("parquet", "application/vnd.apache.parquet"),
+}
+
+
+def create_excel_workbook(sheets):
+    """Create a multi-sheet Excel file in memory, streaming rows through a write-only workbook"""
+    with stage("excel_serialize", sheets=len(sheets)) as metric:
+        # Note: write-only mode serializes rows as they are appended instead of keeping a cell object per value
+        workbook = Workbook(write_only=True)
+        for sheet_name, dataframe in sheets.items():
+            worksheet = workbook.create_sheet(title=sheet_name)
+            header = []
+            for column_name in dataframe.columns:
+                cell = WriteOnlyCell(worksheet, value=str(column_name))
+                cell.font = Font(bold=True)
+                header.append(cell)
+            worksheet.append(header)
+
+            values = dataframe.astype(object).where(dataframe.notna(), None)
+            for row in values.itertuples(index=False, name=None):
+                worksheet.append(row)
+
+        if not sheets:
+            workbook.create_sheet(title='ELD Data')
+
+        output = BytesIO()
+        workbook.save(output)
+        output.seek(0)
+        metric.records = sum(len(dataframe) for dataframe in sheets.values())
+        metric.bytes = output.getbuffer().nbytes
+        return output
+
+
+def create_excel_file(dataframe):
+    """Create Excel file in memory"""
+    return create_excel_workbook({'ELD Data': dataframe})
+
+
+def create_export_file(dataframe, export_format):
+    """Create the report file in memory in the chosen EXPORT_FORMATS format"""
+    if export_format not in ("CSV", "Parquet"):
+        return create_excel_file(dataframe)
+
+    with stage("export_serialize", format=export_format) as metric:
+        if export_format == "CSV":
+            output = BytesIO(dataframe.to_csv(index=False).encode('utf-8'))
+        else:
+            output = BytesIO()
+            dataframe.to_parquet(output, index=False)
+            output.seek(0)
+        metric.records = len(dataframe)
+        metric.bytes = output.getbuffer().nbytes
+        return output
+
+
+def get_cell_text(value):
+    """A cell's value as text, with missing values (None or NaN) as an empty string."""
+    return "" if value is None or pd.isna(value) else str(value)
+
+
+def get_first_initial(value):
+    """Return the first non-empty character from a name field."""
+    value = get_cell_text(value).strip()
+    return value[0].lower() if value else ""
+
+
+def get_last_four_phone_digits(phone_number):
+    """Return the last four numeric digits from a phone number."""
+    digits = "".join(character for character in get_cell_text(phone_number) if character.isdigit())
+    return digits[-4:] if len(digits) >= 4 else ""
+
+
+def build_expected_username(row):
+    """Build username as phone last four digits + first initial + last initial."""
+    return (
+        get_last_four_phone_digits(row.get("Phone Number", ""))
+        + get_first_initial(row.get("First Name", ""))
+        + get_first_initial(row.get("Last Name", ""))
+    )
+
+
+def get_last_four_phone_digits_column(phone_numbers):
+    """Vectorized get_last_four_phone_digits over a whole column of phone numbers."""
+    phone_numbers = phone_numbers.where(phone_numbers.notna(), "").astype(str)
+    digits = phone_numbers.str.replace(r"[^0-9]", "", regex=True)
+
+    # Note: str.isdigit also accepts non-ASCII digits (e.g. "²"), so those rare rows keep the per-value rule
+    non_ascii = phone_numbers.str.contains(r"[^\x00-\x7f]", regex=True)
+    if non_ascii.any():
+        digits = digits.copy()
+        digits[non_ascii] = phone_numbers[non_ascii].map(
+            lambda value: "".join(character for character in value if character.isdigit())
+        )
+
+    return digits.str[-4:].where(digits.str.len() >= 4, "")
+
+
+def get_first_initial_column(values):
+    """Vectorized get_first_initial over a whole column of names."""
+    return values.where(values.notna(), "").astype(str).str.strip().str[:1].str.lower()
+
+
+def build_expected_usernames(drivers_df):
+    """Vectorized build_expected_username: phone last four digits + first initial + last initial for every row."""
+    return (
+        get_last_four_phone_digits_column(drivers_df["Phone Number"])
+        + get_first_initial_column(drivers_df["First Name"])
+        + get_first_initial_column(drivers_df["Last Name"])
+    )
+
+
+USERNAME_REQUIRED_COLUMNS = ["First Name", "Last Name", "Phone Number", "Username", "Notes"]
+USERNAME_ISSUE_COLUMNS = [
+    "First Name",
+    "Last Name",
+    "Phone Number",
+    "Current Username",
+    "Proposed Username",
+    "Driver ID",
+    "Email",
+    "Notes",
+]
+
+# Per-row validation outcomes
+USERNAME_OK, USERNAME_ISSUE, USERNAME_EXCEPTION = 0, 1, 2
+
+
+def classify_usernames(normalized_df):
+    """Return (outcome per row, proposed username per issue row) for a drivers frame with blanks filled in.
+
+    Depends only on USERNAME_REQUIRED_COLUMNS, so results can be reused for rows whose values are unchanged.
+    """
+    notes = normalized_df["Notes"].astype(str)
+    exception_mask = notes.str.contains(r"\b(?:team|local)\b", case=False, na=False, regex=True).to_numpy()
+    checked_df = normalized_df.loc[~exception_mask]
+    proposed = build_expected_usernames(checked_df)
+    current = checked_df["Username"].astype(str).str.strip()
+    issue_mask = (proposed.ne("") & current.str.lower().ne(proposed)).to_numpy()
+
+    outcomes = np.full(len(normalized_df), USERNAME_OK, dtype=np.int8)
+    outcomes[exception_mask] = USERNAME_EXCEPTION
+    outcomes[np.flatnonzero(~exception_mask)[issue_mask]] = USERNAME_ISSUE
+    return outcomes, proposed.to_numpy()[issue_mask]
+
+
+def build_username_issues(drivers_df, outcomes, proposed):
+    """The (issues, [], skipped count) report for a frame given its outcomes and the issue rows' proposed usernames"""
+    issues_df = drivers_df.loc[outcomes == USERNAME_ISSUE].fillna("")
+    issues_df["Proposed Username"] = proposed
+    issues_df["Current Username"] = issues_df["Username"].astype(str).str.strip()
+    available_columns = [column for column in USERNAME_ISSUE_COLUMNS if column in issues_df.columns]
+    return issues_df[available_columns], [], int((outcomes == USERNAME_EXCEPTION).sum())
+
+
+def find_username_issues(drivers_df):
+    """Find usernames that do not follow the COGO ELD username standard."""
+    missing_columns = [column for column in USERNAME_REQUIRED_COLUMNS if column not in drivers_df.columns]
+    if missing_columns:
+        return None, missing_columns, 0
+
+    normalized_df = drivers_df.fillna("")
+    outcomes, proposed = classify_usernames(normalized_df)
+    return build_username_issues(normalized_df, outcomes, proposed)
+
+
+def find_username_issues_chunked(csv_file, chunk_size=USERNAME_CSV_CHUNK_ROWS, on_progress=None, validate=None):
+    """Validate a drivers CSV in fixed-size chunks, keeping only the issue rows in memory.
+
+    Returns the same (issues, missing columns, skipped count) as find_username_issues on the whole file.
+    validate replaces find_username_issues per chunk, e.g. a UsernameValidationCache's cached version.
+    """
+    validate = validate or find_username_issues
+    issue_frames = []
+    skipped_count = 0
+    rows_read = 0
+
+    with stage("username_validation") as metric, pd.read_csv(csv_file, dtype=str, chunksize=chunk_size) as reader:
+        for chunk in reader:
+            username_issues, missing_columns, chunk_skipped_count = validate(chunk)
+            if missing_columns:
+                return None, missing_columns, 0
+
+            issue_frames.append(username_issues)
+            skipped_count += chunk_skipped_count
+            rows_read += len(chunk)
+            metric.records = rows_read
+            if on_progress:
+                on_progress(rows_read)
+
+    return pd.concat(issue_frames), [], skipped_count
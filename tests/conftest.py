@@ -0,0 +1,26 @@
+import pytest
+
+from eld_resilience import RetryPolicy
+from eld_standin import generate_eld_items, start_standin_server
+
+
+@pytest.fixture
+def standin():
+    """Start a stand-in ELD API with the given options; every server started is shut down after the test"""
+    servers = []
+
+    def start(items=None, **options):
+        server = start_standin_server(items if items is not None else generate_eld_items(250), **options)
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def fast_retries():
+    """Retries without real backoff and without hedging, so failing requests do not slow the suite down"""
+    return RetryPolicy(attempts=3, backoff_seconds=0.01, max_backoff_seconds=0.02, hedge_after_seconds=0)
@@ -0,0 +1,97 @@
+import pytest
+
+from duplicate import ELDSync
+from eld_http import NOT_MODIFIED, ELDPayload, UnexpectedNotModifiedError
+from eld_snapshot import SnapshotCache
+from eld_standin import generate_eld_items
+
+
+def snapshot_loader(cache, client, key, stream):
+    """Like the app's loader: once a snapshot is cached, only ask for a payload changed since it was built"""
+    def load():
+        previous = cache.peek(key)
+        validators = previous.validators if previous is not None else None
+        return client.open_conditional_stream(validators) if stream else client.fetch_conditional_payload(validators)
+    return load
+
+
+def failing_build(load):
+    """The loader, but building the snapshot fails after every item was read"""
+    def fail(items):
+        yield from items
+        raise ValueError("snapshot build failed")
+
+    def broken_load():
+        body, validators = load()
+        items = (body.get('Data') or []) if isinstance(body, dict) else body
+        return ELDPayload(fail(items), validators)
+    return broken_load
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_unchanged_data_reuses_the_cached_snapshot(standin, stream):
+    server = standin()
+    cache = SnapshotCache(ttl_seconds=0)
+    load = snapshot_loader(cache, ELDSync(server.url, "key"), "key", stream)
+
+    first = cache.refresh("key", load)
+    second = cache.refresh("key", load)
+
+    assert server.not_modified_count == 1
+    assert second is not first and second.fetched_at >= first.fetched_at
+    assert second.table is first.table
+    assert second.status_index is first.status_index
+    assert len(second.delta) == 0
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_changed_data_is_fetched_again(standin, stream):
+    server = standin()
+    cache = SnapshotCache(ttl_seconds=0)
+    load = snapshot_loader(cache, ELDSync(server.url, "key"), "key", stream)
+    first = cache.refresh("key", load)
+
+    items = generate_eld_items(250)
+    items[0]["Log"]["CurrentStatus"] = "SB" if items[0]["Log"]["CurrentStatus"] != "SB" else "Driving"
+    server.set_items(items)
+    second = cache.refresh("key", load)
+
+    assert server.not_modified_count == 0
+    assert second.table is not first.table
+    assert len(second.delta) == 1
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_failed_build_does_not_keep_the_new_validators(standin, stream):
+    server = standin()
+    cache = SnapshotCache(ttl_seconds=0)
+    load = snapshot_loader(cache, ELDSync(server.url, "key"), "key", stream)
+    first = cache.refresh("key", load)
+
+    items = generate_eld_items(250)
+    items[0]["Log"]["CurrentStatus"] = "SB" if items[0]["Log"]["CurrentStatus"] != "SB" else "Driving"
+    server.set_items(items)
+    with pytest.raises(ValueError):
+        cache.refresh("key", failing_build(load))
+    assert cache.peek("key") is first
+
+    second = cache.refresh("key", load)
+
+    assert server.not_modified_count == 0
+    assert second.table is not first.table
+    assert len(second.delta) == 1
+
+
+def test_responses_are_compressed(standin):
+    server = standin()
+    payload = ELDSync(server.url, "key").fetch_eld_payload()
+
+    assert len(payload["Data"]) == 250
+    assert server.bytes_sent < len(str(payload)) / 4
+
+
+def test_not_modified_without_a_cached_snapshot_is_a_request_error():
+    cache = SnapshotCache()
+
+    with pytest.raises(UnexpectedNotModifiedError):
+        cache.refresh("key", lambda: NOT_MODIFIED)
@@ -0,0 +1,69 @@
+import json
+
+import pytest
+
+import eld_batch
+from eld_fleets import FleetConfig, fetch_fleets_sync, load_fleet_configs
+from eld_http import _async_sessions, get_background_loop
+from eld_standin import generate_eld_items
+
+
+def test_one_failing_fleet_leaves_the_others_intact(standin):
+    healthy = standin(generate_eld_items(120))
+    failing = standin(fail_first=100)
+    fleets = [
+        FleetConfig("Healthy", healthy.url, "healthy-key"),
+        FleetConfig("Failing", failing.url, "failing-key"),
+    ]
+
+    result = fetch_fleets_sync(fleets, timeout=10)
+
+    assert [fleet_result.fleet.name for fleet_result in result.succeeded] == ["Healthy"]
+    assert result.succeeded[0].snapshot.table.num_rows == 120
+    assert [fleet_result.fleet.name for fleet_result in result.failed] == ["Failing"]
+
+
+def test_slow_fleet_times_out_without_holding_up_the_rest(standin):
+    healthy = standin(generate_eld_items(120))
+    slow = standin(slow_rate=1.0, slow_seconds=3)
+    fleets = [FleetConfig("Healthy", healthy.url, "healthy-key"), FleetConfig("Slow", slow.url, "slow-key")]
+
+    result = fetch_fleets_sync(fleets, timeout=0.5)
+
+    assert [fleet_result.fleet.name for fleet_result in result.succeeded] == ["Healthy"]
+    assert isinstance(result.failed[0].error, TimeoutError)
+
+
+def test_repeat_fetches_reuse_the_background_session(standin):
+    server = standin()
+    fleets = [FleetConfig("Fleet", server.url, "key")]
+
+    fetch_fleets_sync(fleets)
+    session = _async_sessions.get(get_background_loop())
+    fetch_fleets_sync(fleets)
+
+    assert session is not None and not session.closed
+    assert _async_sessions.get(get_background_loop()) is session
+
+
+@pytest.mark.parametrize("names", [["East", "East"], ["East", "default"]])
+def test_fleet_names_must_be_unique_and_not_the_default(names):
+    entries = [{"name": name, "api_key": f"key-{number}"} for number, name in enumerate(names)]
+
+    with pytest.raises(ValueError):
+        load_fleet_configs(entries, default_url="http://eld.invalid")
+
+
+def test_batch_exports_the_default_account_with_the_fleets(standin, tmp_path, monkeypatch):
+    default = standin(generate_eld_items(120))
+    other = standin(generate_eld_items(80, seed=1))
+    fleets_path = tmp_path / "fleets.json"
+    fleets_path.write_text(json.dumps([{"name": "Other", "api_url": other.url, "api_key": "other-key"}]))
+    monkeypatch.setenv("ELD_API_KEY", "default-key")
+
+    exit_code = eld_batch.main([str(tmp_path / "out"), "--format", "CSV", "--api-url", default.url,
+                                "--fleets", str(fleets_path), "--history", ""])
+
+    assert exit_code == 0
+    assert default.request_count > 0 and other.request_count > 0
+    assert (tmp_path / "out" / "default").is_dir() and (tmp_path / "out" / "Other").is_dir()
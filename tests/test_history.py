@@ -0,0 +1,104 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from eld_history import SnapshotHistory
+from eld_snapshot import ELDSnapshot
+
+START = datetime(2026, 3, 2)
+
+
+def hours(count):
+    return START + timedelta(hours=count)
+
+
+def item(driver_id, first_name, status, truck=""):
+    return {
+        "Driver": {"ID": driver_id, "FirstName": first_name, "LastName": "Test", "PhoneNo": "(555) 000-0000"},
+        "Vehicle": {"DisplayID": truck},
+        "Log": {"CurrentStatus": status},
+    }
+
+
+def snapshot(at, *items):
+    return ELDSnapshot.from_items(items, fetched_at=hours(at))
+
+
+# Ann sits in SB on T1 throughout. Bob drives T1 with her until 6h, then moves to T2.
+# Cy is off duty without a truck until 12h, then goes on duty sharing T2 with Bob.
+SNAPSHOTS = [
+    snapshot(0, item(1, "Ann", "SB", "T1"), item(2, "Bob", "Driving", "T1"), item(3, "Cy", "Off Duty")),
+    snapshot(6, item(1, "Ann", "SB", "T1"), item(2, "Bob", "Driving", "T2"), item(3, "Cy", "Off Duty")),
+    snapshot(12, item(1, "Ann", "SB", "T1"), item(2, "Bob", "Driving", "T2"), item(3, "Cy", "On Duty", "T2")),
+    snapshot(24, item(1, "Ann", "SB", "T1"), item(2, "Bob", "Driving", "T2"), item(3, "Cy", "On Duty", "T2")),
+]
+
+
+@pytest.fixture
+def history(tmp_path):
+    history = SnapshotHistory(str(tmp_path / "history.sqlite3"))
+    for recorded in SNAPSHOTS:
+        history.append(recorded)
+    return history
+
+
+def test_append_only_records_states_that_changed(tmp_path):
+    history = SnapshotHistory(str(tmp_path / "history.sqlite3"))
+
+    assert [history.append(recorded) for recorded in SNAPSHOTS] == [3, 2, 2, 0]
+    assert history.snapshots_frame()['Changed States'].tolist() == [3, 2, 2, 0]
+    assert history.observed_range() == (hours(0), hours(24))
+
+
+def test_append_matches_repeated_rows_one_for_one(tmp_path):
+    history = SnapshotHistory(str(tmp_path / "history.sqlite3"))
+    history.append(snapshot(0, item(1, "Ann", "SB"), item(1, "Ann", "SB")))
+
+    assert history.append(snapshot(1, item(1, "Ann", "SB"))) == 1
+    assert history.append(snapshot(2, item(1, "Ann", "SB"), item(1, "Ann", "SB"))) == 1
+
+
+def test_append_rejects_a_snapshot_that_is_not_newer(history):
+    with pytest.raises(ValueError):
+        history.append(snapshot(24, item(1, "Ann", "SB", "T1")))
+
+
+def test_changed_state_is_closed_when_the_next_one_starts(history):
+    bob = history.driver_history(2, hours(0), hours(24))
+
+    assert bob['Truck Number'].tolist() == ["T1", "T2"]
+    assert bob['To'].iloc[0] == bob['From'].iloc[1]
+    assert bob['Hours'].round(6).tolist() == [6.0, 18.0]
+
+
+def test_states_are_clipped_to_the_range_and_to_the_observed_history(history):
+    bob = history.driver_history(2, hours(3), hours(9))
+    assert bob['Hours'].round(6).tolist() == [3.0, 3.0]
+
+    # The open states end at the latest snapshot, not at the end of the range
+    ann = history.driver_history(1, hours(12), hours(48))
+    assert ann['Hours'].round(6).tolist() == [12.0]
+
+
+def test_status_durations_share_of_the_covered_range(history):
+    durations = history.status_durations(hours(0), hours(48))
+    shares = {(row['Driver ID'], row['Log Status']): round(row['Share of Range'], 6)
+              for _, row in durations.iterrows()}
+
+    assert shares == {("1", "SB"): 1.0, ("2", "Driving"): 1.0, ("3", "Off Duty"): 0.5, ("3", "On Duty"): 0.5}
+    whole_range = history.status_durations(hours(0), hours(48), min_share=1.0)
+    assert sorted(whole_range['Driver ID']) == ["1", "2"]
+    assert history.status_durations(hours(6), hours(18), status="On Duty")['Share of Range'].round(6).tolist() == [0.5]
+
+
+def test_truck_conflict_periods_count_only_overlaps(history):
+    periods = history.truck_conflict_periods(hours(0), hours(24))
+
+    assert periods['Truck Number'].tolist() == ["T2", "T1"]
+    assert periods['Hours Double-Assigned'].round(6).tolist() == [12.0, 6.0]
+    assert periods['Most Drivers at Once'].tolist() == [2, 2]
+    assert periods['Driver IDs'].tolist() == ["2, 3", "1, 2"]
+
+    clipped = history.truck_conflict_periods(hours(3), hours(18))
+    assert clipped['Hours Double-Assigned'].round(6).tolist() == [6.0, 3.0]
+    assert history.truck_conflict_periods(hours(6), hours(12)).empty
@@ -0,0 +1,94 @@
+import asyncio
+
+import pytest
+
+import duplicate
+from duplicate import ELDSync, parse_eld_driver
+from eld_http import PaginationError, close_async_http_session
+from eld_snapshot import STATUS_OPTIONS
+from eld_standin import generate_eld_items
+
+
+def run(coroutine_function, *args, **kwargs):
+    """Run one async fetch on its own loop, closing that loop's pooled session afterwards"""
+    async def main():
+        try:
+            return await coroutine_function(*args, **kwargs)
+        finally:
+            await close_async_http_session()
+
+    return asyncio.run(main())
+
+
+@pytest.mark.parametrize("page_size", [1, 40, 100, 250, 1000])
+def test_paged_fetch_returns_every_item_in_api_order(standin, page_size):
+    items = generate_eld_items(250)
+    server = standin(items)
+    client = ELDSync(server.url, "key")
+
+    assert run(client.fetch_eld_items, page_size=page_size, max_concurrency=4) == items
+
+
+def test_paged_fetch_merges_pages_in_order_when_they_finish_out_of_order(standin):
+    items = generate_eld_items(250)
+    # Larger pages take longer, and the last (short) page answers fastest
+    server = standin(items, item_latency=0.0005)
+    client = ELDSync(server.url, "key")
+
+    drivers = run(client.fetch_eld_drivers, page_size=60, max_concurrency=5)
+
+    assert drivers == [parse_eld_driver(item) for item in items]
+
+
+def test_sharded_fetch_returns_each_status_in_turn(standin):
+    items = generate_eld_items(250)
+    server = standin(items)
+    client = ELDSync(server.url, "key")
+
+    fetched = run(client.fetch_eld_items, statuses=STATUS_OPTIONS)
+
+    expected = [item for status in STATUS_OPTIONS for item in items if item["Log"]["CurrentStatus"] == status]
+    assert fetched == expected
+
+
+def test_sharded_fetch_leaves_out_unlisted_statuses(standin):
+    items = generate_eld_items(250)
+    server = standin(items)
+    client = ELDSync(server.url, "key")
+
+    drivers = run(client.fetch_eld_drivers, statuses=["Driving"])
+
+    assert {driver.status for driver in drivers} == {"Driving"}
+    assert len(drivers) == sum(item["Log"]["CurrentStatus"] == "Driving" for item in items)
+
+
+def test_paged_fetch_raises_when_the_api_ignores_limit(standin):
+    server = standin(generate_eld_items(250), paging=False)
+    client = ELDSync(server.url, "key")
+
+    with pytest.raises(PaginationError, match="ignore"):
+        run(client.fetch_eld_items, page_size=50)
+    assert server.request_count <= 4
+
+
+def test_paged_fetch_raises_when_the_api_ignores_offset(standin, monkeypatch):
+    server = standin(generate_eld_items(250))
+    # The stand-in does not know this offset name, so it keeps answering with the first page
+    monkeypatch.setattr(duplicate, "ELD_PAGE_OFFSET_PARAM", "start")
+    client = ELDSync(server.url, "key")
+
+    with pytest.raises(PaginationError, match="repeats"):
+        run(client.fetch_eld_items, page_size=50, max_concurrency=2)
+    assert server.request_count <= 4
+
+
+def test_paged_fetch_stops_at_the_page_cap(standin):
+    server = standin(generate_eld_items(250))
+    client = ELDSync(server.url, "key")
+
+    async def collect_pages():
+        return [page async for page in client.iter_eld_item_pages(page_size=10, max_pages=3)]
+
+    with pytest.raises(PaginationError, match="3 pages"):
+        run(collect_pages)
+    assert server.request_count == 3
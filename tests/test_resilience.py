@@ -0,0 +1,122 @@
+import random
+import time
+
+import pytest
+import requests
+
+from duplicate import ELDSync
+from eld_metrics import metrics
+from eld_resilience import CircuitBreaker, CircuitOpenError, RetryPolicy, get_circuit_breaker
+
+
+def test_retries_until_the_api_recovers(standin, fast_retries):
+    server = standin(fail_first=2)
+    client = ELDSync(server.url, "key", retry_policy=fast_retries)
+    metrics.clear()
+
+    payload = client.fetch_eld_payload()
+
+    assert len(payload["Data"]) == 250
+    assert server.request_count == 3
+    assert [metric.labels["reason"] for metric in metrics.recent() if metric.stage == "api_retry"] == ["HTTPError"] * 2
+
+
+def test_gives_up_after_the_last_attempt(standin, fast_retries):
+    server = standin(fail_first=10)
+    client = ELDSync(server.url, "key", retry_policy=fast_retries)
+
+    with pytest.raises(requests.exceptions.HTTPError):
+        client.fetch_eld_payload()
+    assert server.request_count == fast_retries.attempts
+
+
+def test_random_errors_are_retried_away(standin):
+    server = standin(error_rate=0.3, fault_seed=1)
+    client = ELDSync(server.url, "key", retry_policy=RetryPolicy(attempts=6, backoff_seconds=0.01, hedge_after_seconds=0))
+    client.circuit_breaker = None
+
+    for _ in range(10):
+        assert len(client.fetch_eld_payload()["Data"]) == 250
+    assert server.request_count > 10
+
+
+def test_hedged_request_wins_over_a_slow_one(standin):
+    # A seed whose first request is held and second is not
+    seed = next(seed for seed in range(1000) if [roll < 0.5 for roll in random_rolls(seed, 2)] == [True, False])
+    server = standin(slow_rate=0.5, slow_seconds=3, fault_seed=seed)
+    client = ELDSync(server.url, "key", retry_policy=RetryPolicy(attempts=1, hedge_after_seconds=0.2))
+    metrics.clear()
+
+    started = time.perf_counter()
+    payload = client.fetch_eld_payload()
+
+    assert time.perf_counter() - started < 2
+    assert len(payload["Data"]) == 250
+    assert server.request_count == 2
+    assert any(metric.stage == "api_hedge" for metric in metrics.recent())
+
+
+def random_rolls(seed, count):
+    rng = random.Random(seed)
+    return [rng.random() for _ in range(count)]
+
+
+def test_breaker_opens_fails_fast_and_closes_after_a_good_trial(standin):
+    server = standin(fail_first=2)
+    client = ELDSync(server.url, "key", retry_policy=RetryPolicy(attempts=1, hedge_after_seconds=0))
+    client.circuit_breaker = breaker = CircuitBreaker(server.url, failure_threshold=2, reset_seconds=0.3)
+
+    for _ in range(2):
+        with pytest.raises(requests.exceptions.HTTPError):
+            client.fetch_eld_payload()
+    assert breaker.state == "open"
+
+    # Open: fails without calling the API
+    with pytest.raises(CircuitOpenError):
+        client.fetch_eld_payload()
+    assert server.request_count == 2
+
+    time.sleep(0.35)
+    assert breaker.state == "half-open"
+    assert len(client.fetch_eld_payload()["Data"]) == 250
+    assert breaker.state == "closed"
+    assert server.request_count == 3
+
+
+def test_breaker_reopens_after_a_failed_trial(standin):
+    server = standin(fail_first=3)
+    client = ELDSync(server.url, "key", retry_policy=RetryPolicy(attempts=1, hedge_after_seconds=0))
+    client.circuit_breaker = breaker = CircuitBreaker(server.url, failure_threshold=2, reset_seconds=0.3)
+
+    for _ in range(2):
+        with pytest.raises(requests.exceptions.HTTPError):
+            client.fetch_eld_payload()
+    time.sleep(0.35)
+    with pytest.raises(requests.exceptions.HTTPError):
+        client.fetch_eld_payload()
+
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        client.fetch_eld_payload()
+    assert server.request_count == 3
+
+
+def test_breakers_are_per_account(standin):
+    server = standin()
+
+    assert ELDSync(server.url, "fleet-a").circuit_breaker is ELDSync(server.url, "fleet-a").circuit_breaker
+    assert ELDSync(server.url, "fleet-a").circuit_breaker is not ELDSync(server.url, "fleet-b").circuit_breaker
+
+
+def test_an_open_breaker_does_not_block_other_accounts(standin):
+    server = standin(fail_first=5)
+    policy = RetryPolicy(attempts=1, hedge_after_seconds=0)
+    failing = ELDSync(server.url, "failing", retry_policy=policy)
+    for _ in range(failing.circuit_breaker.failure_threshold):
+        with pytest.raises(requests.exceptions.HTTPError):
+            failing.fetch_eld_payload()
+    assert failing.circuit_breaker.state == "open"
+
+    other = ELDSync(server.url, "other", retry_policy=policy)
+    assert get_circuit_breaker(other.eld_drivers_url, "other").state == "closed"
+    assert len(other.fetch_eld_payload()["Data"]) == 250
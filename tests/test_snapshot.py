@@ -0,0 +1,94 @@
+import random
+
+import pytest
+
+from eld_snapshot import STATUS_OPTIONS, ELDSnapshot, build_status_index
+from eld_standin import generate_eld_items
+
+
+def refreshed_items(items, seed, changes=20):
+    """A copy of items with some statuses and trucks changed, a few drivers removed and a few added"""
+    rng = random.Random(seed)
+    items = [{**item, "Log": dict(item["Log"]), "Vehicle": dict(item["Vehicle"])} for item in items]
+    for item in rng.sample(items, changes):
+        item["Log"]["CurrentStatus"] = rng.choice(STATUS_OPTIONS)
+    for item in rng.sample(items, changes // 4):
+        item["Vehicle"]["DisplayID"] = f"T{rng.randrange(len(items))}"
+    for index in sorted(rng.sample(range(len(items)), changes // 4), reverse=True):
+        del items[index]
+    new_items = generate_eld_items(changes // 4, seed=seed)
+    for offset, item in enumerate(new_items):
+        item["Driver"]["ID"] = 900000 + seed * 100 + offset
+        items.insert(rng.randrange(len(items) + 1), item)
+    return items
+
+
+def assert_same_as_rebuilt(snapshot):
+    rebuilt = build_status_index(snapshot.table)
+    assert snapshot.status_index.keys() == rebuilt.keys()
+    for status, bucket in rebuilt.items():
+        assert snapshot.status_index[status].table.equals(bucket.table), status
+        assert snapshot.status_index[status].digest == bucket.digest, status
+
+
+def test_patched_buckets_keep_api_order_across_refreshes():
+    items = generate_eld_items(2000)
+    snapshot = ELDSnapshot.from_items(items)
+    for seed in range(1, 6):
+        items = refreshed_items(items, seed)
+        snapshot = ELDSnapshot.from_items(items, previous=snapshot)
+        assert snapshot.delta is not None and 0 < len(snapshot.delta) < snapshot.table.num_rows // 2
+        assert_same_as_rebuilt(snapshot)
+
+
+def test_untouched_buckets_are_reused():
+    items = generate_eld_items(2000)
+    previous = ELDSnapshot.from_items(items)
+    moved = next(item for item in items if item["Log"]["CurrentStatus"] == "Driving")
+    moved["Log"] = {"CurrentStatus": "On Duty"}
+
+    snapshot = ELDSnapshot.from_items(items, previous=previous)
+
+    assert snapshot.status_index["Off Duty"] is previous.status_index["Off Duty"]
+    assert snapshot.status_index["SB"] is previous.status_index["SB"]
+    assert_same_as_rebuilt(snapshot)
+
+
+@pytest.mark.parametrize("changes", [0, 10])
+def test_reordered_drivers_are_rebuilt_in_the_new_order(changes):
+    items = generate_eld_items(2000)
+    previous = ELDSnapshot.from_items(items)
+    items = refreshed_items(items, seed=7, changes=changes) if changes else list(items)
+    random.Random(0).shuffle(items)
+
+    snapshot = ELDSnapshot.from_items(items, previous=previous)
+
+    assert_same_as_rebuilt(snapshot)
+
+
+def test_non_string_values_are_kept_as_strings():
+    items = generate_eld_items(3)
+    items[0]["Driver"]["PhoneNo"] = 5551234567
+    items[0]["Driver"]["FirstName"] = 42
+    items[1]["Vehicle"]["DisplayID"] = 1017
+    items[1]["Driver"]["LastName"] = None
+
+    snapshot = ELDSnapshot.from_items(items)
+
+    assert snapshot.table.schema.field("driver_id").type == "int64"
+    assert snapshot.table["phone"][0].as_py() == "5551234567"
+    assert snapshot.table["first_name"][0].as_py() == "42"
+    assert snapshot.table["truck"][1].as_py() == "1017"
+    assert snapshot.table["last_name"][1].as_py() is None
+    assert sum(len(bucket) for bucket in snapshot.status_index.values()) == 3
+
+
+def test_non_numeric_driver_ids_fall_back_to_strings():
+    items = generate_eld_items(3)
+    items[2]["Driver"]["ID"] = "D-7"
+    items[0]["Driver"]["PhoneNo"] = 5551234567
+
+    table = ELDSnapshot.from_items(items).table
+
+    assert table["driver_id"].to_pylist() == ["100000", "100001", "D-7"]
+    assert table["phone"][0].as_py() == "5551234567"
@@ -0,0 +1,102 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import requests
+
+from eld_snapshot import SnapshotCache
+from eld_standin import generate_eld_items
+
+
+class CountingLoader:
+    """Loader that counts its calls and, while gated, blocks until release()"""
+
+    def __init__(self, items=None, error=None, gated=False):
+        self.items = items if items is not None else generate_eld_items(20)
+        self.error = error
+        self.calls = 0
+        self.started = threading.Event()
+        self.gate = threading.Event()
+        if not gated:
+            self.gate.set()
+
+    def release(self):
+        self.gate.set()
+
+    def __call__(self):
+        self.calls += 1
+        self.started.set()
+        assert self.gate.wait(5)
+        if self.error is not None:
+            raise self.error
+        return {"Data": self.items}
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out waiting"
+        time.sleep(0.01)
+
+
+def test_concurrent_first_gets_share_one_load():
+    cache = SnapshotCache()
+    loader = CountingLoader(gated=True)
+
+    with ThreadPoolExecutor(8) as pool:
+        futures = [pool.submit(cache.get, "key", loader) for _ in range(8)]
+        assert loader.started.wait(5)
+        loader.release()
+        snapshots = [future.result(5) for future in futures]
+
+    assert loader.calls == 1
+    assert all(snapshot is snapshots[0] for snapshot in snapshots)
+    assert snapshots[0].table.num_rows == 20
+
+
+def test_stale_snapshot_is_served_while_the_refresh_runs():
+    cache = SnapshotCache(ttl_seconds=0)
+    first = cache.get("key", CountingLoader())
+    loader = CountingLoader(generate_eld_items(30, seed=1), gated=True)
+
+    assert cache.get("key", loader) is first
+    assert loader.started.wait(5)
+    assert cache.status("key").refreshing
+    assert cache.get("key", loader) is first
+    loader.release()
+    wait_until(lambda: not cache.status("key").refreshing)
+    second = cache.peek("key")
+
+    assert loader.calls == 1
+    assert second is not first and second.table.num_rows == 30
+    assert cache.peek("key") is second
+    assert not cache.status("key").refreshing
+
+
+def test_failed_refresh_keeps_the_cached_snapshot():
+    cache = SnapshotCache(ttl_seconds=0)
+    first = cache.get("key", CountingLoader())
+    error = requests.exceptions.ConnectionError("ELD API is down")
+    failing = CountingLoader(error=error)
+
+    # The stale snapshot is served while its background refresh fails; refresh() joins that refresh
+    assert cache.get("key", failing) is first
+    with pytest.raises(requests.exceptions.ConnectionError):
+        cache.refresh("key", failing)
+
+    assert cache.peek("key") is first
+    assert cache.status("key").last_error is error
+
+    second = cache.refresh("key", CountingLoader())
+    assert second is not first
+    assert cache.status("key").last_error is None
+
+
+def test_failed_first_load_caches_nothing():
+    cache = SnapshotCache()
+
+    with pytest.raises(requests.exceptions.ConnectionError):
+        cache.get("key", CountingLoader(error=requests.exceptions.ConnectionError()))
+
+    assert cache.peek("key") is None
@@ -0,0 +1,109 @@
+import json
+
+import pytest
+
+from eld_stream import JSONArrayStreamParser
+
+ITEMS = [
+    {"Driver": {"FirstName": "Zoë", "LastName": "Ångström"}, "Log": {"CurrentStatus": "Driving", "Odometer": 12345.5}},
+    {"Driver": {"FirstName": "Li", "LastName": "王"}, "Log": {"CurrentStatus": "SB", "Active": True, "Note": None}},
+    -17,
+    True,
+    None,
+    "a, \"quoted\" ] string }",
+]
+
+
+def parse(body: bytes, split_at=()) -> list:
+    """Feed body to a parser in chunks cut at split_at and return every item it emitted"""
+    parser = JSONArrayStreamParser("Data")
+    items = []
+    start = 0
+    for end in [*split_at, len(body)]:
+        items += parser.feed(body[start:end])
+        start = end
+    return items + parser.close()
+
+
+def test_every_split_point_gives_the_same_items():
+    body = json.dumps({"Status": "ok", "Data": ITEMS, "Total": 6}, ensure_ascii=False).encode()
+
+    # Cuts land mid-key, mid-string, mid-number, mid-literal and inside multibyte UTF-8 characters
+    for split in range(1, len(body)):
+        assert parse(body, [split]) == ITEMS, split
+
+
+@pytest.mark.parametrize("body, rest", [
+    (b'{"Data": ["abc', b'def"]}'),
+    (b'{"Data": [12', b'34.5, 6]}'),
+    (b'{"Data": [tru', b'e, false]}'),
+    (b'{"Data": ["\xc3', b'\xa9"]}'),
+])
+def test_values_cut_by_a_chunk_boundary_wait_for_the_rest(body, rest):
+    parser = JSONArrayStreamParser("Data")
+
+    assert parser.feed(body) == []
+    assert parser.feed(rest) + parser.close() == json.loads(body + rest)["Data"]
+
+
+def test_number_at_a_chunk_boundary_is_not_emitted_early():
+    parser = JSONArrayStreamParser("Data")
+
+    assert parser.feed(b'{"Data": [12') == []
+    assert parser.feed(b'34]') == [1234]
+    assert parser.feed(b'}') + parser.close() == []
+
+
+def test_items_are_emitted_as_soon_as_they_are_complete():
+    parser = JSONArrayStreamParser("Data")
+
+    assert parser.feed(b'{"Data": [{"a": 1}, {"b"') == [{"a": 1}]
+    assert parser.feed(b': 2}, ') == [{"b": 2}]
+    assert parser.feed(b']}') + parser.close() == []
+
+
+def test_other_top_level_keys_are_skipped():
+    body = json.dumps({
+        "Before": {"Data": [1, 2], "nested": [[1], {"x": "]"}]},
+        "Count": 2,
+        "Data": [{"id": 1}, {"id": 2}],
+        "After": [3, 4],
+        "Done": True,
+    }).encode()
+
+    assert parse(body) == [{"id": 1}, {"id": 2}]
+
+
+@pytest.mark.parametrize("body", [b'{"Data": null}', b'{"Data": []}', b'{"Status": "ok"}', b'{}', b'  {"Data": null}\n'])
+def test_null_empty_or_missing_data_has_no_items(body):
+    assert parse(body) == []
+
+
+@pytest.mark.parametrize("body", [
+    b'',
+    b'{"Data": [{"id": 1}, {"id"',
+    b'{"Data": [{"id": 1}]',
+    b'{"Data": [1, 2',
+    b'{"Data": ["abc',
+])
+def test_truncated_body_is_an_error(body):
+    parser = JSONArrayStreamParser("Data")
+    parser.feed(body)
+
+    with pytest.raises(ValueError):
+        parser.close()
+
+
+@pytest.mark.parametrize("body", [b'{"Data": [1]} x', b'{"Data": [1]}{"Data": [2]}', b'{"Data": [1]}]'])
+def test_trailing_garbage_is_an_error(body):
+    parser = JSONArrayStreamParser("Data")
+    parser.feed(body)
+
+    with pytest.raises(ValueError):
+        parser.close()
+
+
+@pytest.mark.parametrize("body", [b'[1, 2]', b'{"Data": [1 2]}', b'{"Data" [1]}'])
+def test_malformed_body_is_an_error(body):
+    with pytest.raises(ValueError):
+        parse(body)
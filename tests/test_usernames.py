@@ -0,0 +1,48 @@
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from reports import build_expected_username, build_expected_usernames
+
+
+def assert_same_as_row_wise(drivers_df):
+    expected = drivers_df.apply(build_expected_username, axis=1).tolist()
+    assert build_expected_usernames(drivers_df).tolist() == expected
+
+
+@pytest.mark.parametrize("phone", [
+    "(555) 123-4567", "555.123.4567 ext 89", "123", "", "   ", "\t\n",
+    "٥٥٥١٢٣٤",            # Arabic-Indic digits
+    "５５５-１２３４",      # full-width digits
+    "555-12³4",            # superscript digit
+    "+1 555 ① 1234",
+    None, np.nan, 5551234567, 5551234567.0,
+])
+@pytest.mark.parametrize("first_name, last_name", [
+    ("Ann", "Lee"), ("  zoë", " Ångström "), ("", ""), ("   ", "\t"), (None, np.nan), (np.nan, "Lee"), ("Ann", None),
+])
+def test_vectorized_usernames_match_the_row_wise_rule(phone, first_name, last_name):
+    assert_same_as_row_wise(pd.DataFrame({
+        "First Name": [first_name], "Last Name": [last_name], "Phone Number": [phone],
+    }, dtype=object))
+
+
+def test_vectorized_usernames_match_on_mixed_columns():
+    rng = random.Random(0)
+    values = ["Ann", " bo ", "", "  ", "Émile", "王", None, np.nan, "555 123 4567", "٠١٢٣٤٥", "12", 0, 42.0]
+    drivers_df = pd.DataFrame({
+        column: [rng.choice(values) for _ in range(2000)] for column in ["First Name", "Last Name", "Phone Number"]
+    })
+
+    assert_same_as_row_wise(drivers_df)
+
+
+def test_vectorized_usernames_match_on_numeric_phone_column():
+    # e.g. pandas reading a CSV whose phone numbers have no punctuation
+    drivers_df = pd.DataFrame({
+        "First Name": ["Ann", "Bob", "Cy"], "Last Name": ["Lee", "Ray", "Oh"], "Phone Number": [5551234567, np.nan, 123],
+    })
+
+    assert_same_as_row_wise(drivers_df)